@@ -1,6 +1,7 @@
 # laundry_app/core/admin.py
 
 from django.contrib import admin
+from django.db import transaction
 from django import forms  # <-- IMPORTANTE: Añadimos la importación de forms
 from .models import (
     Customer, 
@@ -11,8 +12,12 @@ from .models import (
     Product, 
     Sale, 
     SaleItem,
-    Expense
+    Expense,
+    Job,
+    ReportExport
 )
+from .rollups import created_days, refresh_daily_stats
+from .stats import refresh_customer_stats
 
 # --- INICIO DE LA PERSONALIZACIÓN DE TÍTULOS ---
 
@@ -63,7 +68,18 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer', 'status', 'payment_status', 'created_at')
     list_filter = ('status', 'payment_status', 'created_at')
     search_fields = ('id', 'customer__name')
-    readonly_fields = ('short_id', 'order_code', 'qr_code', 'created_at', 'updated_at', 'total_price', 'original_calculated_price')
+    readonly_fields = ('short_id', 'order_code', 'created_at', 'updated_at', 'total_price', 'original_calculated_price', 'final_price', 'remaining_amount')
+
+    def delete_queryset(self, request, queryset):
+        # Cada fila borrada ya descuenta su parte (core.signals). Al terminar
+        # se recalculan desde cero los clientes y días tocados, en la misma
+        # transacción, para que un borrado masivo no deje deriva acumulada.
+        customer_ids = set(queryset.values_list('customer_id', flat=True))
+        days = created_days(queryset)
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            refresh_customer_stats(customer_ids)
+            refresh_daily_stats(days)
 
 
 @admin.register(Customer)
@@ -72,7 +88,21 @@ class CustomerAdmin(admin.ModelAdmin):
     
     list_display = ('name', 'customer_code', 'phone', 'created_at')
     search_fields = ('name', 'customer_code', 'phone')
-    readonly_fields = ('customer_code', 'qr_code', 'created_at')
+    readonly_fields = ('customer_code', 'created_at')
+
+    # Borrar clientes borra sus pedidos en cascada (cada uno se descuenta en
+    # core.signals); además se recalculan los días en que tenían pedidos.
+    def delete_model(self, request, obj):
+        days = created_days(Order.objects.filter(customer=obj))
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            refresh_daily_stats(days)
+
+    def delete_queryset(self, request, queryset):
+        days = created_days(Order.objects.filter(customer__in=queryset))
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            refresh_daily_stats(days)
 
 
 # --- Registros simples para los demás modelos ---
@@ -83,11 +113,44 @@ class CustomerAdmin(admin.ModelAdmin):
 admin.site.register(Category)
 admin.site.register(AppConfiguration)
 admin.site.register(Product)
-admin.site.register(Sale)
+
+
+@admin.register(Sale)
+class SaleAdmin(admin.ModelAdmin):
+    def delete_queryset(self, request, queryset):
+        # Igual que en OrderAdmin.
+        customer_ids = set(queryset.exclude(customer=None).values_list('customer_id', flat=True))
+        days = created_days(queryset)
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            refresh_customer_stats(customer_ids)
+            refresh_daily_stats(days)
+
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('expense_date', 'description', 'amount', 'category')
     list_filter = ('category', 'expense_date')
     search_fields = ('description',)
-    date_hierarchy = 'expense_date'
\ No newline at end of file
+    date_hierarchy = 'expense_date'
+
+    def delete_queryset(self, request, queryset):
+        # Igual que en OrderAdmin.
+        days = set(queryset.values_list('expense_date', flat=True))
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            refresh_daily_stats(days)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_after', 'created_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('payload', 'attempts', 'locked_at', 'last_error', 'created_at', 'updated_at')
+
+
+@admin.register(ReportExport)
+class ReportExportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'report_type', 'query', 'status', 'progress', 'created_at')
+    list_filter = ('status', 'report_type')
+    readonly_fields = ('key', 'query_hash', 'error', 'created_at', 'updated_at')
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Registra los trabajos en segundo plano (core.jobs) y los receptores
+        # que contabilizan los borrados (core.signals).
+        from . import signals, tasks  # noqa: F401
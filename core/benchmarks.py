@@ -0,0 +1,347 @@
+# laundry_app/core/benchmarks.py
+"""
+Escenarios de medición para `python manage.py benchmark <escenario>`.
+
+Cada escenario crea sus propios datos de prueba y devuelve filas
+(dicts) para imprimir. El comando los ejecuta dentro de una transacción
+que siempre se revierte, así que se pueden correr sobre la base real.
+"""
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Registra una función como escenario de benchmark."""
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+def measure(func, *args, **kwargs):
+    """Ejecuta `func` y devuelve (resultado, consultas SQL, milisegundos)."""
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+    return result, len(queries), elapsed
+
+
+def _staff_request(factory, method, path, data=None):
+    user = User.objects.filter(is_staff=True).first() or User.objects.create_user('benchmark', is_staff=True)
+    request = getattr(factory, method)(path, data or {})
+    request.user = user
+    return request
+
+
+@scenario('order_intake')
+def order_intake(line_counts=(0, 1, 5, 20, 50)):
+    """Consultas y tiempo de `add_order` según la cantidad de líneas del pedido."""
+    from .models import Category, Customer
+    from .views import add_order
+
+    customer = Customer(name='Cliente Benchmark')
+    customer.save()
+    categories = [
+        Category.objects.create(name=f'Benchmark {i}', price=Decimal('3.50'))
+        for i in range(max(line_counts))
+    ]
+    factory = RequestFactory()
+
+    rows = []
+    for count in line_counts:
+        data = {
+            'customer': customer.pk, 'weight': '4.5', 'weight_price_per_kg': '5.00', 'notes': '',
+            'formset-TOTAL_FORMS': str(count), 'formset-INITIAL_FORMS': '0',
+            'formset-MIN_NUM_FORMS': '0', 'formset-MAX_NUM_FORMS': '1000',
+        }
+        for i, category in enumerate(categories[:count]):
+            data[f'formset-{i}-category'] = category.pk
+            data[f'formset-{i}-quantity'] = '2'
+        request = _staff_request(factory, 'post', '/add_order/', data)
+        response, queries, elapsed = measure(add_order, request)
+        rows.append({'lineas': count, 'consultas': queries, 'ms': round(elapsed, 2), 'status': response.status_code})
+    return rows
+
+
+@scenario('date_filters')
+def date_filters(days=120, per_day=100):
+    """Plan y tiempo de filtrar pedidos por fecha con `created_at__date` contra un rango sobre la columna."""
+    from datetime import timedelta
+
+    from django.db.models import Sum
+    from django.utils import timezone
+
+    from .dates import date_range_q
+    from .identifiers import bulk_create_with_identifiers
+    from .models import Customer, Order
+
+    customer = Customer(name='Cliente Benchmark')
+    customer.save()
+    orders = bulk_create_with_identifiers(
+        Order(customer=customer, weight=Decimal('3.0'), weight_price_per_kg=Decimal('5.00'),
+              final_price=Decimal('15.00'))
+        for _ in range(days * per_day)
+    )
+    # bulk_create pone la fecha actual (auto_now_add); se reparten los pedidos por día.
+    now = timezone.now()
+    for day in range(days):
+        chunk = orders[day * per_day:(day + 1) * per_day]
+        Order.objects.filter(pk__in=[o.pk for o in chunk]).update(created_at=now - timedelta(days=day))
+
+    today = timezone.localdate()
+    date_from, date_to = today - timedelta(days=7), today
+    filters = {
+        'created_at__date': Order.objects.filter(created_at__date__gte=date_from, created_at__date__lte=date_to),
+        'rango created_at': Order.objects.filter(date_range_q(date_from, date_to)),
+    }
+    rows = []
+    for label, queryset in filters.items():
+        queryset = queryset.values('status').annotate(total=Sum('final_price'))
+        _, _, elapsed = measure(list, queryset)
+        plan = ' | '.join(line.strip() for line in queryset.explain().splitlines())
+        rows.append({'filtro': label, 'ms': round(elapsed, 2), 'plan': plan})
+    return rows
+
+
+@scenario('pdf_orders')
+def pdf_orders(rows=10000):
+    """Costo por fila del PDF de pedidos: tabla de un `Paragraph` por celda contra `FastTable`."""
+    from io import BytesIO
+
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Table, TableStyle
+
+    from .identifiers import bulk_create_with_identifiers
+    from .models import Customer, Order
+    from .pdf import GRAY_600, LEFT, RIGHT, STYLES, Column, FastTable, document
+    from .report_pdf import build_report_pdf
+
+    customer = Customer(name='Cliente Benchmark con un nombre bastante largo')
+    customer.save()
+    bulk_create_with_identifiers(
+        Order(customer=customer, weight=Decimal('3.0'), weight_price_per_kg=Decimal('5.00'),
+              final_price=Decimal('15.00'))
+        for _ in range(rows)
+    )
+    data = [
+        [code, '01/01/25', name, 'Pendiente', f"{price:.2f}"]
+        for code, name, price in Order.objects.values_list('order_code', 'customer__name', 'final_price')
+    ]
+    widths = [0.8 * inch, 0.8 * inch, 2.9 * inch, 1.3 * inch, 1.2 * inch]
+
+    def paragraph_table():
+        # Como se dibujaba antes: un Paragraph por celda y Table con repeatRows.
+        header, cell, left, right = STYLES['Header'], STYLES['Cell'], STYLES['CellLeft'], STYLES['CellRight']
+        table_data = [[Paragraph(title, header) for title in ('ID Pedido', 'Fecha', 'Cliente', 'Estado', 'Monto (S/)')]]
+        for code, day, name, status, amount in data:
+            table_data.append([Paragraph(code, cell), Paragraph(day, cell), Paragraph(name, left),
+                               Paragraph(status, cell), Paragraph(amount, right)])
+        table = Table(table_data, colWidths=widths, repeatRows=1)
+        table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), GRAY_600), ('GRID', (0, 0), (-1, -1), 0.5, GRAY_600)]))
+        document(BytesIO()).build([table])
+
+    def fast_table():
+        columns = [Column('ID Pedido', widths[0]), Column('Fecha', widths[1]), Column('Cliente', widths[2], LEFT),
+                   Column('Estado', widths[3]), Column('Monto (S/)', widths[4], RIGHT)]
+        document(BytesIO()).build([FastTable(columns, data)])
+
+    results = []
+    for label, func in (
+        ('Table + Paragraph', paragraph_table),
+        ('FastTable', fast_table),
+        ('build_report_pdf (completo)', lambda: build_report_pdf('orders', {}, BytesIO())),
+    ):
+        _, _, elapsed = measure(func)
+        results.append({'renderer': label, 'filas': rows, 'ms': round(elapsed), 'ms/fila': round(elapsed / rows, 4)})
+    return results
+
+
+@scenario('pdf_memory')
+def pdf_memory(sizes=(5000, 20000, 40000)):
+    """
+    Memoria máxima (RSS) del proceso al generar el PDF de pedidos con cada vez más filas.
+    Conviene correrlo con DEBUG=False: con DEBUG, Django guarda cada consulta y eso también suma.
+    """
+    import resource
+    import tempfile
+
+    from django.conf import settings
+
+    from .identifiers import bulk_create_with_identifiers
+    from .models import Customer, Order
+    from .report_pdf import build_report_pdf
+
+    customer = Customer(name='Cliente Benchmark')
+    customer.save()
+    rows, created = [], 0
+    for size in sizes:
+        # Por lotes, para que crear los datos no suba el pico más que el PDF.
+        while created < size:
+            batch = min(1000, size - created)
+            bulk_create_with_identifiers(
+                Order(customer=customer, weight=Decimal('3.0'), weight_price_per_kg=Decimal('5.00'),
+                      final_price=Decimal('15.00'))
+                for _ in range(batch)
+            )
+            created += batch
+        # ru_maxrss es el pico de todo el proceso: con tamaños crecientes, muestra lo que agrega cada uno.
+        with tempfile.SpooledTemporaryFile(max_size=2 * 1024 * 1024) as output:
+            _, _, elapsed = measure(build_report_pdf, 'orders', {}, output)
+            pdf_size = output.tell()
+        rows.append({
+            'pedidos': size,
+            'filas_pdf': min(size, settings.REPORT_PDF_MAX_ROWS),
+            'ms': round(elapsed),
+            'pdf_kb': pdf_size // 1024,
+            'rss_pico_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+    return rows
+
+
+@scenario('search')
+def search_benchmark(customers=20000, orders_per_customer=5):
+    """Búsqueda de clientes y pedidos: `icontains` con JOIN y distinct() contra el índice FTS5 (core.search)."""
+    import random
+
+    from django.db.models import Q
+
+    from . import search
+    from .identifiers import bulk_create_with_identifiers
+    from .models import Customer, Order, Product, Sale
+
+    if not search.available():
+        return [{'consulta': 'El índice de búsqueda solo existe en SQLite.', 'ms': '-'}]
+    names = ['José', 'María', 'Ana', 'Luis', 'Rosa', 'Jorge', 'Lucía', 'Pedro', 'Carmen', 'Julio']
+    surnames = ['Pérez', 'Quispe', 'Flores', 'Sánchez', 'Ramírez', 'Huamán', 'Torres', 'Díaz', 'Rojas', 'Chávez']
+    random.seed(1)
+    Customer.objects.bulk_create(
+        Customer(name=f"{random.choice(names)} {random.choice(surnames)} {i}", customer_code=f'B{i:07d}',
+                 phone=f'9{random.randint(10000000, 99999999)}')
+        for i in range(customers)
+    )
+    customer_ids = list(Customer.objects.filter(customer_code__startswith='B').values_list('pk', flat=True))
+    for start in range(0, len(customer_ids), 1000):
+        bulk_create_with_identifiers(
+            Order(customer_id=customer_id, weight=Decimal('3.0'), weight_price_per_kg=Decimal('5.00'),
+                  final_price=Decimal('15.00'))
+            for customer_id in customer_ids[start:start + 1000]
+            for _ in range(orders_per_customer)
+        )
+    search.rebuild({search.CUSTOMER: Customer, search.ORDER: Order, search.PRODUCT: Product, search.SALE: Sale})
+    order_code = Order.objects.order_by('-pk').values_list('order_code', flat=True).first()
+
+    def old_customers(query):
+        return list(Customer.objects.filter(
+            Q(name__icontains=query) | Q(customer_code__icontains=query) | Q(phone__icontains=query)
+        ).order_by('name')[:20])
+
+    def old_by_order(query):
+        return list(Customer.objects.filter(order__order_code__icontains=query).distinct().order_by('name')[:20])
+
+    def new_by_order(query):
+        return list(Customer.objects.filter(
+            pk__in=Order.objects.filter(search.filter_q(search.ORDER, query)).values('customer_id')
+        ).order_by('name')[:20])
+
+    cases = [
+        ('clientes "perez" (icontains)', old_customers, 'perez'),
+        ('clientes "pérez" (icontains)', old_customers, 'pérez'),
+        ('omnibox "perez"', search.search, 'perez'),
+        ('clientes por pedido (JOIN + distinct)', old_by_order, order_code),
+        ('clientes por pedido (índice)', new_by_order, order_code),
+        ('omnibox código de pedido', search.search, order_code),
+    ]
+    rows = []
+    for label, func, query in cases:
+        func(query)  # con la caché de páginas de SQLite ya cargada, como en uso normal
+        results, _, elapsed = measure(func, query)
+        rows.append({'consulta': label, 'resultados': len(results), 'ms': round(elapsed, 2)})
+    return rows
+
+
+@scenario('customer_pickers')
+def customer_pickers(steps=(0, 1000, 10000)):
+    """Tamaño y tiempo de las páginas con selector de clientes según la cantidad de clientes."""
+    import uuid
+
+    from django.core.cache import cache
+
+    from . import search
+    from .models import Customer
+    from .views import add_order, orders_report, search_customers
+
+    factory = RequestFactory()
+    rows = []
+    created = 0
+    for total in steps:
+        Customer.objects.bulk_create(
+            Customer(name=f'Cliente Selector {i}', customer_code=f'S{i:07d}') for i in range(created, total)
+        )
+        created = total
+        for label, view, path in (('add_order', add_order, '/orders/add/'), ('orders_report', orders_report, '/reports/orders/')):
+            response, queries, elapsed = measure(view, _staff_request(factory, 'get', path))
+            rows.append({'página': label, 'clientes': total, 'KB': round(len(response.content) / 1024, 1),
+                         'consultas': queries, 'ms': round(elapsed, 2)})
+    search.rebuild({search.CUSTOMER: Customer})
+    # rebuild() renueva la marca al confirmar, y aquí nunca se confirma.
+    cache.set(search.CUSTOMERS_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    for label in ('sin caché', 'en caché'):
+        request = _staff_request(factory, 'get', '/search_customers/', {'term': 'selector', 'page': 2})
+        response, queries, elapsed = measure(search_customers, request)
+        rows.append({'página': f'search_customers ({label})', 'clientes': created,
+                     'KB': round(len(response.content) / 1024, 1), 'consultas': queries, 'ms': round(elapsed, 2)})
+    return rows
+
+
+@scenario('scanner')
+def scanner(customers=5000, orders_per_customer=10):
+    """Lectura de la pistola de códigos: `core.lookup` contra buscar el pedido con `icontains` y JOIN."""
+    from django.test import Client
+
+    from .identifiers import bulk_create_with_identifiers
+    from .lookup import lookup
+    from .models import Customer, Order
+
+    Customer.objects.bulk_create(
+        Customer(name=f'Cliente Pistola {i}', customer_code=f'P{i:07d}') for i in range(customers)
+    )
+    customer_ids = list(Customer.objects.filter(customer_code__startswith='P').values_list('pk', flat=True))
+    for start in range(0, len(customer_ids), 1000):
+        bulk_create_with_identifiers(
+            Order(customer_id=customer_id, weight=Decimal('3.0'), weight_price_per_kg=Decimal('5.00'),
+                  final_price=Decimal('15.00'))
+            for customer_id in customer_ids[start:start + 1000]
+            for _ in range(orders_per_customer)
+        )
+    order = Order.objects.order_by('-pk').first()
+    customer = Customer(name='Cliente Pistola')
+    customer.save()
+
+    def old_lookup(code):
+        return list(Customer.objects.filter(order__order_code__icontains=code).distinct()[:1])
+
+    client = Client()
+    client.force_login(User.objects.filter(is_staff=True).first() or User.objects.create_user('benchmark', is_staff=True))
+    cases = [
+        ('order_code (icontains + JOIN + distinct)', old_lookup, order.order_code),
+        ('order_code', lookup, order.order_code),
+        ('short_id', lookup, order.short_id),
+        ('id', lookup, f'#{order.pk}'),
+        ('código de cliente', lookup, customer.customer_code),
+        ('sin coincidencia', lookup, 'SIN-CODIGO'),
+        ('GET /scan/ (order_code)', lambda code: client.get('/scan/', {'q': code}), order.order_code),
+    ]
+    rows = []
+    for label, func, code in cases:
+        func(code)
+        _, queries, elapsed = measure(func, code)
+        rows.append({'lectura': label, 'consultas': queries, 'ms': round(elapsed, 2)})
+    return rows
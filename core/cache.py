@@ -0,0 +1,245 @@
+# laundry_app/core/cache.py
+"""
+Backend de caché compartido entre procesos, guardado en un archivo SQLite.
+
+`LocMemCache` vive dentro de cada worker de gunicorn: cada uno arranca en
+frío y lo que guarda uno (por ejemplo los widgets que registra
+django-select2) no lo ve otro. Este backend usa un archivo SQLite local en
+modo WAL, así que todos los procesos de la máquina comparten las mismas
+entradas sin depender de un servicio externo.
+
+Configuración (settings.CACHES):
+
+    'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': '/ruta/cache.sqlite3',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'TABLE': 'cache',          # tabla dentro del archivo
+            'MAX_ENTRIES': 10000,      # límite de entradas (LRU)
+            'CULL_FREQUENCY': 3,       # al pasarse, borra 1/3 de las menos usadas
+            'ACCESS_RESOLUTION': 60,   # segundos entre marcas de último uso
+        },
+    }
+
+- Vencimiento: cada entrada guarda su momento de expiración; las vencidas
+  no se devuelven y se borran al limpiar.
+- LRU: cada lectura marca el último uso, pero solo si la marca anterior
+  tiene más de ACCESS_RESOLUTION segundos, para que leer no obligue a
+  escribir en cada petición. Al superar MAX_ENTRIES se borran primero las
+  vencidas y luego las de uso más antiguo.
+- `incr()`/`decr()` son atómicos entre procesos (`BEGIN IMMEDIATE`). Los
+  enteros se guardan como INTEGER de SQLite; el resto, serializado con pickle.
+- Las versiones por clave (`version=`, `incr_version()`) son las de Django:
+  la versión forma parte de la clave guardada.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Rango de INTEGER en SQLite; fuera de él se serializa con pickle.
+_INT_MIN, _INT_MAX = -(2 ** 63), 2 ** 63 - 1
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._table = options.get('TABLE', 'cache')
+        self._access_resolution = float(options.get('ACCESS_RESOLUTION', 60))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------
+    # Conexión
+    # ------------------------------------------------------------------
+
+    def _connection(self):
+        """Conexión propia de este hilo y proceso (las de un proceso padre no se reutilizan)."""
+        db = getattr(self._local, 'db', None)
+        if db is not None and self._local.pid == os.getpid():
+            return db
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self._path, timeout=self._busy_timeout, isolation_level=None, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        table = self._table
+        db.execute(
+            f'CREATE TABLE IF NOT EXISTS "{table}" ('
+            'key TEXT PRIMARY KEY, value BLOB, expires REAL, accessed REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        db.execute(f'CREATE INDEX IF NOT EXISTS "{table}_accessed" ON "{table}" (accessed)')
+        db.execute(f'CREATE INDEX IF NOT EXISTS "{table}_expires" ON "{table}" (expires)')
+        self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @contextmanager
+    def _write(self):
+        """Transacción de escritura: toma el bloqueo al empezar para que leer y escribir sea atómico."""
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    # ------------------------------------------------------------------
+    # Serialización y vencimiento
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int and _INT_MIN <= value <= _INT_MAX:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(stored):
+        if isinstance(stored, int):
+            return stored
+        return pickle.loads(stored)
+
+    @staticmethod
+    def _expired(expires, now):
+        return expires is not None and expires <= now
+
+    def _cull(self, db, now):
+        """Borra las entradas vencidas y, si siguen sobrando, las de uso más antiguo."""
+        table = self._table
+        db.execute(f'DELETE FROM "{table}" WHERE expires IS NOT NULL AND expires <= ?', (now,))
+        count = db.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        if count < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            db.execute(f'DELETE FROM "{table}"')
+            return
+        db.execute(
+            f'DELETE FROM "{table}" WHERE key IN '
+            f'(SELECT key FROM "{table}" ORDER BY accessed LIMIT ?)',
+            (max(count // self._cull_frequency, 1),),
+        )
+
+    def _mark_used(self, rows, now):
+        """Actualiza el último uso de las claves leídas cuya marca ya es vieja."""
+        stale = [key for key, accessed in rows if now - accessed >= self._access_resolution]
+        if stale:
+            db = self._connection()
+            db.executemany(f'UPDATE "{self._table}" SET accessed = ? WHERE key = ?', [(now, key) for key in stale])
+
+    # ------------------------------------------------------------------
+    # API de caché de Django
+    # ------------------------------------------------------------------
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as db:
+            self._cull(db, now)
+            db.execute(
+                f'INSERT INTO "{self._table}" (key, value, expires, accessed) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires, '
+                f'accessed = excluded.accessed WHERE "{self._table}".expires IS NOT NULL AND "{self._table}".expires <= ?',
+                (key, self._encode(value), self.get_backend_timeout(timeout), now, now),
+            )
+            return db.execute('SELECT changes()').fetchone()[0] > 0
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        row = self._connection().execute(
+            f'SELECT value, expires, accessed FROM "{self._table}" WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or self._expired(row[1], now):
+            return default
+        self._mark_used([(key, row[2])], now)
+        return self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connection().execute(
+            f'SELECT key, value, expires, accessed FROM "{self._table}" WHERE key IN ({placeholders})', list(keys)
+        ).fetchall()
+        rows = [row for row in rows if not self._expired(row[2], now)]
+        self._mark_used([(row[0], row[3]) for row in rows], now)
+        return {keys[row[0]]: self._decode(row[1]) for row in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), self._encode(value), expires, now)
+            for key, value in data.items()
+        ]
+        with self._write() as db:
+            self._cull(db, now)
+            db.executemany(
+                f'INSERT INTO "{self._table}" (key, value, expires, accessed) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed',
+                rows,
+            )
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._connection().execute(
+            f'UPDATE "{self._table}" SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as db:
+            row = db.execute(f'SELECT value, expires FROM "{self._table}" WHERE key = ?', (key,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                raise ValueError("Key '%s' not found" % key)
+            value = self._decode(row[0]) + delta
+            db.execute(
+                f'UPDATE "{self._table}" SET value = ?, accessed = ? WHERE key = ?',
+                (self._encode(value), now, key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(f'DELETE FROM "{self._table}" WHERE key = ?', (key,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            placeholders = ', '.join('?' * len(keys))
+            self._connection().execute(f'DELETE FROM "{self._table}" WHERE key IN ({placeholders})', keys)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            f'SELECT 1 FROM "{self._table}" WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._connection().execute(f'DELETE FROM "{self._table}"')
@@ -0,0 +1,101 @@
+# laundry_app/core/config.py
+"""
+Configuración del negocio (`AppConfiguration`) con tipos y valores por defecto.
+
+La tabla guarda textos sueltos por clave; antes cada formulario, ticket y
+página de PDF la volvía a leer y convertía por su cuenta. `app_settings()`
+la lee una sola vez por proceso, convierte cada valor a su tipo (por
+ejemplo `price_per_kg` a `Decimal`) y usa el valor por defecto si falta o
+no se puede convertir.
+
+Para que los demás workers vean los cambios, guardar o borrar una
+configuración cambia una marca de versión en la caché compartida
+(core.cache). Cada lectura compara esa marca con la que tenía al cargar y,
+si cambió, vuelve a leer la tabla. Comparar la marca no consulta la base.
+"""
+import threading
+import uuid
+from dataclasses import dataclass, fields
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+
+VERSION_KEY = 'app_settings:version'
+
+
+@dataclass(frozen=True)
+class AppSettings:
+    """Valores de configuración ya convertidos. Cada campo indica su clave en la tabla."""
+    business_name: str = 'Mi Lavandería'
+    business_address: str = 'Dirección no configurada'
+    business_phone: str = ''
+    price_per_kg: Decimal = Decimal('5.00')
+
+
+# Campo de AppSettings -> clave en AppConfiguration (cuando no coinciden).
+_KEYS = {'price_per_kg': 'default_price_per_kg'}
+
+
+def setting_key(name):
+    """Clave de `AppConfiguration` donde se guarda el campo `name` de `AppSettings`."""
+    return _KEYS.get(name, name)
+
+
+def _parse(field, raw):
+    if field.type is Decimal:
+        try:
+            return Decimal(raw.strip())
+        except (InvalidOperation, AttributeError):
+            return field.default
+    return raw
+
+
+def load_app_settings():
+    """Lee la tabla (una consulta) y devuelve un `AppSettings`."""
+    from .models import AppConfiguration
+
+    keys = {setting_key(f.name): f for f in fields(AppSettings)}
+    stored = dict(AppConfiguration.objects.filter(key__in=keys).values_list('key', 'value'))
+    return AppSettings(**{
+        field.name: _parse(field, stored[key])
+        for key, field in keys.items() if key in stored
+    })
+
+
+_lock = threading.Lock()
+_loaded = None  # (versión, AppSettings)
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # La marca se perdió (caché vaciada o descartada): se crea una nueva,
+        # con lo que todos los procesos recargan una vez.
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def app_settings():
+    """Configuración vigente, desde la copia del proceso mientras la versión no cambie."""
+    global _loaded
+    version = _current_version()
+    loaded = _loaded
+    if loaded is not None and loaded[0] == version:
+        return loaded[1]
+    with _lock:
+        settings = load_app_settings()
+        _loaded = (version, settings)
+    return settings
+
+
+def app_settings_version():
+    """Marca de versión vigente de la configuración (cambia con cada guardado)."""
+    return _current_version()
+
+
+def bump_app_settings_version():
+    """Invalida la copia de la configuración en todos los procesos."""
+    global _loaded
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    _loaded = None
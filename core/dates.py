@@ -0,0 +1,66 @@
+# laundry_app/core/dates.py
+"""
+Filtros por fecha local que aprovechan los índices sobre `created_at`.
+
+Con USE_TZ las fechas se guardan en UTC. Un filtro como
+`created_at__date=hoy` obliga a la base a convertir cada fila a la hora de
+Lima antes de comparar (en SQLite con una función Python por fila), así que
+ningún índice sirve. Aquí se hace al revés: el día local se convierte una
+sola vez en un rango UTC semiabierto `[inicio, fin)` y la base compara la
+columna tal cual, con una búsqueda por rango en el índice.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def as_date(value):
+    """Acepta un `date` o un texto 'AAAA-MM-DD'. Devuelve None si está vacío o no es válido."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return parse_date(str(value))
+    except ValueError:
+        return None
+
+
+def day_start(day):
+    """Medianoche (hora local) del día `day`, como datetime con zona horaria."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def local_range(date_from=None, date_to=None):
+    """
+    Rango semiabierto `(inicio, fin)` que cubre los días locales de
+    `date_from` a `date_to`, ambos inclusive. Cualquiera de los dos puede
+    faltar (None) y el rango queda abierto por ese lado.
+    """
+    date_from, date_to = as_date(date_from), as_date(date_to)
+    start = day_start(date_from) if date_from else None
+    end = day_start(date_to + timedelta(days=1)) if date_to else None
+    return start, end
+
+
+def date_range_q(date_from=None, date_to=None, field='created_at'):
+    """
+    Filtro `Q` equivalente a `field__date__gte=date_from` y
+    `field__date__lte=date_to`, pero como rango sobre la columna.
+    """
+    start, end = local_range(date_from, date_to)
+    q = Q()
+    if start is not None:
+        q &= Q(**{f'{field}__gte': start})
+    if end is not None:
+        q &= Q(**{f'{field}__lt': end})
+    return q
+
+
+def day_q(day, field='created_at'):
+    """Filtro `Q` para un solo día local (equivale a `field__date=day`)."""
+    return date_range_q(day, day, field)
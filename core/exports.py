@@ -0,0 +1,179 @@
+# laundry_app/core/exports.py
+"""
+Exportaciones a CSV que se envían mientras se generan.
+
+Antes cada exportación armaba el archivo completo en memoria (y pedía el
+cliente de cada pedido con una consulta aparte) antes de enviar el primer
+byte. Aquí cada tipo de fila sale de una proyección `values_list()` con los
+JOIN necesarios, leída por tandas con `.iterator()`, y `csv_response()` la
+va escribiendo en un `StreamingHttpResponse`: la memoria no depende de la
+cantidad de filas y la descarga empieza con la primera tanda.
+
+Las funciones `*_rows` reciben un queryset ya filtrado y devuelven
+generadores de `(fecha, fila)`, ordenados por fecha, para que `by_date()`
+pueda intercalar varios orígenes (pedidos, ventas, gastos) sin ordenarlos en
+memoria.
+"""
+import csv
+import heapq
+import io
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Filas por lectura de la base y por bloque enviado al navegador.
+CHUNK_SIZE = 2000
+
+
+def localizer():
+    """
+    Función que pasa fechas a la hora local. La zona horaria se obtiene una
+    vez por exportación: `timezone.localtime()` la busca de nuevo en cada
+    llamada y en 100 mil filas eso pesa.
+    """
+    tz = timezone.get_current_timezone()
+
+    def local(moment):
+        return moment.astimezone(tz) if timezone.is_aware(moment) else moment
+    return local
+
+
+def _stream(header, rows, bom=True):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if bom:
+        # Para que Excel reconozca el archivo como UTF-8 (tildes, eñes).
+        buffer.write('\ufeff')
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def csv_response(filename, header, rows):
+    """`StreamingHttpResponse` que descarga `rows` (iterable de listas) como CSV."""
+    response = StreamingHttpResponse(_stream(header, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def by_date(*sources, reverse=False):
+    """
+    Intercala los generadores de `(fecha, fila)` de `sources`, cada uno ya
+    ordenado por fecha, y devuelve solo las filas en orden cronológico (o del
+    más reciente al más antiguo con `reverse`, si así vienen ordenados).
+    """
+    for _, row in heapq.merge(*sources, key=lambda item: item[0], reverse=reverse):
+        yield row
+
+
+def _labels(model, field):
+    return dict(model._meta.get_field(field).flatchoices)
+
+
+# ---------------------------------------------------------------------------
+# Proyecciones por tipo de fila
+# ---------------------------------------------------------------------------
+
+def order_rows(orders):
+    """Pedidos: código, cliente, fecha, estado, estado de pago y monto."""
+    local = localizer()
+    status = _labels(orders.model, 'status')
+    payment_status = _labels(orders.model, 'payment_status')
+    values = orders.order_by('created_at', 'pk').values_list(
+        'created_at', 'order_code', 'customer__name', 'status', 'payment_status', 'final_price'
+    )
+    for created_at, code, customer, state, paid, amount in values.iterator(chunk_size=CHUNK_SIZE):
+        created_at = local(created_at)
+        yield created_at, [
+            code, customer, created_at.strftime('%d/%m/%Y %H:%M'),
+            status.get(state, state), payment_status.get(paid, paid), amount,
+        ]
+
+
+def income_rows(orders, sales):
+    """Ingresos de pedidos y ventas intercalados por fecha: fecha, tipo, cliente y monto."""
+    local = localizer()
+    def orders_part():
+        values = orders.order_by('created_at', 'pk').values_list('created_at', 'customer__name', 'final_price')
+        for created_at, customer, amount in values.iterator(chunk_size=CHUNK_SIZE):
+            yield created_at, [local(created_at).strftime('%d/%m/%Y'), 'Pedido', customer, amount]
+
+    def sales_part():
+        values = sales.order_by('created_at', 'pk').values_list('created_at', 'customer__name', 'total_amount')
+        for created_at, customer, amount in values.iterator(chunk_size=CHUNK_SIZE):
+            yield created_at, [local(created_at).strftime('%d/%m/%Y'), 'Venta', customer or 'Mostrador', amount]
+
+    return by_date(orders_part(), sales_part())
+
+
+def sale_item_rows(items):
+    """Una fila por producto vendido: venta, fecha, cliente, producto, cantidad, precio y subtotal."""
+    local = localizer()
+    values = items.order_by('sale__created_at', 'sale_id', 'pk').values_list(
+        'sale__created_at', 'sale_id', 'sale__customer__name', 'product__name', 'quantity', 'unit_price'
+    )
+    for created_at, sale_id, customer, product, quantity, unit_price in values.iterator(chunk_size=CHUNK_SIZE):
+        created_at = local(created_at)
+        yield created_at, [
+            sale_id, created_at.strftime('%d/%m/%Y %H:%M'), customer or 'Mostrador',
+            product, quantity, unit_price, quantity * unit_price,
+        ]
+
+
+def expense_rows(expenses):
+    """Gastos: fecha, descripción, categoría y monto."""
+    categories = _labels(expenses.model, 'category')
+    values = expenses.order_by('expense_date', 'pk').values_list('expense_date', 'description', 'category', 'amount')
+    for day, description, category, amount in values.iterator(chunk_size=CHUNK_SIZE):
+        yield day, [day.strftime('%d/%m/%Y'), description, categories.get(category, category), amount]
+
+
+def ledger_rows(orders=None, sales=None, expenses=None):
+    """
+    Movimientos del reporte de rentabilidad (ingresos y egresos) intercalados
+    por día: fecha, tipo, descripción y monto. Los orígenes en None se omiten.
+    """
+    categories = _labels(expenses.model, 'category') if expenses is not None else {}
+    local = localizer()
+
+    def orders_part():
+        values = orders.order_by('created_at', 'pk').values_list('created_at', 'order_code', 'customer__name', 'final_price')
+        for created_at, code, customer, amount in values.iterator(chunk_size=CHUNK_SIZE):
+            day = local(created_at).date()
+            yield day, [day.strftime('%d/%m/%Y'), 'Ingreso', f"Pedido #{code} - Cliente: {customer}", amount]
+
+    def sales_part():
+        values = sales.order_by('created_at', 'pk').values_list('created_at', 'pk', 'total_amount')
+        for created_at, sale_id, amount in values.iterator(chunk_size=CHUNK_SIZE):
+            day = local(created_at).date()
+            yield day, [day.strftime('%d/%m/%Y'), 'Ingreso', f"Venta #{sale_id}", amount]
+
+    def expenses_part():
+        values = expenses.order_by('expense_date', 'pk').values_list('expense_date', 'description', 'category', 'amount')
+        for day, description, category, amount in values.iterator(chunk_size=CHUNK_SIZE):
+            yield day, [
+                day.strftime('%d/%m/%Y'), 'Egreso',
+                f"{description} ({categories.get(category, category)})", amount,
+            ]
+
+    parts = []
+    if orders is not None:
+        parts.append(orders_part())
+    if sales is not None:
+        parts.append(sales_part())
+    if expenses is not None:
+        parts.append(expenses_part())
+    return by_date(*parts)
+
+
+def customer_rows(customers):
+    """Clientes: código, nombre, teléfono, email y fecha de registro."""
+    local = localizer()
+    values = customers.order_by('pk').values_list('customer_code', 'name', 'phone', 'email', 'created_at')
+    for code, name, phone, email, created_at in values.iterator(chunk_size=CHUNK_SIZE):
+        yield [code, name, phone, email, local(created_at).strftime('%Y-%m-%d %H:%M') if created_at else '']
@@ -1,8 +1,60 @@
 from django import forms
-from .models import Customer, Order, Category, OrderCategory, AppConfiguration, Product, Sale, SaleItem, Expense
+from .models import Customer, Order, Category, OrderCategory, Product, Sale, SaleItem, Expense
 from django_select2.forms import Select2Widget
+from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
 from decimal import Decimal
 
+from .config import app_settings
+from .phones import normalize_phone
+
+
+class PreloadedModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField que, si se le asigna `preloaded` (dict pk -> objeto), valida
+    contra esos objetos en memoria en vez de hacer una consulta por campo.
+    """
+    preloaded = None
+
+    def to_python(self, value):
+        if self.preloaded is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.preloaded[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value}
+            )
+
+class CustomerSelect(forms.Select):
+    """
+    Select de clientes que Select2 llena por AJAX desde `search_customers`
+    (paginado y en caché). Solo dibuja la opción vacía y la elegida, así la
+    página no crece con la cantidad de clientes.
+    """
+    def __init__(self, attrs=None):
+        defaults = {
+            'data-ajax--url': reverse_lazy('search_customers'),
+            'data-ajax--cache': 'true',
+            'data-ajax--delay': '250',
+            'data-minimum-input-length': '1',
+        }
+        super().__init__({**defaults, **(attrs or {})})
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        selected = [v for v in value if str(v).isdigit()]
+        if hasattr(choices, 'queryset'):
+            # ModelChoiceIterator: una consulta por la opción elegida, no toda la tabla.
+            self.choices = [('', choices.field.empty_label or '')] + [
+                choices.choice(obj) for obj in choices.queryset.filter(pk__in=selected)
+            ]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
+
+
 class CustomerForm(forms.ModelForm):
     class Meta:
         model = Customer
@@ -18,6 +70,16 @@ class CustomerForm(forms.ModelForm):
             'email': forms.EmailInput(attrs={'class': 'w-full p-2 border rounded'}),
         }
 
+    def clean_phone(self):
+        """Rechaza un teléfono que ya tiene otro cliente, se haya escrito como se haya escrito."""
+        phone = self.cleaned_data.get('phone')
+        phone_e164 = normalize_phone(phone)
+        if phone_e164:
+            existing = Customer.objects.filter(phone_e164=phone_e164).exclude(pk=self.instance.pk).first()
+            if existing:
+                raise ValidationError(f"Este teléfono ya está registrado para {existing}.")
+        return phone
+
 class OrderForm(forms.ModelForm):
     class Meta:
         model = Order
@@ -31,7 +93,7 @@ class OrderForm(forms.ModelForm):
             'notes': 'Notas Adicionales',
         }
         widgets = {
-            'customer': forms.Select(attrs={'class': 'select2-field'}),
+            'customer': CustomerSelect(attrs={'class': 'select2-field'}),
             'notes': forms.Textarea(attrs={'rows': 3, 'placeholder': 'Ej: Ropa delicada, no usar secadora...'}),
             'weight': forms.NumberInput(attrs={'placeholder': 'Ej: 5.5'})
         }
@@ -42,17 +104,14 @@ class OrderForm(forms.ModelForm):
         self.fields['weight_price_per_kg'].widget.attrs['readonly'] = True
         self.fields['weight_price_per_kg'].widget.attrs['class'] = 'bg-gray-100'
 
-        # --- CORRECCIÓN ---
-        # Obtenemos el precio por kilo desde la configuración de forma segura
-        try:
-            # Buscamos la configuración específica por su clave
-            price_setting = AppConfiguration.objects.get(key='default_price_per_kg')
-            # Establecemos el valor inicial del campo, convirtiéndolo a Decimal
-            self.fields['weight_price_per_kg'].initial = Decimal(price_setting.value)
-        except (AppConfiguration.DoesNotExist, ValueError):
-            # Si no se encuentra o el valor no es un número, usamos un valor por defecto
-            # Esto evita que la aplicación se caiga si la configuración no está establecida
-            self.fields['weight_price_per_kg'].initial = Decimal('5.00')
+        # Al recibir el formulario el precio lo fija la vista; el valor inicial
+        # solo hace falta para mostrarlo vacío.
+        if self.is_bound:
+            return
+
+        # Precio por kilo de la configuración: ya viene como Decimal y con su
+        # valor por defecto si no está establecido (ver core.config).
+        self.fields['weight_price_per_kg'].initial = app_settings().price_per_kg
 
 class OrderEditForm(forms.ModelForm):
     class Meta:
@@ -107,17 +166,22 @@ class OrderCategoryForm(forms.ModelForm):
             'category': forms.Select(attrs={'class': 'w-full p-2 border rounded'}),
         }
 
-class OrderCategoryInlineForm(forms.ModelForm):
-    class Meta:
-        model = Order.categories.through
-        fields = ['category', 'quantity']
-        widgets = {
-            'quantity': forms.NumberInput(attrs={'min': '1', 'value': '1'}),
-        }
-        labels = {
-            'category': 'Categoría',
-            'quantity': 'Cantidad'
-        }
+class OrderCategoryInlineForm(forms.Form):
+    """
+    Línea (categoría + cantidad) del formset de pedidos. Las filas de
+    OrderCategory las crea la vista, por eso no es un ModelForm: validar la
+    instancia del modelo costaba una consulta extra por cada línea.
+    """
+    category = PreloadedModelChoiceField(queryset=Category.objects.all(), label='Categoría')
+    quantity = forms.IntegerField(
+        min_value=0, initial=1, label='Cantidad',
+        widget=forms.NumberInput(attrs={'min': '1', 'value': '1'})
+    )
+
+    def __init__(self, *args, categories=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # `categories` (dict pk -> Category) lo pasa el formset para validar sin consultas.
+        self.fields['category'].preloaded = categories
 
 class CustomerFilterForm(forms.Form):
     """
@@ -239,7 +303,7 @@ class SaleForm(forms.ModelForm):
             'payment_status': 'Estado del Pago',
         }
         widgets = {
-            'customer': Select2Widget(attrs={'class': 'w-full', 'data-placeholder': 'Seleccione un cliente o déjelo en blanco para una venta de mostrador'}),
+            'customer': CustomerSelect(attrs={'class': 'w-full', 'data-placeholder': 'Seleccione un cliente o déjelo en blanco para una venta de mostrador'}),
             'payment_method': forms.Select(attrs={'class': 'w-full p-2 border rounded'}),
             'payment_status': forms.Select(attrs={'class': 'w-full p-2 border rounded'}),
         }
@@ -309,7 +373,7 @@ class ReportFilterForm(forms.Form):
         queryset=Customer.objects.all().order_by('name'),
         required=False,
         label="Cliente",
-        widget=forms.Select(attrs={'id': 'customer-select2'})
+        widget=CustomerSelect(attrs={'id': 'customer-select2'})
     )
     
     # Filtros de Fecha
@@ -0,0 +1,440 @@
+# laundry_app/core/identifiers.py
+"""
+Generación de los identificadores públicos del sistema.
+
+Los códigos de cliente salen de un pool precalculado y mezclado
+(`CustomerCodePool`): asignar uno es tomar la primera fila libre, sin bucles
+de "generar y preguntar si existe" contra la tabla de clientes. Cuando al
+pool le quedan pocos códigos se encola su ampliación (trabajo
+`refill_customer_code_pool`), que puede insertar cientos de miles de filas:
+ninguna petición tiene que esperarla.
+
+Los `short_id` y `order_code` de los pedidos son aleatorios y confían en la
+restricción UNIQUE de la base de datos: se intenta el INSERT y, solo si choca,
+se generan otros y se reintenta. Cada intento y cada choque se cuentan (por
+tandas, en la caché compartida) para saber cuándo un largo de código se
+está llenando.
+"""
+import logging
+import secrets
+import string
+import threading
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import Length
+
+logger = logging.getLogger(__name__)
+
+# Ancho con el que se imprimieron las primeras tarjetas. Los códigos nunca se
+# acortan: al agotarse un ancho se pasa al siguiente y los viejos siguen valiendo.
+CUSTOMER_CODE_MIN_WIDTH = 4
+CUSTOMER_CODE_MAX_WIDTH = 8  # max_length de Customer.customer_code
+
+_ALLOCATE_ATTEMPTS = 10
+# Bloqueo para que un solo proceso amplíe el pool de códigos de cliente.
+GROW_LOCK_KEY = 'identifiers:customer-code-pool:grow'
+GROW_LOCK_TIMEOUT = 15 * 60
+GROW_LOCK_WAIT = 30
+# Con menos códigos libres que esto se encola la ampliación del pool.
+CUSTOMER_CODE_LOW_WATERMARK = 1000
+REFILL_TASK = 'refill_customer_code_pool'
+_INSERT_ATTEMPTS = 5
+# Contadores de intentos y choques: se acumulan en el proceso y se pasan a la
+# caché compartida por tandas (ver `_count`).
+COUNTER_FLUSH_SIZE = 100
+COUNTER_FLUSH_INTERVAL = 60
+_pending_counters = defaultdict(int)
+_counters_lock = threading.Lock()
+_counters_flushed_at = time.monotonic()
+_RESERVE_CHUNK = 500
+
+SHORT_ID_ALPHABET = string.ascii_letters + string.digits
+SHORT_ID_LENGTH = 8
+ORDER_CODE_ALPHABET = string.ascii_uppercase + string.digits
+ORDER_CODE_LENGTH = 6
+
+
+class IdentifierSpaceExhausted(Exception):
+    """No quedan identificadores libres y no se puede ampliar el espacio."""
+
+
+def _mix(value, key):
+    """Función de ronda de la red de Feistel: mezcla `value` con `key` (64 bits)."""
+    value = ((value ^ key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 31)
+
+
+def permuted_customer_codes(width, rounds=4):
+    """
+    Genera todos los códigos de `width` dígitos, uno por uno, en un orden
+    pseudoaleatorio distinto en cada llamada, sin armar la lista completa.
+
+    Una red de Feistel con claves al azar es una permutación de los números
+    de `bits` bits; los que caen fuera de 0..10**width - 1 se vuelven a
+    permutar hasta caer dentro ("cycle walking"), lo que da una permutación
+    del rango de códigos. La memoria no depende del ancho.
+    """
+    total = 10 ** width
+    bits = (total - 1).bit_length()
+    bits += bits % 2
+    half = bits // 2
+    mask = (1 << half) - 1
+    keys = [secrets.randbits(64) for _ in range(rounds)]
+
+    def permute(value):
+        left, right = value >> half, value & mask
+        for key in keys:
+            left, right = right, left ^ (_mix(right, key) & mask)
+        return (left << half) | right
+
+    for number in range(total):
+        value = permute(number)
+        while value >= total:
+            value = permute(value)
+        yield f"{value:0{width}d}"
+
+
+def fill_customer_code_pool(width, batch_size=2000):
+    """
+    Añade al pool todos los códigos libres de `width` dígitos, ya mezclados.
+    Como se insertan en orden aleatorio, el orden por id del pool es la
+    permutación. Se generan e insertan por bloques de `batch_size`, cada uno
+    en su transacción, así que la memoria no crece con el ancho y los
+    primeros códigos ya se pueden asignar mientras se insertan los demás.
+    Devuelve cuántos códigos se añadieron.
+    """
+    from .models import Customer, CustomerCodePool
+
+    if not CUSTOMER_CODE_MIN_WIDTH <= width <= CUSTOMER_CODE_MAX_WIDTH:
+        raise IdentifierSpaceExhausted(f"Ancho de código no soportado: {width}")
+
+    codes = permuted_customer_codes(width)
+    added = 0
+    while True:
+        batch = list(islice(codes, batch_size))
+        if not batch:
+            break
+        with transaction.atomic():
+            taken = set(Customer.objects.filter(customer_code__in=batch).values_list('customer_code', flat=True))
+            taken.update(CustomerCodePool.objects.filter(code__in=batch).values_list('code', flat=True))
+            fresh = [CustomerCodePool(code=code, width=width) for code in batch if code not in taken]
+            # Si otro proceso insertó alguno entretanto, se omite en vez de fallar.
+            CustomerCodePool.objects.bulk_create(fresh, batch_size=batch_size, ignore_conflicts=True)
+        added += len(fresh)
+    logger.info("Pool de códigos de cliente ampliado: %s códigos de %s dígitos.", added, width)
+    return added
+
+
+def _widest_code_width():
+    """Ancho más grande en uso, ya sea por un cliente o por el pool."""
+    from .models import Customer, CustomerCodePool
+
+    customer_width = Customer.objects.aggregate(width=Max(Length('customer_code')))['width'] or 0
+    pool_width = CustomerCodePool.objects.aggregate(width=Max('width'))['width'] or 0
+    return max(customer_width, pool_width, CUSTOMER_CODE_MIN_WIDTH)
+
+
+def _grow_unlocked():
+    from .models import CustomerCodePool
+
+    width = _widest_code_width()
+    if CustomerCodePool.objects.filter(width=width).exists():
+        width += 1
+    added = fill_customer_code_pool(width)
+    if not added:
+        # El ancho actual está completo: pasamos al siguiente.
+        added = fill_customer_code_pool(width + 1)
+    return added
+
+
+def grow_customer_code_pool(wait=GROW_LOCK_WAIT):
+    """
+    Rellena el pool con el siguiente ancho de código. Si el ancho actual aún
+    tiene códigos que no están ni asignados ni en el pool, se usa ese mismo.
+
+    Solo un proceso a la vez amplía el pool (bloqueo en la caché compartida).
+    Los demás esperan hasta `wait` segundos a que aparezcan códigos y, si
+    aparecen, vuelven sin agregar nada (devuelven 0).
+    """
+    from .models import CustomerCodePool
+
+    token = secrets.token_hex(8)
+    deadline = time.monotonic() + wait
+    while not cache.add(GROW_LOCK_KEY, token, timeout=GROW_LOCK_TIMEOUT):
+        if CustomerCodePool.objects.exists():
+            return 0
+        if time.monotonic() >= deadline:
+            raise IdentifierSpaceExhausted("Otro proceso está ampliando el pool de códigos de cliente.")
+        time.sleep(0.1)
+    try:
+        return _grow_unlocked()
+    finally:
+        if cache.get(GROW_LOCK_KEY) == token:
+            cache.delete(GROW_LOCK_KEY)
+
+
+def customer_code_pool_is_low():
+    """True si quedan menos de CUSTOMER_CODE_LOW_WATERMARK códigos en el pool (sin contarlos todos)."""
+    from .models import CustomerCodePool
+
+    return not CustomerCodePool.objects.order_by('id')[CUSTOMER_CODE_LOW_WATERMARK - 1:].exists()
+
+
+def _schedule_refill():
+    from .jobs import enqueue
+    from .models import Job
+
+    if not Job.objects.filter(name=REFILL_TASK, status__in=[Job.PENDING, Job.RUNNING]).exists():
+        enqueue(REFILL_TASK)
+
+
+def refill_customer_code_pool():
+    """
+    Amplía el pool si le quedan pocos códigos (lo ejecuta el trabajo
+    `refill_customer_code_pool`). Devuelve cuántos códigos se añadieron.
+    """
+    if not customer_code_pool_is_low():
+        return 0
+    return grow_customer_code_pool()
+
+
+def allocate_customer_code():
+    """
+    Toma el siguiente código libre del pool en O(1): lee la primera fila y la borra.
+
+    Si otro worker se llevó la misma fila entre el SELECT y el DELETE, el DELETE
+    no borra nada y se intenta con la siguiente. En PostgreSQL además se usa
+    SKIP LOCKED para que los workers no compitan por la misma fila.
+
+    Si al pool le quedan pocos códigos se encola su ampliación, en la misma
+    transacción. Solo si se vacía antes de que el trabajo termine se amplía
+    aquí mismo, como último recurso (ver `grow_customer_code_pool`).
+    """
+    from .models import CustomerCodePool
+
+    for _ in range(_ALLOCATE_ATTEMPTS):
+        with transaction.atomic():
+            head = CustomerCodePool.objects.order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                head = head.select_for_update(skip_locked=True)
+            row = head.values_list('id', 'code').first()
+            if row is not None:
+                deleted, _ = CustomerCodePool.objects.filter(pk=row[0]).delete()
+                if deleted:
+                    if customer_code_pool_is_low():
+                        _schedule_refill()
+                    return row[1]
+                continue
+        logger.warning("Pool de códigos de cliente vacío, ampliando al siguiente ancho dentro de la petición.")
+        grow_customer_code_pool()
+    raise IdentifierSpaceExhausted("No se pudo asignar un código de cliente.")
+
+
+def customer_code_capacity():
+    """
+    Ocupación del espacio de códigos de cliente, para el comando `identifiers`.
+    `width` es el ancho que se está repartiendo ahora mismo.
+    """
+    from .models import CustomerCodePool
+
+    available_by_width = dict(
+        CustomerCodePool.objects.values('width').annotate(n=Count('id')).values_list('width', 'n')
+    )
+    width = min(available_by_width) if available_by_width else _widest_code_width()
+    total = 10 ** width
+    available = available_by_width.get(width, 0)
+    return {
+        'width': width,
+        'total': total,
+        'available': available,
+        'used_ratio': (total - available) / total,
+        'available_by_width': available_by_width,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Identificadores aleatorios de pedidos (short_id / order_code)
+# ---------------------------------------------------------------------------
+
+def random_code(alphabet, length):
+    """Código aleatorio criptográficamente seguro."""
+    return ''.join(secrets.choice(alphabet) for _ in range(length))
+
+
+def generate_short_id():
+    """ID público de 8 caracteres para la URL de estado del pedido."""
+    return random_code(SHORT_ID_ALPHABET, SHORT_ID_LENGTH)
+
+
+def generate_order_code():
+    """Código legible de 6 caracteres que se imprime en el ticket."""
+    return random_code(ORDER_CODE_ALPHABET, ORDER_CODE_LENGTH)
+
+
+ORDER_IDENTIFIERS = {
+    'short_id': generate_short_id,
+    'order_code': generate_order_code,
+}
+
+
+def _counter_key(model, field, kind):
+    return f"identifiers:{model._meta.label_lower}.{field}:{kind}"
+
+
+def _count(model, field, kind, amount=1):
+    """
+    Suma al contador `kind` del campo. Se acumula en el proceso y se pasa a
+    la caché compartida cada COUNTER_FLUSH_SIZE intentos o
+    COUNTER_FLUSH_INTERVAL segundos, para no escribir en ella en cada INSERT.
+    Los choques, que son raros, se pasan enseguida.
+    """
+    key = _counter_key(model, field, kind)
+    with _counters_lock:
+        _pending_counters[key] += amount
+        due = (
+            kind == 'collisions'
+            or sum(_pending_counters.values()) >= COUNTER_FLUSH_SIZE
+            or time.monotonic() - _counters_flushed_at >= COUNTER_FLUSH_INTERVAL
+        )
+    if due:
+        flush_identifier_counters()
+
+
+def flush_identifier_counters():
+    """Pasa a la caché compartida los contadores acumulados en este proceso."""
+    global _counters_flushed_at
+    with _counters_lock:
+        pending = dict(_pending_counters)
+        _pending_counters.clear()
+        _counters_flushed_at = time.monotonic()
+    for key, amount in pending.items():
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            # La clave expiró o fue expulsada entre add() e incr().
+            cache.set(key, amount, timeout=None)
+
+
+def identifier_stats(model=None):
+    """
+    Intentos y choques acumulados por campo. Una tasa de choques que crece
+    indica que ese largo de código se está quedando chico. Los intentos de
+    otros procesos que aún no llegaron a la caché no se cuentan.
+    """
+    if model is None:
+        from .models import Order as model
+
+    flush_identifier_counters()
+
+    stats = {}
+    for field in ORDER_IDENTIFIERS:
+        attempts = cache.get(_counter_key(model, field, 'attempts'), 0)
+        collisions = cache.get(_counter_key(model, field, 'collisions'), 0)
+        stats[field] = {
+            'attempts': attempts,
+            'collisions': collisions,
+            'collision_rate': collisions / attempts if attempts else 0.0,
+        }
+    return stats
+
+
+def _collided_fields(model, values_by_field):
+    """Tras un IntegrityError, averigua qué identificadores ya existían."""
+    return [
+        field for field, values in values_by_field.items()
+        if model._default_manager.filter(**{f"{field}__in": values}).exists()
+    ]
+
+
+def save_with_identifiers(instance, save, generators=ORDER_IDENTIFIERS):
+    """
+    Rellena los identificadores vacíos de `instance` y llama a `save()` dentro
+    de un savepoint. Si la restricción UNIQUE los rechaza, genera otros y
+    reintenta; cualquier otro IntegrityError se propaga tal cual.
+    """
+    model = type(instance)
+    pending = [field for field in generators if not getattr(instance, field)]
+    if not pending:
+        return save()
+
+    for _ in range(_INSERT_ATTEMPTS):
+        for field in pending:
+            setattr(instance, field, generators[field]())
+            _count(model, field, 'attempts')
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            collided = _collided_fields(model, {f: [getattr(instance, f)] for f in pending})
+            if not collided:
+                raise
+            for field in collided:
+                _count(model, field, 'collisions')
+            logger.info("Choque de %s al guardar %s, reintentando.", ', '.join(collided), model.__name__)
+    raise IdentifierSpaceExhausted(f"No se pudo generar un identificador único para {model.__name__}.")
+
+
+def reserve_identifiers(count, model=None, generators=ORDER_IDENTIFIERS):
+    """
+    Genera `count` juegos de identificadores ya verificados contra la base de
+    datos, para importaciones masivas. Cuesta una consulta por cada bloque de
+    500 códigos en vez de una por pedido. Devuelve una lista de dicts.
+    """
+    if model is None:
+        from .models import Order as model
+
+    columns = {}
+    for field, generate in generators.items():
+        chosen = []
+        seen = set()
+        while len(chosen) < count:
+            candidates = []
+            while len(candidates) < min(count - len(chosen), _RESERVE_CHUNK):
+                code = generate()
+                if code not in seen:
+                    seen.add(code)
+                    candidates.append(code)
+            taken = set(model._default_manager.filter(**{f"{field}__in": candidates}).values_list(field, flat=True))
+            _count(model, field, 'attempts', len(candidates))
+            if taken:
+                _count(model, field, 'collisions', len(taken))
+            chosen.extend(code for code in candidates if code not in taken)
+        columns[field] = chosen
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+def bulk_create_with_identifiers(objs, batch_size=500, generators=ORDER_IDENTIFIERS):
+    """
+    `bulk_create` para objetos que necesitan identificadores únicos. Reserva
+    los que falten en bloque y, si otro worker se adelanta con alguno, vuelve
+    a reservar e insertar todo el lote.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    model = type(objs[0])
+    # Solo se (re)generan los campos que venían vacíos en cada objeto.
+    pending = [(obj, [f for f in generators if not getattr(obj, f)]) for obj in objs]
+    pending = [(obj, fields) for obj, fields in pending if fields]
+
+    for _ in range(_INSERT_ATTEMPTS):
+        for (obj, fields), identifiers in zip(pending, reserve_identifiers(len(pending), model, generators)):
+            for field in fields:
+                setattr(obj, field, identifiers[field])
+        try:
+            with transaction.atomic():
+                return model._default_manager.bulk_create(objs, batch_size=batch_size)
+        except IntegrityError:
+            values = {f: [getattr(obj, f) for obj, fields in pending if f in fields] for f in generators}
+            collided = _collided_fields(model, {f: v for f, v in values.items() if v})
+            if not collided:
+                raise
+            for field in collided:
+                _count(model, field, 'collisions')
+    raise IdentifierSpaceExhausted(f"No se pudieron reservar identificadores para {model.__name__}.")
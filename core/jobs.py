@@ -0,0 +1,154 @@
+# laundry_app/core/jobs.py
+"""
+Cola de trabajos en segundo plano guardada en la propia base de datos.
+
+Los efectos secundarios lentos (generar el PDF de un reporte, borrar
+archivos, ampliar el pool de códigos de cliente; ver core/tasks.py) no se
+ejecutan dentro de la petición: se encolan con `enqueue()` y los procesa el
+comando `python manage.py run_jobs`.
+
+La fila del trabajo se inserta en la misma transacción que los datos que la
+originan, así que si la transacción se revierte el trabajo desaparece con ella,
+y el worker nunca ve un trabajo cuyo pedido o cliente aún no está confirmado.
+Con `JOBS_EAGER = True` (por defecto en desarrollo) no hace falta el worker:
+el trabajo se ejecuta en el mismo proceso con `transaction.on_commit`.
+
+Los trabajos terminados y fallidos se borran pasado un tiempo
+(`prune_finished`, que el worker llama cada `PRUNE_INTERVAL`).
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Segundos de espera antes del reintento N: 10, 40, 90, 160...
+RETRY_BASE_SECONDS = 10
+# Un trabajo RUNNING más viejo que esto se considera abandonado por un worker caído.
+STALE_AFTER = timedelta(minutes=10)
+# Cuánto se conservan los trabajos terminados (DONE) y fallidos (FAILED, para revisar el error).
+DONE_RETENTION = timedelta(days=7)
+FAILED_RETENTION = timedelta(days=30)
+PRUNE_INTERVAL = timedelta(hours=1)
+_PRUNE_CHUNK = 1000
+
+_registry = {}
+
+
+def task(name, max_attempts=5):
+    """Decorador que registra una función como trabajo encolable."""
+    def decorator(func):
+        _registry[name] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    """
+    Encola el trabajo `name` con los argumentos de `payload` (deben ser
+    serializables a JSON). Devuelve el `Job` creado.
+    """
+    from .models import Job
+
+    if name not in _registry:
+        raise KeyError(f"Trabajo no registrado: {name}")
+    job = Job.objects.create(name=name, payload=payload, max_attempts=_registry[name][1])
+    if getattr(settings, 'JOBS_EAGER', False):
+        transaction.on_commit(lambda: run_job(job.pk))
+    return job
+
+
+def _claim(job_id):
+    """Marca el trabajo como RUNNING solo si sigue PENDING. Devuelve True si lo obtuvimos."""
+    from .models import Job
+
+    return Job.objects.filter(pk=job_id, status=Job.PENDING).update(
+        status=Job.RUNNING, locked_at=timezone.now(), attempts=F('attempts') + 1,
+    ) == 1
+
+
+def run_job(job_id):
+    """Ejecuta un trabajo concreto. Devuelve False si otro worker ya lo tomó."""
+    from .models import Job
+
+    if not _claim(job_id):
+        return False
+    job = Job.objects.get(pk=job_id)
+    func, _ = _registry.get(job.name, (None, None))
+    try:
+        if func is None:
+            raise KeyError(f"Trabajo no registrado: {job.name}")
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            logger.error("Trabajo %s (%s) falló definitivamente:\n%s", job.pk, job.name, error)
+        else:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * job.attempts ** 2)
+            logger.warning("Trabajo %s (%s) falló, reintento %s.", job.pk, job.name, job.attempts)
+        job.last_error = error
+        job.locked_at = None
+        job.save(update_fields=['status', 'run_after', 'last_error', 'locked_at', 'updated_at'])
+    else:
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE, locked_at=None, last_error='', updated_at=timezone.now())
+    return True
+
+
+def requeue_stale():
+    """Devuelve a PENDING los trabajos que quedaron RUNNING por un worker que murió."""
+    from .models import Job
+
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=timezone.now() - STALE_AFTER).update(
+        status=Job.PENDING, locked_at=None,
+    )
+
+
+def run_pending(limit=20):
+    """Procesa hasta `limit` trabajos listos. Devuelve cuántos se ejecutaron."""
+    from .models import Job
+
+    ready = (
+        Job.objects.filter(status=Job.PENDING, run_after__lte=timezone.now())
+        .order_by('run_after', 'id').values_list('pk', flat=True)[:limit]
+    )
+    return sum(1 for job_id in list(ready) if run_job(job_id))
+
+
+def prune_finished(now=None):
+    """
+    Borra los trabajos DONE con más de `DONE_RETENTION` y los FAILED con más
+    de `FAILED_RETENTION` desde su último cambio, por bloques para no tener
+    la tabla bloqueada. Devuelve cuántos se borraron.
+    """
+    from .models import Job
+
+    now = now or timezone.now()
+    expired = Job.objects.filter(
+        Q(status=Job.DONE, updated_at__lt=now - DONE_RETENTION)
+        | Q(status=Job.FAILED, updated_at__lt=now - FAILED_RETENTION)
+    )
+    deleted = 0
+    while True:
+        ids = list(expired.values_list('pk', flat=True)[:_PRUNE_CHUNK])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(pk__in=ids).delete()[0]
+
+
+def queue_stats():
+    """Profundidad de la cola: cantidad por estado y antigüedad del pendiente más viejo."""
+    from .models import Job
+
+    counts = dict(Job.objects.values('status').annotate(n=Count('id')).values_list('status', 'n'))
+    oldest = Job.objects.filter(status=Job.PENDING).aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'counts': {status: counts.get(status, 0) for status, _ in Job.STATUS_CHOICES},
+        'oldest_pending_age': timezone.now() - oldest if oldest else None,
+    }
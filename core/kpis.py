@@ -0,0 +1,107 @@
+# laundry_app/core/kpis.py
+"""
+Indicadores (KPI) del dashboard calculados con una sola consulta.
+
+Antes cada tarjeta hacía su propio SUM o COUNT sobre la tabla de pedidos.
+Aquí se hace un único `aggregate()` con agregaciones condicionales
+(`Sum(..., filter=...)`, `Count(..., filter=...)`) restringido a las filas
+que pueden aportar algo: los pedidos del mes (o de la semana, si empezó el
+mes anterior), los que siguen en proceso o listos, los que no están pagados
+y los que tienen saldo. Cada una de esas condiciones tiene su índice, así
+que el costo depende de los pedidos recientes y pendientes, no del total
+histórico.
+
+El total histórico de pedidos es lo único que no cabe en esa ventana; se
+puede pedir exacto (COUNT(*)) o aproximado (`approximate_count()`).
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Count, DecimalField, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .dates import day_start
+
+ZERO = Decimal('0.00')
+
+INCOME_PAYMENT_STATUSES = ['PAID', 'PARTIAL']
+OPEN_PAYMENT_STATUSES = ['PENDING', 'PARTIAL']
+
+
+@dataclass(frozen=True)
+class DashboardKpis:
+    """Resumen de las tarjetas del dashboard."""
+    daily_income: Decimal
+    weekly_income: Decimal
+    monthly_income: Decimal
+    total_due: Decimal
+    processing_count: int
+    ready_count: int
+    payment_pending_count: int
+    total_count: int
+    # True si `total_count` es una estimación y no un COUNT(*) exacto.
+    total_is_approximate: bool = False
+
+
+def _money_sum(field, condition):
+    return Coalesce(Sum(field, filter=condition), ZERO, output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def approximate_count(model):
+    """
+    Cantidad aproximada de filas de `model` sin recorrer la tabla.
+
+    En PostgreSQL usa la estimación del planificador (`reltuples`). En las
+    demás bases usa el mayor id, que se lee directo del índice de la clave
+    primaria: con ids autoincrementales es exacto mientras no se borren filas
+    y, si se borran, solo sobreestima.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+    return model._default_manager.aggregate(last=Max('pk'))['last'] or 0
+
+
+def dashboard_kpis(today=None, approximate_total=False):
+    """
+    Calcula las tarjetas del dashboard para el día local `today` (hoy por
+    defecto). Con `approximate_total=True` el total histórico de pedidos se
+    estima con `approximate_count()` en lugar de contarse.
+    """
+    from .models import Order
+
+    today = today or timezone.localdate()
+    start_of_week = day_start(today - timedelta(days=today.weekday()))
+    start_of_month = day_start(today.replace(day=1))
+    start_of_today = day_start(today)
+    start_of_tomorrow = day_start(today + timedelta(days=1))
+
+    income = Q(payment_status__in=INCOME_PAYMENT_STATUSES) & ~Q(status='CANCELLED')
+    processing = Q(status='PROCESSING')
+    ready = Q(status='READY')
+    payment_pending = Q(payment_status__in=OPEN_PAYMENT_STATUSES)
+    due = Q(remaining_amount__gt=0)
+
+    # Solo las filas que alguna tarjeta puede necesitar; cada rama del OR usa su índice.
+    window = Q(created_at__gte=min(start_of_week, start_of_month)) | processing | ready | payment_pending | due
+    totals = Order.objects.filter(window).aggregate(
+        daily_income=_money_sum('final_price', income & Q(created_at__gte=start_of_today, created_at__lt=start_of_tomorrow)),
+        weekly_income=_money_sum('final_price', income & Q(created_at__gte=start_of_week)),
+        monthly_income=_money_sum('final_price', income & Q(created_at__gte=start_of_month)),
+        total_due=_money_sum('remaining_amount', due),
+        processing_count=Count('pk', filter=processing),
+        ready_count=Count('pk', filter=ready),
+        payment_pending_count=Count('pk', filter=payment_pending),
+    )
+
+    if approximate_total:
+        total_count = approximate_count(Order)
+    else:
+        total_count = Order.objects.count()
+    return DashboardKpis(total_count=total_count, total_is_approximate=approximate_total, **totals)
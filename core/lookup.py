@@ -0,0 +1,138 @@
+# laundry_app/core/lookup.py
+"""
+Búsqueda exacta de lo que lee la pistola de códigos en el mostrador.
+
+La lectura se clasifica por su forma y cada interpretación posible se
+resuelve con una consulta sobre un índice (UNIQUE, la clave primaria o el
+del teléfono), en orden de probabilidad, hasta que una encuentra algo:
+
+- URL de un QR propio (`/o/<short_id>/`, `/customer/<código>/`, ...):
+  se lee el identificador de la ruta.
+- `#123`: id del pedido.
+- Solo dígitos: con 4 dígitos primero el código de cliente y luego el id
+  del pedido; con otro largo, al revés (los códigos de cliente crecen
+  hasta 8 dígitos cuando se agotan los de 4).
+- 6 caracteres alfanuméricos: `order_code` (en mayúsculas).
+- 8 caracteres alfanuméricos: `short_id` (distingue mayúsculas).
+- Un teléfono (`+51 987 654 321`, 9 dígitos o más): `phone_e164` del cliente.
+- Cualquier otra cosa: `barcode`.
+
+Una lectura normal cuesta una sola consulta; nada recorre tablas ni usa
+`icontains`. Para texto libre está `core.search`.
+"""
+import re
+from urllib.parse import urlparse
+
+from django.urls import Resolver404, resolve, reverse
+
+from .identifiers import CUSTOMER_CODE_MAX_WIDTH, CUSTOMER_CODE_MIN_WIDTH, ORDER_CODE_LENGTH, SHORT_ID_LENGTH
+from .phones import looks_like_phone, normalize_phone
+
+CUSTOMER = 'customer'
+ORDER = 'order'
+
+_ALNUM = re.compile(r'^[A-Za-z0-9]+$')
+
+# Vista de la URL leída -> (tipo, campo) del identificador que trae en la ruta.
+_URL_TARGETS = {
+    'order_status': (ORDER, 'short_id'),
+    'edit_order': (ORDER, 'pk'),
+    'download_order_pdf': (ORDER, 'pk'),
+    'customer_status': (CUSTOMER, 'customer_code'),
+    'manage_customer_orders': (CUSTOMER, 'customer_code'),
+}
+
+
+def _from_url(text):
+    """(tipo, campo, valor) si `text` es una URL de la aplicación, o None."""
+    path = urlparse(text).path if '://' in text else text
+    if not path.startswith('/'):
+        return None
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    if match.url_name not in _URL_TARGETS or not match.kwargs:
+        return None
+    kind, field = _URL_TARGETS[match.url_name]
+    return kind, field, str(next(iter(match.kwargs.values())))
+
+
+def candidates(text):
+    """Interpretaciones de `text` como (tipo, campo, valor), de la más probable a la menos."""
+    text = (text or '').strip()
+    if not text:
+        return []
+    from_url = _from_url(text)
+    if from_url:
+        return [from_url]
+    if text.startswith('#') and text[1:].isdigit():
+        return [(ORDER, 'pk', text[1:])]
+
+    found = []
+    if text.isdigit():
+        customer_code = [(CUSTOMER, 'customer_code', text)] if (
+            CUSTOMER_CODE_MIN_WIDTH <= len(text) <= CUSTOMER_CODE_MAX_WIDTH
+        ) else []
+        order_id = [(ORDER, 'pk', text)] if len(text) <= 18 else []
+        found += customer_code + order_id if len(text) == CUSTOMER_CODE_MIN_WIDTH else order_id + customer_code
+    if _ALNUM.match(text):
+        if len(text) == ORDER_CODE_LENGTH:
+            found.append((ORDER, 'order_code', text.upper()))
+        if len(text) == SHORT_ID_LENGTH:
+            found.append((ORDER, 'short_id', text))
+    if looks_like_phone(text) and (text.startswith('+') or len(text) > CUSTOMER_CODE_MAX_WIDTH):
+        phone = normalize_phone(text)
+        if phone:
+            found.append((CUSTOMER, 'phone_e164', phone))
+    found.append((ORDER, 'barcode', text))
+    return found
+
+
+def _order(field, value):
+    from .models import Order
+
+    order = (
+        Order.objects.filter(**{field: value})
+        .values('pk', 'order_code', 'short_id', 'status', 'customer__name', 'customer__customer_code')
+        .first()
+    )
+    if order is None:
+        return None
+    status = dict(Order.STATUS_CHOICES).get(order['status'], order['status'])
+    return {
+        'type': ORDER, 'id': order['pk'], 'ref': order['order_code'] or str(order['pk']),
+        'label': f"Pedido {order['order_code'] or order['pk']}",
+        'detail': f"{order['customer__name']} · {status}",
+        'url': reverse('edit_order', args=[order['pk']]),
+    }
+
+
+def _customer(field, value):
+    from .models import Customer
+
+    customer = Customer.objects.filter(**{field: value}).values('pk', 'name', 'customer_code', 'phone').first()
+    if customer is None:
+        return None
+    return {
+        'type': CUSTOMER, 'id': customer['pk'], 'ref': customer['customer_code'],
+        'label': customer['name'],
+        'detail': ' · '.join(filter(None, [f"Código {customer['customer_code']}", customer['phone']])),
+        'url': reverse('manage_customer_orders', args=[customer['customer_code']]),
+    }
+
+
+_RESOLVERS = {ORDER: _order, CUSTOMER: _customer}
+
+
+def lookup(text):
+    """
+    Pedido o cliente que identifica exactamente `text`, como dict con `type`,
+    `id`, `ref`, `label`, `detail` y `url` (la página para gestionarlo), o
+    None si no corresponde a ninguno.
+    """
+    for kind, field, value in candidates(text):
+        result = _RESOLVERS[kind](field, value)
+        if result is not None:
+            return result
+    return None
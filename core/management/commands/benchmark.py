@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.benchmarks import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = "Ejecuta un escenario de medición (consultas SQL y tiempos). Los datos de prueba se revierten al final."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', nargs='?', help="Escenario a ejecutar. Sin argumento, lista los disponibles.")
+
+    def handle(self, *args, **options):
+        name = options['scenario']
+        if not name:
+            for scenario_name, func in sorted(SCENARIOS.items()):
+                self.stdout.write(f"{scenario_name}: {(func.__doc__ or '').strip()}")
+            return
+        if name not in SCENARIOS:
+            raise CommandError(f"Escenario desconocido: {name}. Disponibles: {', '.join(sorted(SCENARIOS))}")
+
+        with transaction.atomic():
+            rows = SCENARIOS[name]()
+            transaction.set_rollback(True)
+
+        if not rows:
+            return
+        headers = list(rows[0])
+        widths = [max(len(str(h)), *(len(str(row[h])) for row in rows)) for h in headers]
+        self.stdout.write('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+        for row in rows:
+            self.stdout.write('  '.join(str(row[h]).ljust(w) for h, w in zip(headers, widths)))
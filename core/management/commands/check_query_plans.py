@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.query_plans import check_view, create_sample_data, plan_cases
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta EXPLAIN QUERY PLAN sobre las consultas de las vistas principales y falla si alguna "
+        "recorre completa la tabla de pedidos, ventas o gastos. Los datos de ejemplo se revierten."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Muestra el plan de cada consulta.")
+
+    def _write_query(self, result):
+        self.stdout.write(f"       {result['sql'][:200]}")
+        for detail in result['plan']:
+            self.stdout.write(f"         {detail}")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Esta verificación usa EXPLAIN QUERY PLAN de SQLite.")
+
+        failures = 0
+        with transaction.atomic():
+            data = create_sample_data()
+            for path, known in plan_cases(data):
+                results = check_view(path)
+                bad = [r for r in results if set(r['full_scans']) - set(known)]
+                tolerated = {table for r in results for table in r['full_scans'] if table in known}
+                if bad:
+                    self.stdout.write(self.style.ERROR(f"FALLA  {path}  ({len(results)} consultas)"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"OK     {path}  ({len(results)} consultas)"))
+                for table in sorted(tolerated):
+                    self.stdout.write(self.style.WARNING(f"       conocido en {table}: {known[table]}"))
+                for result in results if options['verbose_plans'] else bad:
+                    self._write_query(result)
+                failures += len(bad)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{failures} consultas recorren tablas completas sin índice.")
+        self.stdout.write(self.style.SUCCESS("Ninguna consulta nueva recorre tablas completas."))
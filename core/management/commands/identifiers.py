@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core.identifiers import customer_code_capacity, grow_customer_code_pool, identifier_stats
+
+
+class Command(BaseCommand):
+    help = "Muestra la ocupación de los códigos de cliente y pedidos, y permite ampliar el pool de clientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grow', action='store_true',
+            help="Prellena el pool con el siguiente ancho de código (p. ej. de 4 a 5 dígitos).",
+        )
+
+    def handle(self, *args, **options):
+        if options['grow']:
+            added = grow_customer_code_pool()
+            self.stdout.write(self.style.SUCCESS(f"Se añadieron {added} códigos al pool."))
+
+        capacity = customer_code_capacity()
+        self.stdout.write(
+            f"Códigos de cliente ({capacity['width']} dígitos): "
+            f"{capacity['available']} libres de {capacity['total']} "
+            f"({capacity['used_ratio']:.1%} usado)"
+        )
+        for width, available in sorted(capacity['available_by_width'].items()):
+            self.stdout.write(f"  {width} dígitos: {available} en el pool")
+
+        self.stdout.write("Choques al generar códigos de pedido:")
+        for field, stats in identifier_stats().items():
+            self.stdout.write(
+                f"  {field}: {stats['collisions']} de {stats['attempts']} intentos "
+                f"({stats['collision_rate']:.2%})"
+            )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.stats import refresh_customer_stats, stale_customer_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcilia el resumen por cliente (CustomerStats) con los pedidos y ventas. "
+        "Sin opciones recalcula solo los clientes que no coinciden."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Recalcula el resumen de todos los clientes.")
+        parser.add_argument('--check', action='store_true', help="Solo informa cuántos resúmenes no coinciden.")
+
+    def handle(self, *args, **options):
+        if options['all']:
+            written = refresh_customer_stats()
+            self.stdout.write(self.style.SUCCESS(f"Se recalcularon {written} resúmenes de cliente."))
+            return
+
+        stale = stale_customer_stats()
+        self.stdout.write(f"Resúmenes desactualizados: {len(stale)}")
+        if options['check'] or not stale:
+            return
+        written = refresh_customer_stats(stale)
+        self.stdout.write(self.style.SUCCESS(f"Se corrigieron {written} resúmenes de cliente."))
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.rollups import rebuild_daily_stats, refresh_daily_stats, stale_daily_stats
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Fecha inválida: {value} (use AAAA-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcilia los totales diarios (DailyStats) con los pedidos, ventas y gastos. "
+        "Sin opciones recalcula solo los días que no coinciden."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="Primer día a revisar (AAAA-MM-DD).")
+        parser.add_argument('--to', dest='date_to', help="Último día a revisar, inclusive (AAAA-MM-DD).")
+        parser.add_argument('--all', action='store_true', help="Recalcula todos los días del rango, coincidan o no.")
+        parser.add_argument('--check', action='store_true', help="Solo informa qué días no coinciden.")
+
+    def handle(self, *args, **options):
+        date_from = _parse_date(options['date_from']) if options['date_from'] else None
+        date_to = _parse_date(options['date_to']) if options['date_to'] else None
+
+        if options['all']:
+            written = rebuild_daily_stats(date_from, date_to)
+            self.stdout.write(self.style.SUCCESS(f"Se recalcularon {written} filas de totales diarios."))
+            return
+
+        stale = stale_daily_stats(date_from, date_to)
+        self.stdout.write(f"Días desactualizados: {len(stale)}")
+        for day in stale[:20]:
+            self.stdout.write(f"  {day:%Y-%m-%d}")
+        if options['check'] or not stale:
+            return
+        refresh_daily_stats(stale)
+        self.stdout.write(self.style.SUCCESS(f"Se corrigieron {len(stale)} días."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core import search
+from core.models import Customer, Order, Product, Sale
+
+
+class Command(BaseCommand):
+    help = (
+        "Vuelve a armar el índice de búsqueda (core.search) con todos los clientes, pedidos, "
+        "productos y ventas. Úselo después de cargas masivas o cambios hechos fuera de la aplicación."
+    )
+
+    def handle(self, *args, **options):
+        if not search.available():
+            self.stdout.write("Esta base no usa el índice de búsqueda (solo SQLite).")
+            return
+        total = search.rebuild({
+            search.CUSTOMER: Customer, search.ORDER: Order, search.PRODUCT: Product, search.SALE: Sale,
+        })
+        self.stdout.write(self.style.SUCCESS(f"Se indexaron {total} objetos."))
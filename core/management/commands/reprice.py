@@ -0,0 +1,58 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import Order
+from core.pricing import reprice_orders, stale_orders
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Fecha inválida: {value} (use AAAA-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula el precio de los pedidos con las tarifas actuales, en bloques por id. "
+        "Se puede interrumpir y reanudar con --after-id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="Fecha inicial de creación (AAAA-MM-DD).")
+        parser.add_argument('--to', dest='date_to', help="Fecha final de creación, inclusive (AAAA-MM-DD).")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Pedidos por bloque (por defecto 1000).")
+        parser.add_argument('--after-id', type=int, default=0, help="Reanudar después de este id de pedido.")
+        parser.add_argument(
+            '--include-cancelled', action='store_true', help="Recalcular también los pedidos anulados.",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help="Solo cuenta los pedidos cuyo precio cambiaría.",
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if not options['include_cancelled']:
+            orders = orders.exclude(status='CANCELLED')
+        if options['date_from']:
+            start = timezone.make_aware(datetime.combine(_parse_date(options['date_from']), time.min))
+            orders = orders.filter(created_at__gte=start)
+        if options['date_to']:
+            end = timezone.make_aware(datetime.combine(_parse_date(options['date_to']), time.max))
+            orders = orders.filter(created_at__lte=end)
+        orders = orders.filter(pk__gt=options['after_id'])
+
+        stale = stale_orders(orders).count()
+        self.stdout.write(f"Pedidos con precio desactualizado: {stale}")
+        if options['dry_run'] or not stale:
+            return
+
+        def report(last_id, updated):
+            self.stdout.write(f"  bloque hasta id {last_id}: {updated} pedidos")
+
+        updated = reprice_orders(
+            stale_orders(orders), chunk_size=options['chunk_size'], after_id=options['after_id'], on_chunk=report,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Se recalcularon {updated} pedidos."))
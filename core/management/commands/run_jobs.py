@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import PRUNE_INTERVAL, prune_finished, queue_stats, requeue_stale, run_pending
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de trabajos en segundo plano (PDF de reportes, archivos, etc.)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Procesa lo pendiente y termina.")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Segundos de espera cuando la cola está vacía.")
+        parser.add_argument('--batch', type=int, default=20, help="Trabajos a tomar por vuelta.")
+        parser.add_argument('--stats', action='store_true', help="Solo muestra la profundidad de la cola.")
+        parser.add_argument(
+            '--prune', action='store_true', help="Solo borra los trabajos terminados y fallidos ya vencidos.",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            stats = queue_stats()
+            for status, count in stats['counts'].items():
+                self.stdout.write(f"{status}: {count}")
+            if stats['oldest_pending_age'] is not None:
+                self.stdout.write(f"Pendiente más antiguo: hace {stats['oldest_pending_age']}")
+            return
+
+        if options['prune']:
+            self.stdout.write(f"Se borraron {prune_finished()} trabajos vencidos.")
+            return
+
+        self.stdout.write("Worker de trabajos iniciado.")
+        pruned_at = None
+        while True:
+            if pruned_at is None or time.monotonic() - pruned_at >= PRUNE_INTERVAL.total_seconds():
+                prune_finished()
+                pruned_at = time.monotonic()
+            requeue_stale()
+            processed = run_pending(limit=options['batch'])
+            if options['once'] and not processed:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
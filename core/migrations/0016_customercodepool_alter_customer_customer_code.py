@@ -0,0 +1,53 @@
+# Generated by Django 4.2.11 on 2026-10-17 10:03
+
+import random
+
+from django.db import migrations, models
+
+# Ancho de las primeras tarjetas. Copiado aquí (y no importado de
+# core.identifiers) para que la migración no cambie si cambia ese módulo.
+INITIAL_WIDTH = 4
+
+
+def fill_initial_pool(apps, schema_editor):
+    Customer = apps.get_model('core', 'Customer')
+    CustomerCodePool = apps.get_model('core', 'CustomerCodePool')
+    taken = set(Customer.objects.values_list('customer_code', flat=True))
+    codes = [code for code in (f"{n:0{INITIAL_WIDTH}d}" for n in range(10 ** INITIAL_WIDTH)) if code not in taken]
+    random.SystemRandom().shuffle(codes)
+    CustomerCodePool.objects.bulk_create(
+        (CustomerCodePool(code=code, width=INITIAL_WIDTH) for code in codes),
+        batch_size=2000,
+    )
+
+
+def empty_pool(apps, schema_editor):
+    apps.get_model('core', 'CustomerCodePool').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_expense'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerCodePool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=8, unique=True)),
+                ('width', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Código de Cliente Disponible',
+                'verbose_name_plural': 'Códigos de Cliente Disponibles',
+            },
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='customer_code',
+            field=models.CharField(blank=True, max_length=8, unique=True),
+        ),
+        migrations.RunPython(fill_initial_pool, empty_pool),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-17 10:07
+
+from django.db import migrations
+
+
+def schedule_qr_file_cleanup(apps, schema_editor):
+    """Los QR ahora se generan al vuelo: encola el borrado de los PNG viejos."""
+    Customer = apps.get_model('core', 'Customer')
+    Order = apps.get_model('core', 'Order')
+    Job = apps.get_model('core', 'Job')
+
+    # Trabajos de dibujo de QR que ya no tienen quién los ejecute.
+    Job.objects.filter(name__in=['customer_qr', 'order_qr'], status__in=['PENDING', 'RUNNING']).delete()
+
+    paths = [
+        path
+        for model in (Customer, Order)
+        for path in model.objects.exclude(qr_code='').exclude(qr_code__isnull=True).values_list('qr_code', flat=True)
+    ]
+    if paths:
+        Job.objects.create(name='delete_files', payload={'paths': paths})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(schedule_qr_file_cleanup, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='customer',
+            name='qr_code',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='qr_code',
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.11 on 2026-10-17 10:12
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+
+
+def backfill_amounts(apps, schema_editor):
+    # Copia de las reglas de precio de esta versión; la migración no debe
+    # importar core.pricing, que puede cambiar después.
+    Order = apps.get_model('core', 'Order')
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+    final_price = Case(
+        When(price_adjusted_by_user=True, then=F('original_calculated_price') - F('discount_amount')),
+        default=F('original_calculated_price'),
+        output_field=money,
+    )
+    remaining_amount = Case(
+        When(payment_status='PARTIAL', then=final_price - F('partial_amount')),
+        When(payment_status='PENDING', then=final_price),
+        default=Value(Decimal('0.00')),
+        output_field=money,
+    )
+    Order.objects.update(final_price=final_price, remaining_amount=remaining_amount)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_remove_qr_code_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='final_price',
+            field=models.DecimalField(decimal_places=2, default=0.0, editable=False, help_text='Precio final del pedido (con ajustes). Se actualiza al guardar.', max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='remaining_amount',
+            field=models.DecimalField(decimal_places=2, default=0.0, editable=False, help_text='Monto que falta pagar. Se actualiza al guardar.', max_digits=10),
+        ),
+        migrations.RunPython(backfill_amounts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['final_price'], name='order_final_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'remaining_amount'], name='order_customer_remaining_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('remaining_amount__gt', 0)), fields=['remaining_amount'], name='order_outstanding_idx'),
+        ),
+    ]
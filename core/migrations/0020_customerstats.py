@@ -0,0 +1,82 @@
+# Generated by Django 4.2.11 on 2026-10-17 10:15
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+import django.db.models.deletion
+
+
+def build_stats(apps, schema_editor):
+    # Cálculo completo del resumen con los modelos históricos. Es una copia de
+    # core.stats de esta versión: la migración no importa código de la app.
+    Customer = apps.get_model('core', 'Customer')
+    Order = apps.get_model('core', 'Order')
+    Sale = apps.get_model('core', 'Sale')
+    CustomerStats = apps.get_model('core', 'CustomerStats')
+
+    zero = Decimal('0.00')
+    active = ~Q(status='CANCELLED')
+    orders = {
+        row['customer']: row
+        for row in Order.objects.values('customer').annotate(
+            n=Count('id'), spent=Sum('final_price', filter=active),
+            debt=Sum('remaining_amount', filter=active), last=Max('created_at'),
+        )
+    }
+    sales = {
+        row['customer']: row
+        for row in Sale.objects.exclude(customer=None).values('customer').annotate(
+            n=Count('id'), total=Sum('total_amount'), last=Max('created_at'),
+        )
+    }
+    batch = []
+    for customer_id in Customer.objects.values_list('pk', flat=True).iterator(chunk_size=1000):
+        order, sale = orders.get(customer_id, {}), sales.get(customer_id, {})
+        moments = [m for m in (order.get('last'), sale.get('last')) if m is not None]
+        batch.append(CustomerStats(
+            customer_id=customer_id,
+            order_count=order.get('n', 0),
+            lifetime_spent=order.get('spent') or zero,
+            outstanding_debt=order.get('debt') or zero,
+            sale_count=sale.get('n', 0),
+            sales_total=sale.get('total') or zero,
+            last_order_at=order.get('last'),
+            last_sale_at=sale.get('last'),
+            last_activity_at=max(moments) if moments else None,
+        ))
+        if len(batch) >= 500:
+            CustomerStats.objects.bulk_create(batch)
+            batch = []
+    CustomerStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_order_final_price_remaining_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.customer')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_spent', models.DecimalField(decimal_places=2, default=0.0, help_text='Suma del precio final de los pedidos no anulados.', max_digits=12)),
+                ('outstanding_debt', models.DecimalField(decimal_places=2, default=0.0, help_text='Suma de lo que falta pagar de los pedidos no anulados.', max_digits=12)),
+                ('sale_count', models.PositiveIntegerField(default=0)),
+                ('sales_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+                ('last_sale_at', models.DateTimeField(blank=True, null=True)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Cliente',
+                'verbose_name_plural': 'Resúmenes de Clientes',
+                'indexes': [models.Index(fields=['-lifetime_spent'], name='custstats_spent_idx'), models.Index(fields=['-outstanding_debt'], name='custstats_debt_idx'), models.Index(fields=['last_order_at'], name='custstats_last_order_idx')],
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
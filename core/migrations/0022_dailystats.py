@@ -0,0 +1,79 @@
+# Generated by Django 4.2.11 on 2026-10-17 10:25
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def build_daily_stats(apps, schema_editor):
+    # Totales diarios calculados con los modelos históricos. Es una copia de
+    # core.rollups de esta versión: la migración no importa código de la app.
+    Order = apps.get_model('core', 'Order')
+    Sale = apps.get_model('core', 'Sale')
+    Expense = apps.get_model('core', 'Expense')
+    DailyStats = apps.get_model('core', 'DailyStats')
+
+    zero = Decimal('0.00')
+    money = models.DecimalField(max_digits=14, decimal_places=2)
+    rows = []
+    sources = [
+        ('ORDER', Order.objects.exclude(status='CANCELLED'), 'final_price'),
+        ('SALE', Sale.objects.all(), 'total_amount'),
+    ]
+    for source, queryset, amount in sources:
+        grouped = queryset.annotate(day=TruncDate('created_at')).values(
+            'day', 'payment_method', 'payment_status'
+        ).annotate(n=Count('pk'), amount=Coalesce(Sum(amount), zero, output_field=money)).order_by()
+        rows += [
+            DailyStats(
+                day=row['day'], source=source, payment_method=row['payment_method'],
+                payment_status=row['payment_status'], category='', count=row['n'], total=row['amount'],
+            )
+            for row in grouped.iterator()
+        ]
+    grouped = Expense.objects.values('expense_date', 'category').annotate(
+        n=Count('pk'), amount=Coalesce(Sum('amount'), zero, output_field=money)
+    ).order_by()
+    rows += [
+        DailyStats(
+            day=row['expense_date'], source='EXPENSE', payment_method='', payment_status='',
+            category=row['category'], count=row['n'], total=row['amount'],
+        )
+        for row in grouped.iterator()
+    ]
+    DailyStats.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_order_sale_expense_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('source', models.CharField(choices=[('ORDER', 'Pedido'), ('SALE', 'Venta'), ('EXPENSE', 'Gasto')], max_length=10)),
+                ('payment_method', models.CharField(blank=True, default='', max_length=20)),
+                ('payment_status', models.CharField(blank=True, default='', max_length=20)),
+                ('category', models.CharField(blank=True, default='', help_text='Categoría del gasto (solo gastos).', max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Total Diario',
+                'verbose_name_plural': 'Totales Diarios',
+                'indexes': [models.Index(fields=['source', 'day'], name='dailystats_source_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailystats',
+            constraint=models.UniqueConstraint(fields=('day', 'source', 'payment_method', 'payment_status', 'category'), name='dailystats_unique_key'),
+        ),
+        migrations.RunPython(build_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-17 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_dailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('report_type', models.CharField(max_length=30, verbose_name='Reporte')),
+                ('query', models.CharField(blank=True, help_text='Filtros del reporte, como query string.', max_length=500)),
+                ('query_hash', models.CharField(db_index=True, help_text='Reporte y filtros, sin el estado de los datos.', max_length=64)),
+                ('status', models.CharField(choices=[('PENDING', 'En cola'), ('RUNNING', 'Generando'), ('DONE', 'Listo'), ('FAILED', 'Fallido')], default='PENDING', max_length=10, verbose_name='Estado')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Avance (%)')),
+                ('file', models.FileField(blank=True, upload_to='reports/', verbose_name='Archivo')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Reporte PDF Generado',
+                'verbose_name_plural': 'Reportes PDF Generados',
+            },
+        ),
+    ]
@@ -0,0 +1,102 @@
+import unicodedata
+
+from django.db import migrations
+
+# Copia de core.search al momento de esta migración: la migración no debe
+# cambiar si más adelante cambia el índice.
+TABLE = 'core_search'
+CUSTOMER, ORDER, PRODUCT, SALE = 'customer', 'order', 'product', 'sale'
+KIND_CODES = {CUSTOMER: 1, ORDER: 2, PRODUCT: 3, SALE: 4}
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "kind UNINDEXED, object_id UNINDEXED, ref UNINDEXED, label UNINDEXED, detail UNINDEXED, "
+    "title, terms, tokenize = 'trigram')"
+)
+DROP_SQL = f"DROP TABLE IF EXISTS {TABLE}"
+INSERT_SQL = (
+    f"INSERT OR REPLACE INTO {TABLE} (rowid, kind, object_id, ref, label, detail, title, terms) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def customer_document(customer):
+    detail = ' · '.join(filter(None, [f"Código {customer.customer_code}", customer.phone, customer.email]))
+    return customer.customer_code, customer.name, detail, customer.name, [customer.customer_code, customer.phone, customer.email]
+
+
+def order_document(order):
+    created_at = order.created_at.strftime('%d/%m/%Y') if order.created_at else ''
+    return (
+        order.pk, f"Pedido {order.order_code or order.pk}", f"{order.get_status_display()} · {created_at}",
+        order.order_code, [order.short_id, order.barcode, order.notes],
+    )
+
+
+def product_document(product):
+    return (
+        product.pk, product.name, f"S/ {product.price:.2f} · Stock {product.stock}",
+        product.name, [product.description],
+    )
+
+
+def sale_document(sale):
+    customer = sale.customer.name if sale.customer_id else 'Mostrador'
+    products = sale.saleitem_set.values_list('product__name', flat=True)
+    return (
+        sale.pk, f"Venta #{sale.pk}", f"{customer} · S/ {sale.total_amount:.2f}",
+        f"venta {sale.pk}", [customer, *products],
+    )
+
+
+DOCUMENTS = {
+    CUSTOMER: ('Customer', customer_document),
+    ORDER: ('Order', order_document),
+    PRODUCT: ('Product', product_document),
+    SALE: ('Sale', sale_document),
+}
+
+
+def create_search_index(apps, schema_editor, chunk_size=2000):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    with schema_editor.connection.cursor() as cursor:
+        for kind, (model_name, document) in DOCUMENTS.items():
+            queryset = apps.get_model('core', model_name).objects.order_by('pk')
+            if kind == SALE:
+                queryset = queryset.select_related('customer')
+            rows = []
+            for obj in queryset.iterator(chunk_size=chunk_size):
+                ref, label, detail, title, terms = document(obj)
+                rows.append((
+                    obj.pk * 8 + KIND_CODES[kind], kind, obj.pk, str(ref), label, detail,
+                    normalize(title), normalize(' '.join(str(term) for term in terms if term)),
+                ))
+                if len(rows) == chunk_size:
+                    cursor.executemany(INSERT_SQL, rows)
+                    rows = []
+            if rows:
+                cursor.executemany(INSERT_SQL, rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_reportexport'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
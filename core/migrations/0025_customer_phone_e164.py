@@ -0,0 +1,65 @@
+# Generated by Django 4.2.11 on 2026-10-17 11:09
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalize_phone(raw):
+    # Copia de core.phones.normalize_phone al momento de esta migración.
+    raw = (raw or '').strip()
+    digits = re.sub(r'\D', '', raw)
+    if not digits:
+        return None
+    code = str(getattr(settings, 'PHONE_COUNTRY_CODE', '51'))
+    if raw.startswith('+'):
+        number = digits
+    elif digits.startswith('00'):
+        number = digits[2:]
+    elif digits.startswith(code) and len(digits) == len(code) + 9:
+        number = digits
+    else:
+        number = code + digits.lstrip('0')
+    if not 8 <= len(number) <= 15:
+        return None
+    return f'+{number}'
+
+
+def save_chunk(Customer, chunk, connection):
+    Customer.objects.bulk_update(chunk, ['phone_e164'])
+    # El índice de búsqueda (0024, solo SQLite) también guarda el teléfono
+    # normalizado, solo dígitos, entre los términos del cliente.
+    rows = [(customer.phone_e164.lstrip('+'), customer.pk * 8 + 1) for customer in chunk if customer.phone_e164]
+    if connection.vendor == 'sqlite' and rows:
+        with connection.cursor() as cursor:
+            cursor.executemany("UPDATE core_search SET terms = terms || ' ' || %s WHERE rowid = %s", rows)
+
+
+def backfill_phone_e164(apps, schema_editor, chunk_size=2000):
+    Customer = apps.get_model('core', 'Customer')
+    chunk = []
+    customers = Customer.objects.exclude(phone__isnull=True).exclude(phone='').order_by('pk')
+    for customer in customers.iterator(chunk_size=chunk_size):
+        customer.phone_e164 = normalize_phone(customer.phone)
+        chunk.append(customer)
+        if len(chunk) == chunk_size:
+            save_chunk(Customer, chunk, schema_editor.connection)
+            chunk = []
+    save_chunk(Customer, chunk, schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(backfill_phone_e164, migrations.RunPython.noop),
+    ]
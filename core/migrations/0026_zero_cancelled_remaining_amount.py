@@ -0,0 +1,24 @@
+# Generated by Django 4.2.11 on 2026-10-17 12:05
+
+from decimal import Decimal
+
+from django.db import migrations
+
+
+def zero_cancelled(apps, schema_editor):
+    # Un pedido anulado no deja deuda: el saldo guardado pasa a cero para que
+    # los KPIs, el índice parcial de deudas y la auditoría de pagos coincidan
+    # con el resumen de clientes, que ya ignoraba los anulados.
+    Order = apps.get_model('core', 'Order')
+    Order.objects.filter(status='CANCELLED').exclude(remaining_amount=0).update(remaining_amount=Decimal('0.00'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_customer_phone_e164'),
+    ]
+
+    operations = [
+        migrations.RunPython(zero_cancelled, migrations.RunPython.noop),
+    ]
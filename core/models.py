@@ -1,56 +1,97 @@
-from django.db import models
-from django.urls import reverse
-import random
-import string
+from django.db import models, transaction
 from decimal import Decimal
-import secrets
 import uuid 
 from django.utils.timezone import now
 from django.contrib.auth.models import User
 
+from . import search
+from .config import bump_app_settings_version
+from .identifiers import allocate_customer_code, save_with_identifiers
+from .phones import normalize_phone
+from .pricing import calculate_price, line_total, quantize_money, weight_total
+from .rollups import expense_rolled, expense_snapshot, order_rolled, sale_rolled
+from .stats import order_changed, order_snapshot, sale_changed, sale_snapshot
+
 class Customer(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
     phone = models.CharField(max_length=15, blank=True, null=True)
+    # Teléfono normalizado (E.164) que mantiene save(): búsqueda exacta,
+    # duplicados y enlaces de WhatsApp (ver core.phones).
+    phone_e164 = models.CharField(max_length=16, blank=True, null=True, editable=False, db_index=True)
     email = models.EmailField(blank=True, null=True)
-    customer_code = models.CharField(max_length=4, unique=True, blank=True)
-    qr_code = models.ImageField(upload_to='customer_qr_codes/', blank=True, null=True)
+    customer_code = models.CharField(max_length=8, unique=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def generate_customer_code(self):
-        """Genera un código único de 4 dígitos."""
-        while True:
-            code = ''.join(random.choices(string.digits, k=4))
-            if not Customer.objects.filter(customer_code=code).exists():
-                return code
-
-    def generate_qr_code(self):
-        """Genera un QR que apunta a la vista pública del cliente."""
-        import qrcode
-        from django.core.files import File
-        from io import BytesIO
-
-        qr_url = reverse('customer_status', args=[self.customer_code])
-        qr = qrcode.QRCode(version=1, box_size=10, border=4)
-        qr.add_data(f"http://localhost:8000{qr_url}")
-        qr.make(fit=True)
-
-        img = qr.make_image(fill='black', back_color='white')
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        self.qr_code.save(f"qr_customer_{self.customer_code}.png", File(buffer), save=True)
+        """Toma el siguiente código libre del pool precalculado (ver core.identifiers)."""
+        return allocate_customer_code()
 
     def save(self, *args, **kwargs):
-        """Genera el código y el QR al guardar el cliente."""
+        """
+        Genera el código al guardar el cliente y normaliza su teléfono. El QR
+        se sirve al vuelo (core.qr).
+        """
         if not self.customer_code:
             self.customer_code = self.generate_customer_code()
-        if not self.qr_code:
-            self.generate_qr_code()
-        super().save(*args, **kwargs)
+        self.phone_e164 = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_e164'}
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                CustomerStats.objects.get_or_create(customer=self)
+            search.index(search.CUSTOMER, self)
 
     def __str__(self):
         return f"{self.name} (ID: {self.customer_code})"
 
+class CustomerCodePool(models.Model):
+    """
+    Códigos de cliente aún no asignados, insertados en orden aleatorio.
+    Asignar un código es tomar (y borrar) la fila con el id más bajo, así que
+    nunca se consulta la tabla de clientes para buscar un código libre.
+    """
+    code = models.CharField(max_length=8, unique=True)
+    width = models.PositiveSmallIntegerField()
+
+    class Meta:
+        verbose_name = "Código de Cliente Disponible"
+        verbose_name_plural = "Códigos de Cliente Disponibles"
+
+    def __str__(self):
+        return self.code
+
+class CustomerStats(models.Model):
+    """
+    Resumen de cuenta de un cliente. Lo mantienen Order y Sale al guardarse o
+    borrarse (ver core.stats); no se edita a mano.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, help_text='Suma del precio final de los pedidos no anulados.')
+    outstanding_debt = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, help_text='Suma de lo que falta pagar de los pedidos no anulados.')
+    sale_count = models.PositiveIntegerField(default=0)
+    sales_total = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    last_sale_at = models.DateTimeField(null=True, blank=True)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Resumen de Cliente"
+        verbose_name_plural = "Resúmenes de Clientes"
+        indexes = [
+            models.Index(fields=['-lifetime_spent'], name='custstats_spent_idx'),
+            models.Index(fields=['-outstanding_debt'], name='custstats_debt_idx'),
+            models.Index(fields=['last_order_at'], name='custstats_last_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"Resumen de {self.customer_id}"
+
 class Category(models.Model):
     name = models.CharField(max_length=50, unique=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -60,25 +101,6 @@ class Category(models.Model):
         return self.name
     
 
-def generate_short_id():
-    """
-    Esta es nuestra 'máquina'.
-    Crea un código aleatorio de 8 caracteres.
-    Usa letras (mayúsculas y minúsculas) y números.
-    """
-    # 1. Define el alfabeto que usaremos.
-    alphabet = string.ascii_letters + string.digits
-
-    # 2. Inicia un bucle infinito (se romperá cuando encontremos un código único).
-    while True:
-        # 3. Crea un código aleatorio de 8 caracteres.
-        short_id = ''.join(secrets.choice(alphabet) for i in range(8))
-        
-        # 4. Revisa en la base de datos si este código ya existe en algún otro pedido.
-        if not Order.objects.filter(short_id=short_id).exists():
-            # 5. Si NO existe, ¡genial! Devolvemos el código y terminamos.
-            return short_id
-
 class ProductCategory(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="Nombre de la Categoría")
     description = models.TextField(blank=True, null=True, verbose_name="Descripción")
@@ -90,6 +112,9 @@ class ProductCategory(models.Model):
     def __str__(self):
         return self.name
 
+# Campos del pedido que cuentan para CustomerStats (ver core.stats.order_snapshot).
+_STATS_FIELDS = {'customer_id', 'status', 'final_price', 'remaining_amount', 'created_at', 'payment_method', 'payment_status'}
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('PROCESSING', 'En proceso'),
@@ -123,7 +148,6 @@ class Order(models.Model):
     payment_proof = models.ImageField(upload_to='payment_proofs/', blank=True, null=True)
     partial_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)  # Monto pagado parcialmente
     notes = models.TextField(blank=True, null=True)  # Campo de notas
-    qr_code = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -131,79 +155,105 @@ class Order(models.Model):
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, help_text='Monto de descuento aplicado al pedido.')
     price_adjusted_by_user = models.BooleanField(default=False, help_text='Indica si el precio final fue ajustado manualmente por un usuario.')
 
+    # Columnas derivadas que mantiene save(): permiten sumar ventas y deudas en
+    # la base de datos sin recalcular cada pedido en Python.
+    final_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, editable=False, help_text='Precio final del pedido (con ajustes). Se actualiza al guardar.')
+    remaining_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, editable=False, help_text='Monto que falta pagar. Se actualiza al guardar.')
+
     barcode = models.CharField(max_length=100, unique=True, blank=True, null=True, verbose_name="Código de Barras (SKU)")
     category = models.ForeignKey(ProductCategory, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Categoría de Producto")
 
-    def save(self, *args, **kwargs):
-        # Genera un short_id para la URL pública si no existe
-        if not self.short_id:
-            self.short_id = generate_short_id()
-        
-        # --- LÓGICA AÑADIDA ---
-        # Genera un order_code legible para el usuario si no existe
-        if not self.order_code:
-            self.order_code = self.generate_order_code()
-        # --- FIN DE LÓGICA AÑADIDA ---
-
-        super().save(*args, **kwargs)
+    class Meta:
+        indexes = [
+            # Listados y reportes ordenados por fecha, con o sin filtro.
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['payment_status', 'created_at'], name='order_paystatus_created_idx'),
+            models.Index(fields=['customer', 'created_at'], name='order_customer_created_idx'),
+            # Ingresos: casi todas las sumas excluyen los pedidos anulados.
+            models.Index(fields=['created_at'], condition=~models.Q(status='CANCELLED'), name='order_active_created_idx'),
+            models.Index(fields=['final_price'], name='order_final_price_idx'),
+            # Deuda por cliente: SUM(remaining_amount) sale solo del índice.
+            models.Index(fields=['customer', 'remaining_amount'], name='order_customer_remaining_idx'),
+            # Deuda total: índice parcial solo con los pedidos que deben algo.
+            models.Index(fields=['remaining_amount'], condition=models.Q(remaining_amount__gt=0), name='order_outstanding_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not _STATS_FIELDS & instance.get_deferred_fields():
+            instance._stats_snapshot = order_snapshot(instance)
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._stats_snapshot = None
+
+    def _saved_snapshot(self):
+        """Estado guardado del pedido, para aplicar la diferencia al resumen del cliente y a los totales diarios."""
+        if self._state.adding:
+            return None
+        snapshot = getattr(self, '_stats_snapshot', None)
+        if snapshot is None:
+            row = Order.objects.filter(pk=self.pk).values_list(
+                'customer_id', 'status', 'final_price', 'remaining_amount', 'created_at',
+                'payment_method', 'payment_status',
+            ).first()
+            snapshot = tuple(row) if row else None
+        return snapshot
 
-    def generate_order_code(self):
-        """Genera un código único de 6 caracteres para el pedido."""
-        length = 6
-        while True:
-            code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
-            if not Order.objects.filter(order_code=code).exists():
-                return code
+    def save(self, *args, **kwargs):
+        self.refresh_amounts()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'final_price', 'remaining_amount'}
+        with transaction.atomic():
+            old = self._saved_snapshot()
+            # Genera el short_id (URL pública) y el order_code (ticket) si faltan.
+            # No se consulta antes si existen: la restricción UNIQUE decide y, si
+            # hay choque, save_with_identifiers genera otros y reintenta.
+            save_with_identifiers(self, lambda: super(Order, self).save(*args, **kwargs))
+            new = order_snapshot(self)
+            order_changed(old, new)
+            order_rolled(old, new)
+            search.index(search.ORDER, self)
+        self._stats_snapshot = new
 
     def calculate_initial_price(self):
         """Calcula el precio basado en los artículos y el peso. Este método ya no se usa directamente para el precio final."""
-        weight_price = (self.weight or 0) * self.weight_price_per_kg
-        category_price = sum(item.quantity * item.category.price for item in self.ordercategory_set.all())
-        return Decimal(weight_price) + Decimal(category_price)
+        lines = [(item.category, item.quantity) for item in self.ordercategory_set.select_related('category')]
+        return calculate_price(self.weight, self.weight_price_per_kg, lines)
 
     @property
     def total_price(self):
         """Devuelve el precio final del pedido, considerando los ajustes."""
         if self.price_adjusted_by_user:
-            final_price = self.original_calculated_price - self.discount_amount
-            return final_price.quantize(Decimal('0.01'))
+            return quantize_money(Decimal(self.original_calculated_price) - Decimal(self.discount_amount))
         # Para pedidos nuevos o antiguos sin ajuste, devuelve el precio calculado original.
-        return self.original_calculated_price.quantize(Decimal('0.01'))
+        return quantize_money(self.original_calculated_price)
     
     @property
     def weight_total_price(self):
         """Calcula el precio solo para el peso."""
-        return (self.weight or 0) * self.weight_price_per_kg
-
-    def remaining_amount(self):
-            """
-            Calcula el monto restante.
-            Usa `self.total_price` como una propiedad (sin paréntesis).
-            """
-            # Obtenemos el precio final usando la propiedad
-            final_price = self.total_price 
-            
-            if self.payment_status == 'PARTIAL':
-                return final_price - self.partial_amount
-            elif self.payment_status == 'PENDING':
-                return final_price
-            else: # Si está 'PAID' o cualquier otro estado.
-                return Decimal('0.00')
-
-    def generate_qr_code(self):
-        import qrcode
-        from django.core.files import File
-        from io import BytesIO
-
-        qr_url = reverse('order_status', args=[self.id])
-        qr = qrcode.QRCode(version=1, box_size=10, border=4)
-        qr.add_data(f"http://localhost:8000{qr_url}")
-        qr.make(fit=True)
-
-        img = qr.make_image(fill='black', back_color='white')
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        self.qr_code.save(f"qr_{self.id}.png", File(buffer), save=True)
+        return weight_total(self.weight, self.weight_price_per_kg)
+
+    def refresh_amounts(self):
+        """
+        Recalcula las columnas `final_price` y `remaining_amount` a partir del
+        precio y del estado de pago. Lo llama save(); las actualizaciones
+        masivas usan las expresiones equivalentes de `core.pricing`.
+        Un pedido anulado no deja deuda, sin importar su estado de pago.
+        """
+        self.final_price = self.total_price
+        if self.status == 'CANCELLED':
+            self.remaining_amount = Decimal('0.00')
+        elif self.payment_status == 'PARTIAL':
+            self.remaining_amount = self.final_price - quantize_money(self.partial_amount)
+        elif self.payment_status == 'PENDING':
+            self.remaining_amount = self.final_price
+        else: # Si está 'PAID' o cualquier otro estado.
+            self.remaining_amount = Decimal('0.00')
 
     def __str__(self):
         return f"Pedido {self.id} - {self.customer.name}"
@@ -216,7 +266,7 @@ class OrderCategory(models.Model):
     @property
     def price(self):
         """Calcula el precio total para esta línea de categoría."""
-        return self.quantity * self.category.price
+        return line_total(self.quantity, self.category.price)
 
     def __str__(self):
         return f"{self.category.name} x{self.quantity} (Pedido {self.order.id})"
@@ -228,6 +278,16 @@ class AppConfiguration(models.Model):
     def __str__(self):
         return self.key
 
+    # Cada cambio invalida la copia en memoria de todos los procesos (core.config).
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        transaction.on_commit(bump_app_settings_version)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(bump_app_settings_version)
+        return result
+
     # Para asegurar que solo haya una instancia de cada ajuste
     class Meta:
         verbose_name_plural = "Configuraciones de la Aplicación"
@@ -247,11 +307,18 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.name} (Stock: {self.stock})"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            search.index(search.PRODUCT, self)
+
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
 
 
+_SALE_STATS_FIELDS = {'customer_id', 'total_amount', 'created_at', 'payment_method', 'payment_status'}
+
 class Sale(models.Model):
     """Representa una transacción de venta de productos."""
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Cliente")
@@ -279,9 +346,46 @@ class Sale(models.Model):
         self.total_amount = total
         self.save()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not _SALE_STATS_FIELDS & instance.get_deferred_fields():
+            instance._stats_snapshot = sale_snapshot(instance)
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._stats_snapshot = None
+
+    def _saved_snapshot(self):
+        """Estado guardado de la venta, para aplicar la diferencia al resumen del cliente y a los totales diarios."""
+        if self._state.adding:
+            return None
+        snapshot = getattr(self, '_stats_snapshot', None)
+        if snapshot is None:
+            row = Sale.objects.filter(pk=self.pk).values_list(
+                'customer_id', 'total_amount', 'created_at', 'payment_method', 'payment_status',
+            ).first()
+            snapshot = tuple(row) if row else None
+        return snapshot
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old = self._saved_snapshot()
+            super().save(*args, **kwargs)
+            new = sale_snapshot(self)
+            sale_changed(old, new)
+            sale_rolled(old, new)
+            search.index(search.SALE, self)
+        self._stats_snapshot = new
+
     class Meta:
         verbose_name = "Venta"
         verbose_name_plural = "Ventas"
+        indexes = [
+            models.Index(fields=['created_at'], name='sale_created_idx'),
+            models.Index(fields=['customer', 'created_at'], name='sale_customer_created_idx'),
+        ]
 
 
 class SaleItem(models.Model):
@@ -304,17 +408,6 @@ class SaleItem(models.Model):
         verbose_name = "Artículo de Venta"
         verbose_name_plural = "Artículos de Venta"
 # === FIN DE CÓDIGO AÑADIDO ===
-# Es buena práctica poner las funciones auxiliares cerca de donde se usan
-def generate_short_id():
-    """Genera un ID aleatorio y seguro de 8 caracteres."""
-    alphabet = string.ascii_letters + string.digits
-    while True:
-        # Creamos un ID aleatorio usando la librería secrets (más segura)
-        short_id = ''.join(secrets.choice(alphabet) for _ in range(8))
-        # Verificamos que este ID no exista ya en la base de datos para evitar colisiones
-        if not Order.objects.filter(short_id=short_id).exists():
-            return short_id
-        
 class Expense(models.Model):
     """Representa un gasto o egreso del negocio."""
     CATEGORY_CHOICES = [
@@ -340,6 +433,147 @@ class Expense(models.Model):
         verbose_name = "Gasto"
         verbose_name_plural = "Gastos"
         ordering = ['-expense_date']
+        indexes = [
+            models.Index(fields=['expense_date'], name='expense_date_idx'),
+            models.Index(fields=['category', 'expense_date'], name='expense_category_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.expense_date} - {self.get_category_display()} - S/ {self.amount}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not {'expense_date', 'category', 'amount'} & instance.get_deferred_fields():
+            instance._rollup_snapshot = expense_snapshot(instance)
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._rollup_snapshot = None
+
+    def _saved_snapshot(self):
+        """Estado guardado del gasto, para aplicar la diferencia a los totales diarios."""
+        if self._state.adding:
+            return None
+        snapshot = getattr(self, '_rollup_snapshot', None)
+        if snapshot is None:
+            row = Expense.objects.filter(pk=self.pk).values_list('expense_date', 'category', 'amount').first()
+            snapshot = tuple(row) if row else None
+        return snapshot
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old = self._saved_snapshot()
+            super().save(*args, **kwargs)
+            new = expense_snapshot(self)
+            expense_rolled(old, new)
+        self._rollup_snapshot = new
+
+
+class DailyStats(models.Model):
+    """
+    Totales de un día local por origen (pedido, venta o gasto) y método,
+    estado de pago o categoría. Lo mantienen Order, Sale y Expense al
+    guardarse o borrarse (ver core.rollups); no se edita a mano.
+    """
+    SOURCE_CHOICES = [
+        ('ORDER', 'Pedido'),
+        ('SALE', 'Venta'),
+        ('EXPENSE', 'Gasto'),
+    ]
+
+    day = models.DateField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    payment_method = models.CharField(max_length=20, blank=True, default='')
+    payment_status = models.CharField(max_length=20, blank=True, default='')
+    category = models.CharField(max_length=50, blank=True, default='', help_text='Categoría del gasto (solo gastos).')
+    count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+
+    class Meta:
+        verbose_name = "Total Diario"
+        verbose_name_plural = "Totales Diarios"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'source', 'payment_method', 'payment_status', 'category'],
+                name='dailystats_unique_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['source', 'day'], name='dailystats_source_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.source} {self.payment_method or self.category}: S/ {self.total}"
+
+
+class Job(models.Model):
+    """Trabajo en segundo plano pendiente o ya procesado (ver core.jobs)."""
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (PENDING, 'Pendiente'),
+        (RUNNING, 'En ejecución'),
+        (DONE, 'Terminado'),
+        (FAILED, 'Fallido'),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name="Trabajo")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Estado")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Intentos")
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=now, verbose_name="Ejecutar desde")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, verbose_name="Último error")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Trabajo en Segundo Plano"
+        verbose_name_plural = "Trabajos en Segundo Plano"
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+
+
+class ReportExport(models.Model):
+    """
+    PDF de un reporte generado en segundo plano (ver core.report_exports).
+    `key` identifica el reporte, sus filtros y el estado de los datos que
+    usa: mientras los datos no cambien, la misma clave reutiliza el archivo.
+    """
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (PENDING, 'En cola'),
+        (RUNNING, 'Generando'),
+        (DONE, 'Listo'),
+        (FAILED, 'Fallido'),
+    ]
+
+    key = models.CharField(max_length=64, unique=True)
+    report_type = models.CharField(max_length=30, verbose_name="Reporte")
+    query = models.CharField(max_length=500, blank=True, help_text='Filtros del reporte, como query string.')
+    query_hash = models.CharField(max_length=64, db_index=True, help_text='Reporte y filtros, sin el estado de los datos.')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Estado")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="Avance (%)")
+    file = models.FileField(upload_to='reports/', blank=True, verbose_name="Archivo")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Reporte PDF Generado"
+        verbose_name_plural = "Reportes PDF Generados"
 
     def __str__(self):
-        return f"{self.expense_date} - {self.get_category_display()} - S/ {self.amount}"
\ No newline at end of file
+        return f"{self.report_type} ({self.get_status_display()})"
@@ -0,0 +1,199 @@
+# laundry_app/core/pagination.py
+"""
+Paginación por cursor (keyset) para listados grandes.
+
+`Paginator` de Django hace un COUNT(*) de todo el listado y luego
+`OFFSET (página - 1) * tamaño`, que obliga a la base a recorrer y descartar
+todas las filas anteriores: la página 500 cuesta 500 veces la primera. Aquí
+cada página se pide "a partir de" la última fila de la anterior:
+
+    WHERE created_at <= :x AND (created_at < :x OR id < :y)
+    ORDER BY created_at DESC, id DESC LIMIT 11
+
+que con un índice sobre `created_at` es una búsqueda por rango, igual de
+barata en cualquier página. Los enlaces llevan un token opaco (firmado) con
+la posición en lugar de un número de página.
+
+El total es opcional: se puede pedir exacto, acotado (cuenta hasta
+`count_limit` filas y muestra "N+") o no pedirlo.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+_SALT = 'core.pagination'
+
+EXACT = 'exact'
+BOUNDED = 'bounded'
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _field_value(obj, field):
+    if isinstance(obj, dict):
+        return obj[field]
+    for part in field.split('__'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _after(ordering, values):
+    """
+    Condición "viene después de `values`" para el orden `ordering`. El primer
+    campo se acota también por sí solo (`<=`/`>=`) para que la base pueda
+    usar su índice como rango.
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    first, first_value = ordering[0], values[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": first_value})
+    return bound & condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+class KeysetPage:
+    """
+    Una página del listado. Se itera como una lista y ofrece `next_token` /
+    `previous_token` para los enlaces, además de `number` (número de página,
+    solo informativo) y el total si se pidió.
+    """
+
+    def __init__(self, object_list, paginator, number, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_token(self):
+        if not self.has_next:
+            return ''
+        return self.paginator.token(self.object_list[-1], self.number + 1, forward=True)
+
+    @property
+    def previous_token(self):
+        if not self.has_previous:
+            return ''
+        if self.number <= 2:
+            # La primera página se pide sin token.
+            return ''
+        return self.paginator.token(self.object_list[0], self.number - 1, forward=False)
+
+    @property
+    def total(self):
+        return self.paginator.total
+
+    @property
+    def total_is_approximate(self):
+        return self.paginator.total_is_approximate
+
+
+class KeysetPaginator:
+    """
+    Pagina `queryset` por los campos de `ordering` (por defecto del más
+    reciente al más antiguo: `('-created_at', '-pk')`). El último campo debe
+    ser único (la clave primaria) para que el orden no tenga empates, y
+    ninguno puede ser nulo.
+
+    `count` puede ser `EXACT` (COUNT(*) completo), `BOUNDED` (cuenta como
+    máximo `count_limit` filas; si hay más, `total_is_approximate` es True) o
+    None (sin total).
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-pk'), count=None, count_limit=1000):
+        self.ordering = list(ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page
+        self.count = count
+        self.count_limit = count_limit
+        self._total = None
+
+    def token(self, obj, number, forward=True):
+        """Token opaco que apunta a la página `number`, justo después (o antes) de `obj`."""
+        values = [_encode_value(_field_value(obj, field.lstrip('-'))) for field in self.ordering]
+        return signing.dumps({'v': values, 'n': number, 'f': forward}, salt=_SALT, compress=True)
+
+    def _decode(self, token):
+        if not token:
+            return None
+        try:
+            data = signing.loads(token, salt=_SALT)
+        except signing.BadSignature:
+            return None
+        if len(data.get('v', ())) != len(self.ordering):
+            return None
+        return data
+
+    def page(self, token=None):
+        """Página que indica `token`; la primera si no hay token o no es válido."""
+        data = self._decode(token)
+        if data is not None:
+            try:
+                return self._page_from(data)
+            except (ValidationError, ValueError, TypeError):
+                pass
+        return self._first_page()
+
+    def _first_page(self):
+        rows = list(self.queryset[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], self, 1, len(rows) > self.per_page, False)
+
+    def _page_from(self, data):
+        number = max(int(data['n']), 1)
+        if data['f']:
+            rows = list(self.queryset.filter(_after(self.ordering, data['v']))[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], self, number, len(rows) > self.per_page, True)
+        backwards = _reverse(self.ordering)
+        rows = list(
+            self.queryset.order_by(*backwards).filter(_after(backwards, data['v']))[:self.per_page + 1]
+        )
+        more_before = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        if not more_before:
+            number = 1
+        return KeysetPage(rows, self, number, True, more_before)
+
+    @property
+    def total(self):
+        if self.count is None:
+            return None
+        if self._total is None:
+            if self.count == EXACT:
+                self._total = self.queryset.count()
+            else:
+                self._total = self.queryset.order_by()[:self.count_limit + 1].count()
+        return min(self._total, self.count_limit) if self.count == BOUNDED else self._total
+
+    @property
+    def total_is_approximate(self):
+        return self.count == BOUNDED and self.total is not None and self._total > self.count_limit
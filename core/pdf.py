@@ -0,0 +1,297 @@
+# laundry_app/core/pdf.py
+"""
+Estilos y piezas comunes de los PDF (reportes y recibos).
+
+Los estilos se arman una sola vez al importar el módulo (`STYLES`, junto con
+las plantillas de página y de tabla), en lugar de volver a crear
+`getSampleStyleSheet()` y una docena de `ParagraphStyle` en cada descarga.
+
+`FastTable` dibuja tablas grandes sin crear un `Paragraph` por celda: el
+texto que cabe en su columna se escribe directo en el canvas y solo las
+celdas que necesitan varias líneas pasan por `Paragraph`. Se parte sola
+entre páginas y repite el encabezado en cada una.
+
+Para reportes largos, `StreamedTable` recibe las filas como iterador y arma
+solo las de la página que se está dibujando, así que la memoria no crece con
+la cantidad de filas.
+"""
+from collections import namedtuple
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Flowable, Paragraph, SimpleDocTemplate, TableStyle
+
+# ---------------------------------------------------------------------------
+# Registro de estilos
+# ---------------------------------------------------------------------------
+
+DARK_BLUE = colors.HexColor('#1E3A8A')
+GRAY_900 = colors.HexColor('#1F2937')
+GRAY_600 = colors.HexColor('#4B5563')
+GRAY_200 = colors.HexColor('#E5E7EB')
+GREEN_800 = colors.HexColor('#166534')
+
+RECEIPT_PRIMARY = colors.HexColor('#1A73E8')
+RECEIPT_SECONDARY = colors.HexColor('#E8F0FE')
+RECEIPT_TEXT_DARK = colors.HexColor('#202124')
+RECEIPT_TEXT_MEDIUM = colors.HexColor('#5F6368')
+RECEIPT_BORDER = colors.HexColor('#DADCE0')
+
+
+def _build_styles():
+    styles = getSampleStyleSheet()
+    add = styles.add
+    normal = styles['Normal']
+
+    # Reportes
+    add(ParagraphStyle(name='Company', parent=styles['h1'], fontSize=16, leading=20, alignment=TA_LEFT, textColor=DARK_BLUE))
+    add(ParagraphStyle(name='ReportTitle', parent=styles['h2'], fontSize=13, leading=17, alignment=TA_LEFT, spaceAfter=15, textColor=GRAY_900))
+    add(ParagraphStyle(name='ReportNormal', parent=normal, fontSize=9, leading=12, textColor=GRAY_600))
+    add(ParagraphStyle(name='Header', parent=normal, fontName='Helvetica-Bold', fontSize=8, alignment=TA_CENTER, textColor=colors.white))
+    add(ParagraphStyle(name='Cell', parent=normal, fontSize=8, alignment=TA_CENTER))
+    add(ParagraphStyle(name='CellLeft', parent=styles['Cell'], alignment=TA_LEFT))
+    add(ParagraphStyle(name='CellRight', parent=styles['Cell'], alignment=TA_RIGHT))
+    add(ParagraphStyle(name='GrandTotal', parent=styles['h3'], alignment=TA_RIGHT, fontSize=12, textColor=GREEN_800))
+    add(ParagraphStyle(name='KpiLabel', parent=normal, fontSize=9, textColor=GRAY_600, alignment=TA_CENTER))
+    add(ParagraphStyle(name='KpiValue', parent=normal, fontName='Helvetica-Bold', fontSize=16, alignment=TA_CENTER))
+
+    # Recibo de pedido
+    def receipt(name, size, leading, color, alignment=TA_LEFT, bold=False):
+        add(ParagraphStyle(name=name, fontSize=size, leading=leading, textColor=color, alignment=alignment,
+                           fontName='Helvetica-Bold' if bold else 'Helvetica'))
+
+    receipt('ReceiptCompany', 30, 36, RECEIPT_PRIMARY, bold=True)
+    receipt('ReceiptInfo', 9, 11, RECEIPT_TEXT_MEDIUM)
+    receipt('ReceiptSection', 12, 14, RECEIPT_TEXT_DARK, bold=True)
+    receipt('ReceiptLabel', 10, 12, RECEIPT_TEXT_MEDIUM)
+    receipt('ReceiptData', 10, 12, RECEIPT_TEXT_DARK, bold=True)
+    receipt('ReceiptTableHeader', 10, 12, RECEIPT_TEXT_DARK, TA_CENTER, bold=True)
+    receipt('ReceiptCell', 9, 11, RECEIPT_TEXT_DARK, TA_CENTER)
+    receipt('ReceiptCellRight', 9, 11, RECEIPT_TEXT_DARK, TA_RIGHT)
+    receipt('ReceiptSummaryLabel', 11, 13, RECEIPT_TEXT_DARK, TA_RIGHT)
+    receipt('ReceiptGrandTotal', 18, 22, RECEIPT_PRIMARY, TA_RIGHT, bold=True)
+    receipt('ReceiptFooter', 9, 11, RECEIPT_TEXT_MEDIUM, TA_CENTER)
+    return styles
+
+
+STYLES = _build_styles()
+
+# ---------------------------------------------------------------------------
+# Plantillas de página y de tabla
+# ---------------------------------------------------------------------------
+
+PAGE_SIZE = letter
+MARGIN = 0.75 * inch
+# Ancho útil de la página con los márgenes de `document()`.
+CONTENT_WIDTH = PAGE_SIZE[0] - 2 * MARGIN
+
+KPI_TABLE_STYLE = TableStyle([
+    ('BOX', (0, 0), (-1, -1), 1, GRAY_200), ('INNERGRID', (0, 0), (-1, -1), 0.5, GRAY_200),
+    ('LEFTPADDING', (0, 0), (-1, -1), 10), ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 6), ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+
+def document(output, **kwargs):
+    """`SimpleDocTemplate` tamaño carta con los márgenes de todos los PDF de la app."""
+    options = dict(pagesize=PAGE_SIZE, rightMargin=MARGIN, leftMargin=MARGIN, topMargin=MARGIN, bottomMargin=MARGIN)
+    options.update(kwargs)
+    return SimpleDocTemplate(output, **options)
+
+
+# ---------------------------------------------------------------------------
+# Tabla rápida
+# ---------------------------------------------------------------------------
+
+LEFT, CENTER, RIGHT = 'LEFT', 'CENTER', 'RIGHT'
+
+Column = namedtuple('Column', 'title width align bold', defaults=(CENTER, False))
+
+_PARAGRAPH_STYLES = {LEFT: 'CellLeft', CENTER: 'Cell', RIGHT: 'CellRight'}
+
+
+class FastTable(Flowable):
+    """
+    Tabla de `columns` (`Column(título, ancho, alineación, negrita)`) con
+    `rows` (secuencias de textos, o de flowables ya armados para celdas
+    especiales). Se parte entre páginas repitiendo el encabezado.
+    """
+    font = 'Helvetica'
+    bold_font = 'Helvetica-Bold'
+    font_size = 8
+    padding = 4
+    header_background = GRAY_600
+    grid_color = colors.lightgrey
+
+    def __init__(self, columns, rows, _prepared=None):
+        super().__init__()
+        self.columns = list(columns)
+        self.row_height = self.font_size + 2 * self.padding + 2
+        self.header_height = self.row_height
+        self._rows = _prepared if _prepared is not None else [self._prepare(row) for row in rows]
+        self.width = sum(column.width for column in self.columns)
+        self.height = self.header_height + sum(height for _, height in self._rows)
+
+    def _prepare(self, row):
+        """(celdas, alto) de una fila: texto plano si cabe, `Paragraph` si necesita varias líneas."""
+        cells, height = [], self.row_height
+        for column, value in zip(self.columns, row):
+            inner = column.width - 2 * self.padding
+            if not isinstance(value, Flowable):
+                value = '' if value is None else str(value)
+                font = self.bold_font if column.bold else self.font
+                if stringWidth(value, font, self.font_size) <= inner:
+                    cells.append(value)
+                    continue
+                text = f'<b>{escape(value)}</b>' if column.bold else escape(value)
+                value = Paragraph(text, STYLES[_PARAGRAPH_STYLES[column.align]])
+            _, cell_height = value.wrap(inner, 10 ** 6)
+            cells.append(value)
+            height = max(height, cell_height + 2 * self.padding)
+        return cells, height
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        room = availHeight - self.header_height
+        taken = 0
+        for count, (_, height) in enumerate(self._rows):
+            if taken + height > room:
+                break
+            taken += height
+        else:
+            return [self]
+        if count == 0:
+            # Ni una fila entra: la tabla pasa entera a la página siguiente.
+            return []
+        return [
+            FastTable(self.columns, None, _prepared=self._rows[:count]),
+            FastTable(self.columns, None, _prepared=self._rows[count:]),
+        ]
+
+    def _text(self, canv, text, column, x, y):
+        canv.setFont(self.bold_font if column.bold else self.font, self.font_size)
+        if column.align == LEFT:
+            canv.drawString(x + self.padding, y, text)
+        elif column.align == RIGHT:
+            canv.drawRightString(x + column.width - self.padding, y, text)
+        else:
+            canv.drawCentredString(x + column.width / 2, y, text)
+
+    def _baseline(self, bottom, height):
+        return bottom + (height - self.font_size) / 2 + self.font_size * 0.22
+
+    def draw(self):
+        canv = self.canv
+        top = self.height
+
+        # Encabezado
+        bottom = top - self.header_height
+        canv.setFillColor(self.header_background)
+        canv.rect(0, bottom, self.width, self.header_height, stroke=0, fill=1)
+        canv.setFillColor(colors.white)
+        x = 0
+        for column in self.columns:
+            self._text(canv, column.title, column._replace(bold=True, align=CENTER), x, self._baseline(bottom, self.header_height))
+            x += column.width
+
+        # Filas
+        canv.setFillColor(colors.black)
+        lines = [top, bottom]
+        for cells, height in self._rows:
+            bottom -= height
+            x = 0
+            for column, cell in zip(self.columns, cells):
+                if isinstance(cell, str):
+                    if cell:
+                        self._text(canv, cell, column, x, self._baseline(bottom, height))
+                else:
+                    _, cell_height = cell.wrap(column.width - 2 * self.padding, 10 ** 6)
+                    cell.drawOn(canv, x + self.padding, bottom + (height - cell_height) / 2)
+                x += column.width
+            lines.append(bottom)
+
+        # Cuadrícula
+        canv.setStrokeColor(self.grid_color)
+        canv.setLineWidth(0.5)
+        for y in lines:
+            canv.line(0, y, self.width, y)
+        x = 0
+        for column in [None, *self.columns]:
+            x += column.width if column else 0
+            canv.line(x, top, x, bottom)
+
+
+class StreamedTable(FastTable):
+    """
+    `FastTable` cuyas filas se leen de un iterador a medida que se dibujan.
+
+    Nunca se dibuja entera: en cada página `split()` toma del iterador las
+    filas que entran en el espacio libre y devuelve un `FastTable` con ellas
+    seguido de sí misma, hasta que se acaban las filas. Así en memoria hay
+    una sola página de celdas, no todo el reporte.
+
+    Con `max_rows` se dibujan como mucho esas filas; si había más, la tabla
+    termina con el flowable `overflow` (por ejemplo, un aviso).
+    """
+
+    def __init__(self, columns, rows, max_rows=None, overflow=None):
+        super().__init__(columns, ())
+        self._source = iter(rows)
+        self._pending = None
+        self.max_rows = max_rows
+        self.overflow = overflow
+        self.drawn_rows = 0
+        self.truncated = False
+
+    def _next_row(self):
+        if self._pending is not None:
+            row, self._pending = self._pending, None
+            return row
+        row = next(self._source, None)
+        if row is None:
+            return None
+        if self.max_rows is not None and self.drawn_rows >= self.max_rows:
+            self.truncated = True
+            return None
+        self.drawn_rows += 1
+        return self._prepare(row)
+
+    def _last(self, rows):
+        if self.truncated and hasattr(self._source, 'close'):
+            # Cierra el generador (y el cursor de la base) que queda a medio leer.
+            self._source.close()
+        last = [FastTable(self.columns, None, _prepared=rows)]
+        if self.truncated and self.overflow is not None:
+            last.append(self.overflow)
+        return last
+
+    def wrap(self, availWidth, availHeight):
+        # Más alto que cualquier página, para que el documento llame a `split()`.
+        return self.width, 10 ** 7
+
+    def split(self, availWidth, availHeight):
+        room = availHeight - self.header_height
+        rows, taken = [], 0
+        while True:
+            row = self._next_row()
+            if row is None:
+                return self._last(rows)
+            if taken + row[1] > room:
+                self._pending = row
+                if not rows:
+                    # La próxima fila no entra: se sigue en la página siguiente.
+                    return []
+                # El documento marca con `_postponed` lo que pasó a la página
+                # siguiente y falla si vuelve a pasar; esta tabla vuelve cada
+                # página, así que la marca se limpia al avanzar.
+                self.__dict__.pop('_postponed', None)
+                return [FastTable(self.columns, None, _prepared=rows), self]
+            rows.append(row)
+            taken += row[1]
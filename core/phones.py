@@ -0,0 +1,64 @@
+# laundry_app/core/phones.py
+"""
+Teléfonos de clientes en formato E.164 (`+51987654321`).
+
+`Customer.phone` es texto libre: "987 654 321", "+51 987-654-321",
+"0051987654321"... `Customer.save()` guarda además su forma normalizada en
+`phone_e164`, que tiene índice. Con ella la búsqueda por teléfono es una
+consulta exacta, los duplicados se detectan al registrar un cliente y los
+enlaces de WhatsApp no vuelven a limpiar el número en cada ticket.
+
+Los números sin código de país toman `settings.PHONE_COUNTRY_CODE`.
+"""
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+
+# E.164 admite hasta 15 dígitos con el código de país; menos de 8 no es un teléfono.
+_MIN_DIGITS = 8
+_MAX_DIGITS = 15
+
+_PHONE_LIKE = re.compile(r'^\+?[\d\s().-]+$')
+
+
+def country_code():
+    return str(getattr(settings, 'PHONE_COUNTRY_CODE', '51'))
+
+
+def normalize_phone(raw):
+    """
+    `raw` en formato E.164 (`+` y solo dígitos), o None si no parece un
+    teléfono. Acepta el número con o sin código de país (`+51`, `0051` o
+    `51` delante de un número de 9 dígitos) y con el 0 de larga distancia.
+    """
+    raw = (raw or '').strip()
+    digits = re.sub(r'\D', '', raw)
+    if not digits:
+        return None
+    code = country_code()
+    if raw.startswith('+'):
+        number = digits
+    elif digits.startswith('00'):
+        number = digits[2:]
+    elif digits.startswith(code) and len(digits) == len(code) + 9:
+        number = digits
+    else:
+        number = code + digits.lstrip('0')
+    if not _MIN_DIGITS <= len(number) <= _MAX_DIGITS:
+        return None
+    return f'+{number}'
+
+
+def looks_like_phone(text):
+    """True si `text` solo tiene dígitos y separadores de teléfono, y alcanza para un número."""
+    text = (text or '').strip()
+    return bool(_PHONE_LIKE.match(text)) and len(re.sub(r'\D', '', text)) >= 7
+
+
+def whatsapp_url(phone_e164, text=''):
+    """Enlace `wa.me` para escribir a `phone_e164` con el mensaje `text`, o '' sin teléfono."""
+    if not phone_e164:
+        return ''
+    url = f'https://wa.me/{phone_e164.lstrip("+")}'
+    return f'{url}?text={quote(text)}' if text else url
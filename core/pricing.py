@@ -0,0 +1,179 @@
+# laundry_app/core/pricing.py
+"""
+Motor de precios de los pedidos de lavandería.
+
+Un pedido cuesta `peso x precio por kilo` más la suma de `cantidad x precio`
+de cada categoría. Todas las pantallas, reportes y PDFs calculan el precio con
+estas funciones, ya sea en Python (un pedido) o como expresión SQL (miles de
+pedidos en una sola consulta, ver `order_price_expression` y `reprice_orders`).
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+
+TWO_PLACES = Decimal('0.01')
+ZERO = Decimal('0.00')
+_MONEY = DecimalField(max_digits=10, decimal_places=2)
+
+
+def quantize_money(amount):
+    """Redondea un monto a céntimos (mitad hacia arriba, igual que ROUND en SQL)."""
+    return Decimal(amount).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def weight_total(weight, price_per_kg):
+    """Precio de la parte por peso del pedido."""
+    if not weight or not price_per_kg:
+        return ZERO
+    return Decimal(weight) * Decimal(price_per_kg)
+
+
+def line_total(quantity, unit_price):
+    """Precio de una línea de categoría."""
+    return Decimal(quantity) * Decimal(unit_price)
+
+
+def calculate_price(weight, price_per_kg, lines):
+    """
+    Precio calculado de un pedido, redondeado a céntimos.
+    `lines` es una lista de `(Category, cantidad)`.
+    """
+    total = weight_total(weight, price_per_kg)
+    for category, quantity in lines:
+        total += line_total(quantity, category.price)
+    return quantize_money(total)
+
+
+def order_lines(order):
+    """
+    Detalle de precios de un pedido guardado, listo para tickets y PDFs: una
+    entrada por categoría y una final por el peso, si lo hay.
+    """
+    lines = []
+    for item in order.ordercategory_set.select_related('category'):
+        lines.append({
+            'name': item.category.name,
+            'description': item.category.description or 'Lavado estándar',
+            'quantity': item.quantity,
+            'unit_price': item.category.price,
+            'total': line_total(item.quantity, item.category.price),
+        })
+    if order.weight and order.weight_price_per_kg:
+        lines.append({
+            'name': f"Peso ({order.weight} kg)",
+            'description': 'Lavado por peso',
+            'quantity': 1,
+            'unit_price': order.weight_price_per_kg,
+            'total': weight_total(order.weight, order.weight_price_per_kg),
+        })
+    return lines
+
+
+# ---------------------------------------------------------------------------
+# Modo masivo (SQL)
+# ---------------------------------------------------------------------------
+
+def _lines_total_subquery(order_ref):
+    from .models import OrderCategory
+
+    return Subquery(
+        OrderCategory.objects.filter(order=order_ref)
+        .values('order')
+        .annotate(total=Sum(F('quantity') * F('category__price'), output_field=_MONEY))
+        .values('total')[:1],
+        output_field=_MONEY,
+    )
+
+
+def order_price_expression():
+    """
+    Expresión SQL con el precio calculado de cada pedido, para usar en
+    `annotate()`, `aggregate()` o `update()` sobre miles de filas a la vez.
+    """
+    return Round(
+        Coalesce(F('weight') * F('weight_price_per_kg'), Value(ZERO), output_field=_MONEY)
+        + Coalesce(_lines_total_subquery(OuterRef('pk')), Value(ZERO), output_field=_MONEY),
+        2,
+        output_field=_MONEY,
+    )
+
+
+def final_price_expression():
+    """Equivalente SQL de `Order.total_price` (precio final con ajustes)."""
+    return Case(
+        When(price_adjusted_by_user=True, then=F('original_calculated_price') - F('discount_amount')),
+        default=F('original_calculated_price'),
+        output_field=_MONEY,
+    )
+
+
+def remaining_amount_expression(final_price=None):
+    """Equivalente SQL de `Order.refresh_amounts()` para el monto que falta pagar."""
+    if final_price is None:
+        final_price = final_price_expression()
+    return Case(
+        When(status='CANCELLED', then=Value(ZERO)),
+        When(payment_status='PARTIAL', then=final_price - F('partial_amount')),
+        When(payment_status='PENDING', then=final_price),
+        default=Value(ZERO),
+        output_field=_MONEY,
+    )
+
+
+def reprice_orders(queryset, chunk_size=1000, after_id=0, on_chunk=None):
+    """
+    Recalcula `original_calculated_price` de los pedidos de `queryset` en
+    bloques por id, con un UPDATE por bloque y una transacción por bloque.
+    Solo se tocan los pedidos del bloque cuyo precio cambia (`stale_orders`).
+
+    En los pedidos con precio ajustado a mano se conserva el precio final que
+    se cobró: el descuento absorbe la diferencia y `final_price` no cambia. Para reanudar un proceso
+    interrumpido basta con pasar el último id procesado en `after_id`.
+    `on_chunk(last_id, updated)` se llama al terminar cada bloque.
+    Devuelve la cantidad de pedidos actualizados.
+    """
+    from .models import Order
+    from .rollups import created_days, refresh_daily_stats
+    from .stats import refresh_customer_stats
+
+    new_price = order_price_expression()
+    updated = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=after_id).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return updated
+        with transaction.atomic():
+            stale_ids = list(stale_orders(Order.objects.filter(pk__in=ids)).values_list('pk', flat=True))
+            chunk = Order.objects.filter(pk__in=stale_ids)
+            count = 0
+            if stale_ids:
+                # El lado derecho de un UPDATE usa los valores viejos de la fila,
+                # así que el descuento se calcula con el precio anterior.
+                count = chunk.filter(price_adjusted_by_user=True).update(
+                    discount_amount=F('discount_amount') + new_price - F('original_calculated_price'),
+                    original_calculated_price=new_price,
+                )
+                count += chunk.filter(price_adjusted_by_user=False).update(
+                    original_calculated_price=new_price,
+                    final_price=new_price,
+                    remaining_amount=remaining_amount_expression(new_price),
+                )
+                # update() no pasa por Order.save(): se recalcula el resumen de los
+                # clientes cuyos pedidos cambiaron y los totales de sus días.
+                refresh_customer_stats(set(chunk.values_list('customer_id', flat=True)))
+                refresh_daily_stats(created_days(chunk))
+        updated += count
+        after_id = ids[-1]
+        if on_chunk is not None:
+            on_chunk(after_id, count)
+
+
+def stale_orders(queryset):
+    """Pedidos de `queryset` cuyo precio guardado ya no coincide con la tarifa actual."""
+    return queryset.annotate(calculated_price=order_price_expression()).exclude(
+        original_calculated_price=F('calculated_price')
+    )
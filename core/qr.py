@@ -0,0 +1,69 @@
+# laundry_app/core/qr.py
+"""
+Códigos QR generados al vuelo a partir del `short_id` del pedido o del
+`customer_code` del cliente, sin guardar un PNG por registro.
+
+La URL codificada usa `settings.PUBLIC_BASE_URL` (o, si está vacío, el host
+de la petición), así que cambiar de dominio no obliga a regenerar nada.
+Lo ya dibujado se guarda en un LRU acotado por proceso.
+"""
+import hashlib
+import re
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+from qrcode.image.svg import SvgPathImage
+from django.conf import settings
+from django.urls import reverse
+
+QR_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+# Tipo de QR -> (vista a la que apunta, formato válido del código)
+QR_TARGETS = {
+    'order': ('order_status', re.compile(r'^[A-Za-z0-9]{8}$')),
+    'customer': ('customer_status', re.compile(r'^\d{4,8}$')),
+}
+
+
+def public_url(path, request=None):
+    """Convierte una ruta en URL absoluta usando la URL pública configurada."""
+    base_url = getattr(settings, 'PUBLIC_BASE_URL', '')
+    if base_url:
+        return base_url.rstrip('/') + path
+    if request is not None:
+        return request.build_absolute_uri(path)
+    return path
+
+
+def is_valid_target(kind, code):
+    return kind in QR_TARGETS and bool(QR_TARGETS[kind][1].match(code or ''))
+
+
+def qr_target_url(kind, code, request=None):
+    """URL pública que codifica el QR de un pedido ('order') o cliente ('customer')."""
+    view_name, _ = QR_TARGETS[kind]
+    return public_url(reverse(view_name, args=[code]), request)
+
+
+def qr_etag(data, fmt):
+    """ETag fuerte: depende solo del contenido codificado y del formato."""
+    return hashlib.sha256(f"{fmt}\n{data}".encode()).hexdigest()[:32]
+
+
+@lru_cache(maxsize=getattr(settings, 'QR_CACHE_SIZE', 512))
+def render_qr(data, fmt='png'):
+    """Dibuja el QR de `data` y devuelve los bytes del PNG o del SVG."""
+    qr = qrcode.QRCode(version=1, box_size=10, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    buffer = BytesIO()
+    if fmt == 'svg':
+        qr.make_image(image_factory=SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill='black', back_color='white').save(buffer, format='PNG')
+    return buffer.getvalue()
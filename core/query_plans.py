@@ -0,0 +1,156 @@
+# laundry_app/core/query_plans.py
+"""
+Verificación de los planes de consulta de las vistas principales, para
+`python manage.py check_query_plans`.
+
+Cada caso llama a una vista con filtros típicos sobre datos de ejemplo,
+captura las consultas SQL que hizo y le pide a SQLite su
+`EXPLAIN QUERY PLAN`. Si alguna recorre completa la tabla de pedidos,
+ventas o gastos (sin índice, o leyendo el índice entero sin LIMIT) y ese
+recorrido no está en la lista de conocidos del caso, el caso falla. Todo
+corre dentro de una transacción que el comando revierte al final.
+"""
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.template import TemplateDoesNotExist
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+
+from .benchmarks import _staff_request
+
+# "SCAN core_order" o "SCAN core_order AS U0" sin "USING ... INDEX": recorrido completo.
+_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(?P<index> USING (?:COVERING )?INDEX \w+| USING INTEGER PRIMARY KEY)?')
+
+
+def hot_tables():
+    """Tablas que crecen con el uso y nunca deben recorrerse completas."""
+    from .models import Expense, Order, Sale
+
+    return {Order._meta.db_table, Sale._meta.db_table, Expense._meta.db_table}
+
+
+def plan_cases(data):
+    """
+    Rutas (con sus filtros) de las vistas a verificar, cada una con los
+    recorridos conocidos que se le toleran (`{tabla: motivo}`); se listan
+    aparte y no hacen fallar el comando. `data` son
+    los objetos de ejemplo creados por `create_sample_data()`.
+    """
+    today = timezone.localdate()
+    week = f"date_from={today - timedelta(days=7)}&date_to={today}"
+    customer, order = data['customer'], data['order']
+    return [
+        ('/dashboard/', {}),
+        ('/dashboard/?status=PROCESSING', {}),
+        ('/dashboard/?payment_status=PENDING', {}),
+        (f'/dashboard/?{week}', {}),
+        ('/payment_audit/', {}),
+        ('/payment_audit/?payment_status=PAID', {}),
+        (f'/payment_audit/?{week}', {}),
+        (f'/manage_customer/{customer.customer_code}/', {}),
+        (f'/customer/{customer.customer_code}/', {}),
+        (f'/o/{order.short_id}/', {}),
+        ('/customers/', {}),
+        ('/customers/?search_query=planes', {}),
+        (f'/customers/?order_query={order.order_code}', {}),
+        (f'/customers/?order_query={order.pk}', {}),
+        ('/dashboard/?search_query=cli', {}),
+        ('/search_customers/?query=planes', {}),
+        ('/search/?q=planes', {}),
+        (f'/search/?q={order.pk}', {}),
+        (f'/scan/?format=json&q={order.order_code}', {}),
+        (f'/scan/?format=json&q={order.short_id}', {}),
+        (f'/scan/?format=json&q=%23{order.pk}', {}),
+        (f'/scan/?format=json&q={customer.customer_code}', {}),
+        ('/scan/?format=json&q=SIN-CODIGO', {}),
+        ('/scan/?format=json&q=%2B51%20999%20000%20111', {}),
+        ('/search_customers/?term=999000111', {}),
+        ('/sales/', {}),
+        ('/reports/', {}),
+        (f'/reports/orders/?{week}', {}),
+        (f'/reports/orders/?{week}&status=READY', {}),
+        (f'/reports/orders/?customer={customer.pk}', {}),
+        ('/reports/orders/', {}),
+        (f'/reports/income/?{week}', {}),
+        ('/reports/income/', {}),
+        (f'/reports/rows/orders/?{week}&status=READY', {}),
+        ('/reports/rows/income/', {}),
+        (f'/reports/sales/?{week}', {}),
+        (f'/reports/customers/?{week}', {}),
+        (f'/reports/profitability/?{week}', {}),
+        (f'/reports/profitability/?{week}&expense_category=INSUMOS', {}),
+        ('/expenses/', {'core_expense': "Listado histórico completo de gastos, sin paginar."}),
+    ]
+
+
+def create_sample_data():
+    """Crea unos pocos registros de cada tipo para que las vistas tengan qué mostrar."""
+    from .models import Category, Customer, Expense, Order, Product, Sale, SaleItem
+    from .services import create_order
+
+    customer = Customer(name='Cliente Planes', phone='999000111')
+    customer.save()
+    category = Category.objects.create(name='Planes de consulta', price=Decimal('4.00'))
+    product = Product.objects.create(name='Producto Planes', price=Decimal('2.50'), stock=100)
+    orders = [
+        create_order(Order(customer=customer, weight=Decimal('3.0')), [(category, 2)], Decimal('5.00'))
+        for _ in range(3)
+    ]
+    sale = Sale.objects.create(customer=customer, total_amount=Decimal('2.50'))
+    SaleItem.objects.create(sale=sale, product=product, quantity=1, unit_price=product.price)
+    Expense.objects.create(description='Detergente', amount=Decimal('30.00'), category='INSUMOS')
+    return {'customer': customer, 'order': orders[0]}
+
+
+def explain(sql):
+    """Devuelve las líneas de `EXPLAIN QUERY PLAN` de una consulta ya interpolada."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(sql, plan, tables):
+    """
+    Tablas de `tables` que el plan recorre completas. Recorrer un índice en
+    orden solo se acepta si la consulta tiene LIMIT (los primeros N de una
+    página); sin LIMIT lee la tabla entera igual que un SCAN sin índice.
+    """
+    limited = ' LIMIT ' in sql.upper()
+    scanned = []
+    for detail in plan:
+        match = _SCAN_RE.match(detail)
+        if match and match.group(1) in tables and not (match.group('index') and limited):
+            scanned.append(match.group(1))
+    return scanned
+
+
+def check_view(path, request_factory=None):
+    """
+    Ejecuta la vista de `path` y analiza cada SELECT que hizo.
+    Devuelve una lista de dicts con la consulta, su plan y las tablas recorridas.
+    """
+    factory = request_factory or RequestFactory()
+    route, _, query = path.partition('?')
+    match = resolve(route)
+    request = _staff_request(factory, 'get', path)
+    with CaptureQueriesContext(connection) as queries:
+        try:
+            match.func(request, *match.args, **match.kwargs)
+        except TemplateDoesNotExist:
+            # La vista ya hizo sus consultas; solo falta la plantilla.
+            pass
+
+    tables = hot_tables()
+    results = []
+    for captured in queries.captured_queries:
+        sql = captured['sql']
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        plan = explain(sql)
+        results.append({'sql': sql, 'plan': plan, 'full_scans': full_scans(sql, plan, tables)})
+    return results
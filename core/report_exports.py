@@ -0,0 +1,169 @@
+# laundry_app/core/report_exports.py
+"""
+PDF de reportes generados en segundo plano y guardados para reutilizarlos.
+
+`request_export()` calcula la clave del PDF pedido: un hash del tipo de
+reporte, sus filtros y una "huella" de los datos que usa (cantidad de filas,
+último id, suma de montos y última modificación de las tablas en el rango
+de fechas, más la versión de la configuración del negocio). Si ya hay un
+PDF terminado con esa clave se sirve desde el disco; si no, se encola el
+trabajo `build_report_pdf` y la página de espera consulta su avance.
+
+Cuando cambia algo en el rango, cambia la huella y la siguiente descarga
+genera un PDF nuevo; el anterior del mismo reporte y filtros se borra al
+terminar. Los cambios que no se notan en esas columnas (por ejemplo,
+renombrar un cliente) no invalidan el PDF; para eso está `refresh`.
+
+El PDF se escribe en un `SpooledTemporaryFile`: los chicos quedan en memoria
+y los grandes pasan al disco, y de ahí se copian al almacenamiento por
+bloques. Las descargas lo sirven con `FileResponse` desde el archivo.
+"""
+import hashlib
+import tempfile
+import traceback
+from urllib.parse import urlencode
+
+from django.core.files import File
+from django.db.models import Count, Max, Sum
+from django.http import QueryDict
+
+from .config import app_settings_version
+from .dates import date_range_q
+from .jobs import enqueue
+from .report_pdf import REPORT_TYPES, build_report_pdf
+
+# Bytes del PDF que se guardan en memoria antes de pasar a un archivo temporal.
+SPOOL_SIZE = 2 * 1024 * 1024
+
+# Tablas de las que depende cada reporte (ver `_source_state`).
+_SOURCES = {
+    'orders': ('orders', 'customers'),
+    'income': ('orders', 'sales', 'customers'),
+    'sales': ('sales',),
+    'profitability': ('orders', 'sales', 'expenses', 'customers'),
+    'customers': ('orders', 'sales', 'customers'),
+}
+
+
+def filter_query(form):
+    """Filtros válidos de `ReportFilterForm` como query string canónico (ordenado, sin vacíos)."""
+    if not form.is_valid():
+        return ''
+    items = []
+    for name in sorted(form.fields):
+        value = form.cleaned_data.get(name)
+        if value in (None, ''):
+            continue
+        if hasattr(value, 'pk'):
+            value = value.pk
+        elif hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        items.append((name, str(value)))
+    return urlencode(items)
+
+
+def query_filters(query):
+    """`cleaned_data` de `ReportFilterForm` para un query string de `filter_query()`."""
+    from .forms import ReportFilterForm
+
+    form = ReportFilterForm(QueryDict(query))
+    return form.cleaned_data if form.is_valid() else {}
+
+
+def _source_state(source, date_from, date_to):
+    from .models import Customer, Expense, Order, Sale
+
+    if source == 'orders':
+        return Order.objects.filter(date_range_q(date_from, date_to)).aggregate(
+            n=Count('pk'), last=Max('updated_at'),
+        )
+    if source == 'sales':
+        return Sale.objects.filter(date_range_q(date_from, date_to)).aggregate(
+            n=Count('pk'), top=Max('pk'), total=Sum('total_amount'),
+        )
+    if source == 'expenses':
+        expenses = Expense.objects.all()
+        if date_from:
+            expenses = expenses.filter(expense_date__gte=date_from)
+        if date_to:
+            expenses = expenses.filter(expense_date__lte=date_to)
+        return expenses.aggregate(n=Count('pk'), top=Max('pk'), total=Sum('amount'))
+    return Customer.objects.aggregate(n=Count('pk'), top=Max('pk'))
+
+
+def data_fingerprint(report_type, filters):
+    """Huella de los datos que usa el reporte en el rango de fechas de `filters`."""
+    date_from, date_to = filters.get('date_from'), filters.get('date_to')
+    state = [app_settings_version()]
+    for source in _SOURCES[report_type]:
+        state.append((source, sorted(_source_state(source, date_from, date_to).items())))
+    return hashlib.sha256(repr(state).encode()).hexdigest()
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def request_export(report_type, form, refresh=False):
+    """
+    `ReportExport` del reporte `report_type` con los filtros de `form`
+    (`ReportFilterForm`). Si no existe, o falló, o se pide `refresh`, encola
+    su generación. Con `JOBS_EAGER` el PDF ya está listo al volver.
+    """
+    from .models import ReportExport
+
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Reporte no válido: {report_type}")
+    query = filter_query(form)
+    query_hash = _hash(f'{report_type}?{query}')
+    key = _hash(f'{query_hash}:{data_fingerprint(report_type, query_filters(query))}')
+
+    export, created = ReportExport.objects.get_or_create(
+        key=key, defaults={'report_type': report_type, 'query': query, 'query_hash': query_hash},
+    )
+    retry = export.status == ReportExport.FAILED or (refresh and export.status == ReportExport.DONE)
+    if retry:
+        # Solo quien logra cambiar el estado encola el trabajo.
+        retry = ReportExport.objects.filter(pk=export.pk, status=export.status).update(
+            status=ReportExport.PENDING, progress=0, error='',
+        ) == 1
+    if created or retry:
+        enqueue('build_report_pdf', export_id=export.pk)
+        export.refresh_from_db()
+    return export
+
+
+def generate_export(export_id):
+    """Genera y guarda el PDF de un `ReportExport` (lo ejecuta el trabajo `build_report_pdf`)."""
+    from .models import ReportExport
+
+    export = ReportExport.objects.get(pk=export_id)
+    ReportExport.objects.filter(pk=export.pk).update(status=ReportExport.RUNNING, progress=0)
+
+    def progress(percent):
+        ReportExport.objects.filter(pk=export.pk).update(progress=percent)
+
+    previous_file = export.file.name
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as output:
+            build_report_pdf(export.report_type, query_filters(export.query), output, progress=progress)
+            output.seek(0)
+            export.file.save(f'{export.report_type}_{export.key[:16]}.pdf', File(output), save=False)
+    except Exception:
+        ReportExport.objects.filter(pk=export.pk).update(
+            status=ReportExport.FAILED, error=traceback.format_exc(),
+        )
+        raise
+    export.status = ReportExport.DONE
+    export.progress = 100
+    export.error = ''
+    export.save(update_fields=['file', 'status', 'progress', 'error', 'updated_at'])
+
+    # Las versiones anteriores del mismo reporte y filtros ya no se usarán.
+    stale = ReportExport.objects.filter(query_hash=export.query_hash).exclude(pk=export.pk)
+    paths = {path for path in stale.values_list('file', flat=True) if path}
+    if previous_file and previous_file != export.file.name:
+        paths.add(previous_file)
+    stale.delete()
+    if paths:
+        enqueue('delete_files', paths=sorted(paths))
@@ -0,0 +1,238 @@
+# laundry_app/core/rollups.py
+"""
+Totales diarios (`DailyStats`) de pedidos, ventas y gastos.
+
+Cada fila es un día local y una combinación de origen (pedido, venta o
+gasto), método y estado de pago (pedidos y ventas) o categoría (gastos), con
+la cantidad de registros y la suma de sus montos. Los KPI de los reportes
+suman estas filas en lugar de agregar las tablas originales: un resumen de
+varios años lee cientos de filas en vez de cientos de miles.
+
+Como en `core.stats`, Order, Sale y Expense aplican en save() solo la
+diferencia entre su estado anterior y el nuevo, y core.signals descuenta
+cada borrado (también en cascada o sobre un queryset). Lo demás (update()
+masivos, cambios a mano) se reconcilia con `python manage.py
+rebuild_daily_stats` (o con `refresh_daily_stats(days)` para días concretos).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .dates import as_date, date_range_q
+
+ZERO = Decimal('0.00')
+_MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+ORDER, SALE, EXPENSE = 'ORDER', 'SALE', 'EXPENSE'
+
+# Campos que identifican una fila de DailyStats, en el orden de las claves.
+KEY_FIELDS = ('day', 'source', 'payment_method', 'payment_status', 'category')
+
+
+# ---------------------------------------------------------------------------
+# Cambios incrementales
+# ---------------------------------------------------------------------------
+
+def expense_snapshot(expense):
+    """Parte del gasto que cuenta para los totales diarios."""
+    return (as_date(expense.expense_date), expense.category, expense.amount)
+
+
+def _order_contribution(snapshot):
+    # order_snapshot(): (customer_id, status, final_price, remaining_amount, created_at, payment_method, payment_status)
+    _, status, final_price, _, created_at, payment_method, payment_status = snapshot
+    if status == 'CANCELLED' or created_at is None:
+        return None, ZERO
+    return (timezone.localdate(created_at), ORDER, payment_method, payment_status, ''), Decimal(final_price)
+
+
+def _sale_contribution(snapshot):
+    # sale_snapshot(): (customer_id, total_amount, created_at, payment_method, payment_status)
+    _, total_amount, created_at, payment_method, payment_status = snapshot
+    if created_at is None:
+        return None, ZERO
+    return (timezone.localdate(created_at), SALE, payment_method, payment_status, ''), Decimal(total_amount)
+
+
+def _expense_contribution(snapshot):
+    day, category, amount = snapshot
+    if day is None:
+        return None, ZERO
+    return (day, EXPENSE, '', '', category), Decimal(amount)
+
+
+def _bump(key, count, total):
+    from .models import DailyStats
+
+    filters = dict(zip(KEY_FIELDS, key))
+    updates = {'count': F('count') + count, 'total': F('total') + total}
+    if not DailyStats.objects.filter(**filters).update(**updates):
+        # Primer registro de esa combinación en el día.
+        DailyStats.objects.get_or_create(**filters)
+        DailyStats.objects.filter(**filters).update(**updates)
+
+
+def _apply_change(old, new, contribution):
+    deltas = defaultdict(lambda: [0, ZERO])
+    for snapshot, sign in ((old, -1), (new, 1)):
+        if snapshot is None:
+            continue
+        key, amount = contribution(snapshot)
+        if key is None:
+            continue
+        deltas[key][0] += sign
+        deltas[key][1] += sign * amount
+    for key, (count, total) in deltas.items():
+        if count or total:
+            _bump(key, count, total)
+
+
+def order_rolled(old, new):
+    """Aplica a los totales diarios el cambio de un pedido (`order_snapshot()` antes y después)."""
+    _apply_change(old, new, _order_contribution)
+
+
+def sale_rolled(old, new):
+    """Igual que `order_rolled` pero para una venta (`sale_snapshot()`)."""
+    _apply_change(old, new, _sale_contribution)
+
+
+def expense_rolled(old, new):
+    """Igual que `order_rolled` pero para un gasto (`expense_snapshot()`)."""
+    _apply_change(old, new, _expense_contribution)
+
+
+# ---------------------------------------------------------------------------
+# Cálculo completo (reconciliación)
+# ---------------------------------------------------------------------------
+
+def daily_stats_rows(order_model, sale_model, expense_model, date_from=None, date_to=None):
+    """
+    Calcula desde cero los totales diarios entre `date_from` y `date_to`
+    (ambos inclusive; None deja el rango abierto). Devuelve un generador de
+    dicts con los campos de `DailyStats`.
+    """
+    created = date_range_q(date_from, date_to)
+    sources = [
+        (ORDER, order_model.objects.exclude(status='CANCELLED').filter(created), 'final_price'),
+        (SALE, sale_model.objects.filter(created), 'total_amount'),
+    ]
+    for source, queryset, amount in sources:
+        grouped = queryset.annotate(day=TruncDate('created_at')).values(
+            'day', 'payment_method', 'payment_status'
+        ).annotate(n=Count('pk'), amount=Coalesce(Sum(amount), ZERO, output_field=_MONEY)).order_by()
+        for row in grouped.iterator():
+            yield {
+                'day': row['day'], 'source': source, 'payment_method': row['payment_method'],
+                'payment_status': row['payment_status'], 'category': '',
+                'count': row['n'], 'total': row['amount'],
+            }
+
+    expenses = expense_model.objects.all()
+    if date_from:
+        expenses = expenses.filter(expense_date__gte=as_date(date_from))
+    if date_to:
+        expenses = expenses.filter(expense_date__lte=as_date(date_to))
+    grouped = expenses.values('expense_date', 'category').annotate(
+        n=Count('pk'), amount=Coalesce(Sum('amount'), ZERO, output_field=_MONEY)
+    ).order_by()
+    for row in grouped.iterator():
+        yield {
+            'day': row['expense_date'], 'source': EXPENSE, 'payment_method': '', 'payment_status': '',
+            'category': row['category'], 'count': row['n'], 'total': row['amount'],
+        }
+
+
+def write_daily_stats(stats_model, rows, date_from=None, date_to=None, batch_size=500):
+    """Reemplaza los totales diarios del rango por `rows`. Devuelve cuántas filas escribió."""
+    existing = stats_model.objects.all()
+    if date_from:
+        existing = existing.filter(day__gte=as_date(date_from))
+    if date_to:
+        existing = existing.filter(day__lte=as_date(date_to))
+    objs = [stats_model(**row) for row in rows]
+    with transaction.atomic():
+        existing.delete()
+        stats_model.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
+
+
+def rebuild_daily_stats(date_from=None, date_to=None):
+    """Recalcula desde cero los totales diarios del rango (o de todo el historial)."""
+    from .models import DailyStats, Expense, Order, Sale
+
+    rows = daily_stats_rows(Order, Sale, Expense, date_from, date_to)
+    return write_daily_stats(DailyStats, rows, date_from, date_to)
+
+
+def refresh_daily_stats(days):
+    """Recalcula los días indicados (por ejemplo, los tocados por un update() o delete() masivo)."""
+    days = sorted({as_date(day) for day in days if day is not None})
+    for day in days:
+        rebuild_daily_stats(day, day)
+    return len(days)
+
+
+def created_days(queryset):
+    """Días locales (`created_at`) de los pedidos o ventas de `queryset`, para `refresh_daily_stats`."""
+    return {timezone.localdate(moment) for moment in queryset.values_list('created_at', flat=True)}
+
+
+def stale_daily_stats(date_from=None, date_to=None):
+    """Días cuyos totales guardados no coinciden con el cálculo completo."""
+    from .models import DailyStats, Expense, Order, Sale
+
+    def by_key(rows):
+        return {tuple(row[f] for f in KEY_FIELDS): (row['count'], row['total']) for row in rows if row['count']}
+
+    stored = DailyStats.objects.all()
+    if date_from:
+        stored = stored.filter(day__gte=as_date(date_from))
+    if date_to:
+        stored = stored.filter(day__lte=as_date(date_to))
+    stored = by_key(stored.values(*KEY_FIELDS, 'count', 'total'))
+    current = by_key(daily_stats_rows(Order, Sale, Expense, date_from, date_to))
+    return sorted({key[0] for key in stored.keys() ^ current.keys()} |
+                  {key[0] for key in stored.keys() & current.keys() if stored[key] != current[key]})
+
+
+# ---------------------------------------------------------------------------
+# Consultas para los reportes
+# ---------------------------------------------------------------------------
+
+def daily_stats(date_from=None, date_to=None, **filters):
+    """Filas de `DailyStats` de los días `date_from`..`date_to` (inclusive) que cumplen `filters`."""
+    from .models import DailyStats
+
+    queryset = DailyStats.objects.filter(**filters)
+    if date_from:
+        queryset = queryset.filter(day__gte=as_date(date_from))
+    if date_to:
+        queryset = queryset.filter(day__lte=as_date(date_to))
+    return queryset
+
+
+def rollup_total(source, date_from=None, date_to=None, **filters):
+    """Suma de montos de `source` (ORDER, SALE o EXPENSE) en el rango de días."""
+    return daily_stats(date_from, date_to, source=source, **filters).aggregate(
+        total=Coalesce(Sum('total'), ZERO, output_field=_MONEY)
+    )['total']
+
+
+def rollup_summary(source, date_from=None, date_to=None, **filters):
+    """Como `rollup_total`, pero devuelve también la cantidad: `{'count': ..., 'total': ...}`."""
+    return daily_stats(date_from, date_to, source=source, **filters).aggregate(
+        count=Coalesce(Sum('count'), 0),
+        total=Coalesce(Sum('total'), ZERO, output_field=_MONEY),
+    )
+
+
+def expense_breakdown(date_from=None, date_to=None, **filters):
+    """Gastos del rango agrupados por categoría (`category`, `total`), de mayor a menor."""
+    return daily_stats(date_from, date_to, source=EXPENSE, **filters).values('category').annotate(
+        total=Sum('total')
+    ).order_by('-total')
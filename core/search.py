@@ -0,0 +1,379 @@
+# laundry_app/core/search.py
+"""
+Búsqueda de clientes, pedidos, productos y ventas con un índice FTS5 de SQLite.
+
+Antes cada buscador hacía `icontains` sobre varias columnas (y un JOIN con
+pedidos más `distinct()` para buscar por código de pedido): recorría las
+tablas completas en cada tecla. Aquí cada objeto tiene una fila en la tabla
+virtual `core_search` con su texto ya normalizado (minúsculas y sin tildes,
+así "jose" encuentra a "José") y el tokenizador `trigram` permite buscar
+cualquier fragmento de tres o más letras. Un teléfono completo se busca
+además exacto en `Customer.phone_e164`, que tiene índice. Los términos más cortos se buscan
+con LIKE sobre la misma tabla, que es pequeña comparada con las originales.
+
+Cada fila guarda también lo que muestra el omnibox (texto, detalle y
+referencia para armar el enlace), así que un resultado no necesita consultar
+las tablas de origen. El `rowid` codifica tipo e id (`id * 8 + tipo`) para
+que guardar un objeto reemplace su fila con un solo INSERT OR REPLACE.
+
+Lo mantienen al día `save()` de Customer, Order, Product y Sale y las
+señales de borrado (core/signals.py), que cubren también los borrados en
+cascada. Lo que no pasa por ellos (bulk_create, update()) se reconcilia con
+`python manage.py rebuild_search_index`.
+
+Cada cambio en los clientes indexados renueva `customers_version()`, que
+forma parte de la clave con que se guardan en caché las respuestas del
+selector de clientes (ver `views.search_customers`).
+
+Fuera de SQLite (sin FTS5) las búsquedas vuelven a `icontains`.
+"""
+import unicodedata
+import uuid
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+
+from .phones import looks_like_phone, normalize_phone
+
+TABLE = 'core_search'
+
+CUSTOMER = 'customer'
+ORDER = 'order'
+PRODUCT = 'product'
+SALE = 'sale'
+KINDS = (CUSTOMER, ORDER, PRODUCT, SALE)
+_KIND_CODES = {CUSTOMER: 1, ORDER: 2, PRODUCT: 3, SALE: 4}
+
+# El trigrama es el fragmento mínimo que usa el índice.
+MIN_TERM = 3
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "kind UNINDEXED, object_id UNINDEXED, ref UNINDEXED, label UNINDEXED, detail UNINDEXED, "
+    "title, terms, tokenize = 'trigram')"
+)
+DROP_SQL = f"DROP TABLE IF EXISTS {TABLE}"
+
+# Pesos de bm25() por columna, en el orden de CREATE_SQL: el título pesa más.
+_RANK = f"bm25({TABLE}, 0, 0, 0, 0, 0, 10.0, 1.0)"
+
+
+CUSTOMERS_VERSION_KEY = 'search:customers:version'
+
+
+def available():
+    """True si la base tiene el índice (SQLite con FTS5)."""
+    return connection.vendor == 'sqlite'
+
+
+def normalize(text):
+    """Texto en minúsculas, sin tildes ni espacios repetidos."""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def customers_version():
+    """Marca que cambia cada vez que cambian los clientes del índice."""
+    version = cache.get(CUSTOMERS_VERSION_KEY)
+    if version is None:
+        cache.add(CUSTOMERS_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CUSTOMERS_VERSION_KEY)
+    return version
+
+
+def _customers_changed():
+    # Al confirmarse: antes, otra petición podría guardar en caché los
+    # resultados viejos con la marca nueva.
+    transaction.on_commit(lambda: cache.set(CUSTOMERS_VERSION_KEY, uuid.uuid4().hex, timeout=None))
+
+
+# ---------------------------------------------------------------------------
+# Documentos: qué se indexa de cada objeto
+# ---------------------------------------------------------------------------
+
+def _customer_document(customer):
+    detail = ' · '.join(filter(None, [f"Código {customer.customer_code}", customer.phone, customer.email]))
+    # El teléfono también normalizado (con código de país, solo dígitos), para
+    # encontrarlo se escriba como se escriba.
+    phone_digits = (customer.phone_e164 or '').lstrip('+')
+    return {
+        'ref': customer.customer_code, 'label': customer.name, 'detail': detail,
+        'title': customer.name, 'terms': [customer.customer_code, customer.phone, phone_digits, customer.email],
+    }
+
+
+def _order_document(order):
+    created_at = order.created_at.strftime('%d/%m/%Y') if order.created_at else ''
+    return {
+        'ref': order.pk, 'label': f"Pedido {order.order_code or order.pk}",
+        'detail': f"{order.get_status_display()} · {created_at}",
+        'title': order.order_code, 'terms': [order.short_id, order.barcode, order.notes],
+    }
+
+
+def _product_document(product):
+    return {
+        'ref': product.pk, 'label': product.name, 'detail': f"S/ {product.price:.2f} · Stock {product.stock}",
+        'title': product.name, 'terms': [product.description],
+    }
+
+
+def _sale_document(sale):
+    customer = sale.customer.name if sale.customer_id else 'Mostrador'
+    products = sale.saleitem_set.values_list('product__name', flat=True) if sale.pk else []
+    return {
+        'ref': sale.pk, 'label': f"Venta #{sale.pk}", 'detail': f"{customer} · S/ {sale.total_amount:.2f}",
+        'title': f"venta {sale.pk}", 'terms': [customer, *products],
+    }
+
+
+_DOCUMENTS = {
+    CUSTOMER: _customer_document,
+    ORDER: _order_document,
+    PRODUCT: _product_document,
+    SALE: _sale_document,
+}
+
+
+def _rowid(kind, object_id):
+    return int(object_id) * 8 + _KIND_CODES[kind]
+
+
+def _row(kind, obj):
+    document = _DOCUMENTS[kind](obj)
+    return (
+        _rowid(kind, obj.pk), kind, obj.pk, str(document['ref']), document['label'], document['detail'],
+        normalize(document['title']), normalize(' '.join(str(term) for term in document['terms'] if term)),
+    )
+
+
+_INSERT_SQL = (
+    f"INSERT OR REPLACE INTO {TABLE} (rowid, kind, object_id, ref, label, detail, title, terms) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+def index(kind, obj):
+    """Agrega o reemplaza la fila de `obj` (de tipo `kind`) en el índice."""
+    index_many(kind, [obj])
+
+
+def index_many(kind, objects):
+    if not available():
+        return
+    rows = [_row(kind, obj) for obj in objects]
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(_INSERT_SQL, rows)
+        if kind == CUSTOMER:
+            _customers_changed()
+
+
+def unindex(kind, *object_ids):
+    """Quita del índice los objetos `object_ids` de tipo `kind`."""
+    if not available() or not object_ids:
+        return
+    rowids = [_rowid(kind, object_id) for object_id in object_ids]
+    placeholders = ', '.join(['%s'] * len(rowids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})", rowids)
+    if kind == CUSTOMER:
+        _customers_changed()
+
+
+def rebuild(models, chunk_size=2000):
+    """
+    Vuelve a armar el índice completo. `models` es un dict tipo -> modelo
+    de core.models. Devuelve la cantidad de filas indexadas.
+    """
+    if not available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+    _customers_changed()
+    total = 0
+    for kind, model in models.items():
+        queryset = model._default_manager.order_by('pk')
+        if kind == SALE:
+            queryset = queryset.select_related('customer')
+        chunk = []
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(obj)
+            if len(chunk) == chunk_size:
+                index_many(kind, chunk)
+                total += len(chunk)
+                chunk = []
+        index_many(kind, chunk)
+        total += len(chunk)
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------------------
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _kind_filter(kinds):
+    # El tipo se lee del rowid: filtrar por la columna `kind` obliga a leer
+    # cada fila coincidente y duplica el tiempo de las búsquedas amplias.
+    if set(kinds) >= set(KINDS):
+        return '1'
+    codes = ', '.join(str(_KIND_CODES[kind]) for kind in kinds)
+    return f"(rowid & 7) IN ({codes})"
+
+
+def _where(query):
+    """
+    (condición SQL, parámetros, usa_match) para las filas que contienen todos
+    los términos de `query`, o None si no hay nada que buscar.
+    """
+    terms = normalize(query).split()
+    if not terms:
+        return None
+    conditions, params = [], []
+    long_terms = [term for term in terms if len(term) >= MIN_TERM]
+    if long_terms:
+        conditions.append(f"{TABLE} MATCH %s")
+        params.append(' '.join(_quote(term) for term in long_terms))
+    for term in terms:
+        if len(term) < MIN_TERM:
+            pattern = '%' + _escape_like(term) + '%'
+            conditions.append("(title LIKE %s ESCAPE '\\' OR terms LIKE %s ESCAPE '\\')")
+            params += [pattern, pattern]
+    return ' AND '.join(conditions), params, bool(long_terms)
+
+
+def matching(kind, query):
+    """
+    Expresión para `filter(pk__in=...)` con los objetos de tipo `kind` que
+    coinciden con `query`, o None si `query` está vacío.
+    """
+    where = _where(query)
+    if where is None:
+        return None
+    condition, params, _ = where
+    return RawSQL(f"SELECT object_id FROM {TABLE} WHERE {_kind_filter([kind])} AND {condition}", params)
+
+
+_FALLBACK_FIELDS = {
+    CUSTOMER: ('name', 'customer_code', 'phone'),
+    ORDER: ('order_code', 'short_id', 'barcode', 'notes'),
+}
+
+
+def filter_q(kind, query):
+    """
+    `Q` para filtrar el modelo de `kind` por `query`: con el índice si está
+    disponible y, si no, con `icontains` sobre los mismos campos.
+    """
+    if not (query or '').strip():
+        return Q()
+    if available():
+        return Q(pk__in=matching(kind, query))
+    condition = Q()
+    if kind == CUSTOMER and looks_like_phone(query) and normalize_phone(query):
+        condition |= Q(phone_e164=normalize_phone(query))
+    for field in _FALLBACK_FIELDS[kind]:
+        condition |= Q(**{f'{field}__icontains': query.strip()})
+    return condition
+
+
+def _url(kind, ref):
+    if kind == CUSTOMER:
+        return reverse('manage_customer_orders', args=[ref])
+    if kind == ORDER:
+        return reverse('edit_order', args=[ref])
+    if kind == PRODUCT:
+        return reverse('edit_product', args=[ref])
+    return reverse('print_sale_ticket', args=[ref])
+
+
+def _result(kind, object_id, ref, label, detail):
+    return {'type': kind, 'id': object_id, 'ref': ref, 'label': label, 'detail': detail, 'url': _url(kind, ref)}
+
+
+def _rows(cursor, rowids):
+    """Columnas para mostrar de las filas `rowids`, en ese orden."""
+    if not rowids:
+        return []
+    cursor.execute(
+        f"SELECT rowid, kind, object_id, ref, label, detail FROM {TABLE} "
+        f"WHERE rowid IN ({', '.join(['%s'] * len(rowids))})", rowids,
+    )
+    found = {row[0]: row[1:] for row in cursor.fetchall()}
+    return [found[rowid] for rowid in rowids if rowid in found]
+
+
+def search(query, kinds=KINDS, limit=20, offset=0):
+    """
+    Resultados del omnibox para `query`, del más relevante al menos: dicts
+    con `type`, `id`, `ref` (código de cliente o id), `label`, `detail` y
+    `url`. Un número también trae, al principio de la primera página, el
+    pedido y la venta con ese id. `offset` salta ese número de resultados
+    (para paginar).
+    """
+    if not available():
+        return _fallback_search(query, kinds, limit, offset)
+    where = _where(query)
+    if where is None:
+        return []
+    condition, params, ranked = where
+    rowids = []
+    number = query.strip().lstrip('#')
+    if number.isdigit() and not offset:
+        rowids = [_rowid(kind, number) for kind in (ORDER, SALE) if kind in kinds]
+    if CUSTOMER in kinds and not offset:
+        rowids += [_rowid(CUSTOMER, pk) for pk in _phone_matches(query, limit)]
+    # Primero solo los rowid, ordenados: así el orden por relevancia no lee
+    # las columnas para mostrar de todas las coincidencias, solo de las elegidas.
+    sql = (
+        f"SELECT rowid FROM {TABLE} WHERE {_kind_filter(kinds)} AND {condition} "
+        f"ORDER BY {_RANK if ranked else 'rowid DESC'} LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, limit, offset])
+        rowids += [rowid for (rowid,) in cursor.fetchall() if rowid not in rowids]
+        rows = _rows(cursor, rowids[:limit])
+    return [_result(*row) for row in rows]
+
+
+def _phone_matches(query, limit):
+    """Ids de los clientes cuyo teléfono es exactamente `query` (consulta sobre `phone_e164`)."""
+    from .models import Customer
+
+    if not looks_like_phone(query):
+        return []
+    phone = normalize_phone(query)
+    if phone is None:
+        return []
+    return list(Customer.objects.filter(phone_e164=phone).order_by('pk').values_list('pk', flat=True)[:limit])
+
+
+def _fallback_search(query, kinds, limit, offset):
+    from .models import Customer, Order
+
+    query = (query or '').strip()
+    if not query:
+        return []
+    def results(kind, objects):
+        for obj in objects:
+            document = _DOCUMENTS[kind](obj)
+            yield _result(kind, obj.pk, document['ref'], document['label'], document['detail'])
+
+    found = []
+    if CUSTOMER in kinds:
+        found += results(CUSTOMER, Customer.objects.filter(filter_q(CUSTOMER, query)).order_by('name')[:offset + limit])
+    if ORDER in kinds:
+        found += results(ORDER, Order.objects.filter(filter_q(ORDER, query)).order_by('-created_at')[:offset + limit])
+    return found[offset:offset + limit]
@@ -0,0 +1,40 @@
+# laundry_app/core/services.py
+"""
+Operaciones de negocio que tocan varias tablas a la vez y que las vistas (o
+una importación masiva) llaman como una sola unidad.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import OrderCategory
+from .pricing import calculate_price, quantize_money
+
+
+def create_order(order, lines, price_per_kg, final_price=None):
+    """
+    Guarda un pedido nuevo con sus líneas en una sola pasada.
+
+    El precio se calcula antes de insertar, así que el pedido se escribe con un
+    único INSERT y sus líneas con un único `bulk_create`, sin importar cuántas
+    tenga. `order` es un `Order` sin guardar (p. ej. `form.save(commit=False)`),
+    `lines` una lista de `(Category, cantidad)` y `final_price` el precio que
+    el usuario escribió a mano, si lo hizo.
+    """
+    lines = [(category, quantity) for category, quantity in lines if category and quantity and quantity > 0]
+    initial_price = calculate_price(order.weight, price_per_kg, lines)
+
+    order.weight_price_per_kg = price_per_kg
+    order.total_weight = order.weight if order.weight is not None else Decimal('0.00')
+    order.payment_status = 'PENDING'
+    order.original_calculated_price = initial_price
+    if final_price is not None and final_price != initial_price:
+        order.price_adjusted_by_user = True
+        order.discount_amount = quantize_money(initial_price - final_price)
+
+    with transaction.atomic():
+        order.save()
+        OrderCategory.objects.bulk_create(
+            [OrderCategory(order=order, category=category, quantity=quantity) for category, quantity in lines]
+        )
+    return order
@@ -0,0 +1,81 @@
+# laundry_app/core/signals.py
+"""
+Contabilidad de los borrados: resumen de clientes (core.stats), totales
+diarios (core.rollups) e índice de búsqueda (core.search).
+
+Los guardados aplican su diferencia en save(), pero un registro también se
+borra sin pasar por su delete(): en cascada (borrar un cliente borra sus
+pedidos), con "borrar seleccionados" del admin o con cualquier
+`queryset.delete()`. En todos esos casos Django carga las filas y emite
+`pre_delete`/`post_delete` por cada una, así que la diferencia se aplica
+aquí, dentro de la misma transacción que el borrado. Se registran al
+cargar la app (ver CoreConfig.ready).
+"""
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import search
+from .models import Customer, Expense, Order, Product, Sale
+from .rollups import expense_rolled, order_rolled, sale_rolled
+from .stats import order_changed, sale_changed
+
+
+def _deleting_customer(origin):
+    """True si el borrado empezó en un cliente (o en un queryset de clientes)."""
+    if isinstance(origin, QuerySet):
+        return origin.model is Customer
+    return isinstance(origin, Customer)
+
+
+@receiver(pre_delete, sender=Order)
+@receiver(pre_delete, sender=Sale)
+@receiver(pre_delete, sender=Expense)
+def remember_saved_state(sender, instance, **kwargs):
+    # La fila todavía existe: se guarda su estado por si el objeto en memoria
+    # tiene cambios sin guardar.
+    instance._deleted_snapshot = instance._saved_snapshot()
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, origin=None, **kwargs):
+    old = getattr(instance, '_deleted_snapshot', None)
+    # Si se borra el cliente, su resumen se borra con él: actualizarlo aquí
+    # lo volvería a crear para un cliente que ya no existe.
+    if not _deleting_customer(origin):
+        order_changed(old, None)
+    order_rolled(old, None)
+    search.unindex(search.ORDER, instance.pk)
+
+
+@receiver(post_delete, sender=Sale)
+def sale_deleted(sender, instance, **kwargs):
+    old = getattr(instance, '_deleted_snapshot', None)
+    sale_changed(old, None)
+    sale_rolled(old, None)
+    search.unindex(search.SALE, instance.pk)
+
+
+@receiver(post_delete, sender=Expense)
+def expense_deleted(sender, instance, **kwargs):
+    expense_rolled(getattr(instance, '_deleted_snapshot', None), None)
+
+
+@receiver(pre_delete, sender=Customer)
+def remember_customer_sales(sender, instance, **kwargs):
+    # Las ventas quedan sin cliente (SET_NULL) con un UPDATE que no emite
+    # señales; se reindexan al terminar para que no sigan con su nombre.
+    instance._sale_ids = list(instance.sale_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    search.unindex(search.CUSTOMER, instance.pk)
+    sale_ids = getattr(instance, '_sale_ids', None)
+    if sale_ids:
+        search.index_many(search.SALE, Sale.objects.filter(pk__in=sale_ids))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    search.unindex(search.PRODUCT, instance.pk)
@@ -0,0 +1,233 @@
+# laundry_app/core/stats.py
+"""
+Resumen de cuenta por cliente (`CustomerStats`) mantenido de forma incremental.
+
+Order.save() y Sale.save() comparan el estado anterior de la fila con el
+nuevo y aplican solo la diferencia con un UPDATE atómico (`F(campo) + delta`);
+los borrados, por cualquier vía, los descuenta core.signals. Así el
+dashboard, el listado de clientes y el reporte de clientes ordenan y filtran
+por columnas indexadas en lugar de agregar todos los pedidos en cada petición.
+
+Lo que no pasa por save() ni emite señales (update() sobre querysets, cambios
+hechos a mano en la base) se reconcilia con
+`python manage.py rebuild_customer_stats`.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.db.models import Count, DecimalField, F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+ZERO = Decimal('0.00')
+_MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+STAT_FIELDS = ['order_count', 'lifetime_spent', 'outstanding_debt', 'sale_count', 'sales_total']
+
+
+# ---------------------------------------------------------------------------
+# Cambios incrementales
+# ---------------------------------------------------------------------------
+
+def order_snapshot(order):
+    """
+    Parte del pedido que cuenta para el resumen de su cliente y para los
+    totales diarios (core.rollups).
+    """
+    return (
+        order.customer_id, order.status, order.final_price, order.remaining_amount, order.created_at,
+        order.payment_method, order.payment_status,
+    )
+
+
+def sale_snapshot(sale):
+    """Parte de la venta que cuenta para el resumen de su cliente y los totales diarios."""
+    return (sale.customer_id, sale.total_amount, sale.created_at, sale.payment_method, sale.payment_status)
+
+
+def _order_contribution(snapshot):
+    customer_id, status, final_price, remaining_amount, created_at = snapshot[:5]
+    active = status != 'CANCELLED'
+    return customer_id, created_at, {
+        'order_count': 1,
+        'lifetime_spent': Decimal(final_price) if active else ZERO,
+        'outstanding_debt': Decimal(remaining_amount) if active else ZERO,
+    }
+
+
+def _sale_contribution(snapshot):
+    customer_id, total_amount, created_at = snapshot[:3]
+    return customer_id, created_at, {
+        'sale_count': 1,
+        'sales_total': Decimal(total_amount),
+    }
+
+
+def _latest(field, moment):
+    return Greatest(Coalesce(F(field), Value(moment)), Value(moment))
+
+
+def _apply_change(old, new, contribution, last_field):
+    deltas = defaultdict(lambda: defaultdict(Decimal))
+    activity = {}
+    for snapshot, sign in ((old, -1), (new, 1)):
+        if snapshot is None:
+            continue
+        customer_id, created_at, values = contribution(snapshot)
+        if customer_id is None:
+            continue
+        for field, value in values.items():
+            deltas[customer_id][field] += sign * value
+        # La actividad solo avanza con registros nuevos o que cambian de cliente.
+        if sign > 0 and created_at is not None and (old is None or old[0] != customer_id):
+            activity[customer_id] = created_at
+
+    from .models import CustomerStats
+
+    missing = []
+    for customer_id in set(deltas) | set(activity):
+        updates = {field: F(field) + delta for field, delta in deltas[customer_id].items() if delta}
+        if customer_id in activity:
+            moment = activity[customer_id]
+            updates[last_field] = _latest(last_field, moment)
+            updates['last_activity_at'] = _latest('last_activity_at', moment)
+        if not updates:
+            continue
+        updates['updated_at'] = timezone.now()
+        if not CustomerStats.objects.filter(customer_id=customer_id).update(**updates):
+            missing.append(customer_id)
+    if old is not None and old[0] is not None and (new is None or new[0] != old[0]):
+        _rewind_activity(old[0], contribution(old)[1], last_field)
+    if missing:
+        # Clientes sin fila de resumen todavía: se calcula desde cero.
+        refresh_customer_stats(missing)
+
+
+def _rewind_activity(customer_id, created_at, last_field):
+    """
+    Si el registro que dejó al cliente (borrado o pasado a otro) era su
+    último, la fecha de última actividad retrocede y no sale de un delta: se
+    lee de las filas que quedan. Se puede repetir sin efecto, así que sirve
+    también cuando un borrado en lote emite una señal por fila ya borrada.
+    """
+    from .models import CustomerStats, Order, Sale
+
+    stats = CustomerStats.objects.filter(customer_id=customer_id, **{last_field: created_at}).first()
+    if stats is None:
+        return
+    model, other_field = (Order, 'last_sale_at') if last_field == 'last_order_at' else (Sale, 'last_order_at')
+    latest = model.objects.filter(customer_id=customer_id).aggregate(last=Max('created_at'))['last']
+    moments = [m for m in (latest, getattr(stats, other_field)) if m is not None]
+    CustomerStats.objects.filter(customer_id=customer_id).update(
+        **{last_field: latest}, last_activity_at=max(moments) if moments else None, updated_at=timezone.now(),
+    )
+
+
+def order_changed(old, new):
+    """
+    Aplica al resumen el cambio de un pedido. `old` y `new` son
+    `order_snapshot()` antes y después (None si el pedido no existía o se borró).
+    """
+    _apply_change(old, new, _order_contribution, 'last_order_at')
+
+
+def sale_changed(old, new):
+    """Igual que `order_changed` pero para una venta (`sale_snapshot()`)."""
+    _apply_change(old, new, _sale_contribution, 'last_sale_at')
+
+
+# ---------------------------------------------------------------------------
+# Cálculo completo (reconciliación)
+# ---------------------------------------------------------------------------
+
+def _aggregate(queryset, output_field, **aggregate):
+    (name, expression), = aggregate.items()
+    return Subquery(
+        queryset.filter(customer=OuterRef('pk')).values('customer')
+        .annotate(**{name: expression}).values(name)[:1],
+        output_field=output_field,
+    )
+
+
+def customer_stats_rows(customer_model, order_model, sale_model, customer_ids=None):
+    """
+    Calcula desde cero el resumen de los clientes indicados (o de todos).
+    Devuelve un generador de dicts con los campos de `CustomerStats`.
+    """
+    customers = customer_model.objects.all()
+    if customer_ids is not None:
+        customers = customers.filter(pk__in=customer_ids)
+    active_orders = order_model.objects.exclude(status='CANCELLED')
+    money, integer = _MONEY, IntegerField()
+    rows = customers.order_by('pk').annotate(
+        s_order_count=Coalesce(_aggregate(order_model.objects.all(), integer, n=Count('id')), 0),
+        s_lifetime_spent=Coalesce(_aggregate(active_orders, money, total=Sum('final_price')), ZERO, output_field=money),
+        s_outstanding_debt=Coalesce(_aggregate(active_orders, money, total=Sum('remaining_amount')), ZERO, output_field=money),
+        s_last_order_at=_aggregate(order_model.objects.all(), order_model._meta.get_field('created_at'), last=Max('created_at')),
+        s_sale_count=Coalesce(_aggregate(sale_model.objects.all(), integer, n=Count('id')), 0),
+        s_sales_total=Coalesce(_aggregate(sale_model.objects.all(), money, total=Sum('total_amount')), ZERO, output_field=money),
+        s_last_sale_at=_aggregate(sale_model.objects.all(), sale_model._meta.get_field('created_at'), last=Max('created_at')),
+    ).values(
+        'pk', 's_order_count', 's_lifetime_spent', 's_outstanding_debt', 's_last_order_at',
+        's_sale_count', 's_sales_total', 's_last_sale_at',
+    )
+    for row in rows.iterator(chunk_size=1000):
+        moments = [m for m in (row['s_last_order_at'], row['s_last_sale_at']) if m is not None]
+        yield {
+            'customer_id': row['pk'],
+            'order_count': row['s_order_count'],
+            'lifetime_spent': row['s_lifetime_spent'],
+            'outstanding_debt': row['s_outstanding_debt'],
+            'sale_count': row['s_sale_count'],
+            'sales_total': row['s_sales_total'],
+            'last_order_at': row['s_last_order_at'],
+            'last_sale_at': row['s_last_sale_at'],
+            'last_activity_at': max(moments) if moments else None,
+        }
+
+
+def write_customer_stats(stats_model, rows, batch_size=500):
+    """Inserta o reemplaza (upsert) las filas de resumen. Devuelve cuántas escribió."""
+    now = timezone.now()
+    rows = iter(rows)
+    written = 0
+    while True:
+        objs = [stats_model(updated_at=now, **row) for row in islice(rows, batch_size)]
+        if not objs:
+            return written
+        stats_model.objects.bulk_create(
+            objs, update_conflicts=True, unique_fields=['customer'],
+            update_fields=STAT_FIELDS + ['last_order_at', 'last_sale_at', 'last_activity_at', 'updated_at'],
+        )
+        written += len(objs)
+
+
+def refresh_customer_stats(customer_ids=None):
+    """Recalcula desde cero el resumen de `customer_ids` (o de todos los clientes)."""
+    from .models import Customer, CustomerStats, Order, Sale
+
+    if customer_ids is not None:
+        customer_ids = list(customer_ids)
+        if not customer_ids:
+            return 0
+    return write_customer_stats(CustomerStats, customer_stats_rows(Customer, Order, Sale, customer_ids))
+
+
+def stale_customer_stats():
+    """
+    Ids de clientes cuyo resumen guardado no coincide con el cálculo completo
+    (o que no tienen resumen). Sirve para vigilar la deriva incremental.
+    """
+    from .models import Customer, CustomerStats, Order, Sale
+
+    stored = {
+        row['customer_id']: row
+        for row in CustomerStats.objects.values('customer_id', *STAT_FIELDS, 'last_order_at', 'last_sale_at')
+    }
+    stale = []
+    for row in customer_stats_rows(Customer, Order, Sale):
+        current = stored.get(row['customer_id'])
+        if current is None or any(current[field] != row[field] for field in current if field != 'customer_id'):
+            stale.append(row['customer_id'])
+    return stale
@@ -0,0 +1,27 @@
+# laundry_app/core/tasks.py
+"""Trabajos en segundo plano de la app. Se registran al cargar la app (ver CoreConfig.ready)."""
+from django.core.files.storage import default_storage
+
+from . import identifiers
+from .jobs import task
+from .report_exports import generate_export
+
+
+@task('delete_files')
+def delete_files(paths):
+    """Borra del almacenamiento archivos que ya no usa ningún registro."""
+    for path in paths:
+        if default_storage.exists(path):
+            default_storage.delete(path)
+
+
+@task('build_report_pdf', max_attempts=1)
+def build_report_pdf(export_id):
+    """Genera el PDF de un reporte pedido (`ReportExport`). Si falla, se vuelve a pedir desde la página."""
+    generate_export(export_id)
+
+
+@task(identifiers.REFILL_TASK)
+def refill_customer_code_pool():
+    """Amplía el pool de códigos de cliente antes de que se agote (ver core.identifiers)."""
+    identifiers.refill_customer_code_pool()
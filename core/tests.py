@@ -1,3 +1,1429 @@
-from django.test import TestCase
+import csv
+import re
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from reportlab.platypus import Paragraph
+
+from . import (
+    exports, identifiers, jobs, ledger, lookup, pdf, pricing, query_plans, report_exports, report_pdf, search, views,
+)
+from .cache import SQLiteCache
+from .config import VERSION_KEY, app_settings
+from .dates import as_date, date_range_q, day_q
+from .pagination import BOUNDED, EXACT, KeysetPaginator
+from .phones import looks_like_phone, normalize_phone, whatsapp_url
+from .kpis import approximate_count, dashboard_kpis
+from .forms import CustomerForm, ReportFilterForm
+from .identifiers import (
+    GROW_LOCK_KEY, ORDER_IDENTIFIERS, IdentifierSpaceExhausted, allocate_customer_code,
+    bulk_create_with_identifiers, fill_customer_code_pool, grow_customer_code_pool, identifier_stats,
+    permuted_customer_codes,
+)
+from .models import (
+    AppConfiguration, Category, Customer, CustomerCodePool, CustomerStats, DailyStats, Expense, Job, Order, Product,
+    ReportExport, Sale, SaleItem,
+)
+from .rollups import EXPENSE, ORDER, SALE, rebuild_daily_stats, rollup_summary, rollup_total, stale_daily_stats
+from .services import create_order
+from .stats import refresh_customer_stats, stale_customer_stats
+
+# Las pruebas no deben escribir en el archivo de caché compartido de desarrollo.
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'select2': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-select2'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BaseTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+def make_user(username='caja'):
+    return User.objects.create_user(username, password='clave-de-prueba')
+
+
+def make_customer(name='Cliente Prueba', **kwargs):
+    customer = Customer(name=name, **kwargs)
+    customer.save()
+    return customer
+
+
+def make_order(customer, weight='2.00', price_per_kg='5.00', lines=(), **kwargs):
+    """Pedido guardado como lo guarda add_order (precio calculado, pago pendiente)."""
+    return create_order(Order(customer=customer, weight=Decimal(weight), **kwargs), list(lines), Decimal(price_per_kg))
+
+
+# ---------------------------------------------------------------------------
+# Pool de códigos de cliente
+# ---------------------------------------------------------------------------
+
+class CustomerCodePoolTests(BaseTestCase):
+    def test_permutation_covers_every_code_once(self):
+        codes = list(permuted_customer_codes(4))
+        self.assertEqual(len(codes), 10 ** 4)
+        self.assertEqual(set(codes), {f"{n:04d}" for n in range(10 ** 4)})
+        self.assertNotEqual(codes, sorted(codes))
+
+    def test_fill_skips_assigned_and_pooled_codes(self):
+        CustomerCodePool.objects.all().delete()
+        Customer.objects.bulk_create([Customer(name='A', customer_code='0001'), Customer(name='B', customer_code='0002')])
+        CustomerCodePool.objects.create(code='0003', width=4)
+
+        added = fill_customer_code_pool(4, batch_size=700)
+
+        self.assertEqual(added, 10 ** 4 - 3)
+        self.assertEqual(CustomerCodePool.objects.filter(width=4).count(), 10 ** 4 - 2)
+        self.assertFalse(CustomerCodePool.objects.filter(code__in=['0001', '0002']).exists())
+        # Una segunda pasada (otro proceso que llegó tarde) no falla ni duplica.
+        self.assertEqual(fill_customer_code_pool(4), 0)
+
+    def test_allocate_takes_pool_head_in_order(self):
+        head = list(CustomerCodePool.objects.order_by('id').values_list('code', flat=True)[:2])
+        first, second = make_customer('Uno'), make_customer('Dos')
+        self.assertEqual([first.customer_code, second.customer_code], head)
+        self.assertFalse(CustomerCodePool.objects.filter(code__in=head).exists())
+
+    def test_empty_pool_is_refilled_without_reusing_codes(self):
+        customer = make_customer()
+        CustomerCodePool.objects.all().delete()
+
+        with self.assertLogs('core.identifiers', 'WARNING'):
+            code = allocate_customer_code()
+
+        self.assertEqual(len(code), 4)
+        self.assertNotEqual(code, customer.customer_code)
+        self.assertFalse(CustomerCodePool.objects.filter(code=customer.customer_code).exists())
+
+    def test_grow_waits_for_the_process_holding_the_lock(self):
+        cache.add(GROW_LOCK_KEY, 'otro-proceso')
+        # Con códigos en el pool, quien no tiene el bloqueo no agrega nada.
+        self.assertEqual(grow_customer_code_pool(wait=0), 0)
+        CustomerCodePool.objects.all().delete()
+        with self.assertRaises(IdentifierSpaceExhausted):
+            grow_customer_code_pool(wait=0)
+        self.assertFalse(CustomerCodePool.objects.exists())
+
+    def test_grow_releases_the_lock(self):
+        CustomerCodePool.objects.all().delete()
+        self.assertGreater(grow_customer_code_pool(), 0)
+        self.assertIsNone(cache.get(GROW_LOCK_KEY))
+
+    @override_settings(JOBS_EAGER=False)
+    def test_low_pool_is_refilled_by_a_single_job(self):
+        keep = CustomerCodePool.objects.order_by('id').values_list('id', flat=True)[3]
+        CustomerCodePool.objects.filter(id__gt=keep).delete()
+        self.assertFalse(Job.objects.exists())
+        make_customer('Uno')
+        make_customer('Dos')
+        self.assertEqual(Job.objects.filter(name=identifiers.REFILL_TASK, status=Job.PENDING).count(), 1)
+
+        with mock.patch.object(identifiers, 'fill_customer_code_pool', return_value=7) as fill:
+            self.assertEqual(jobs.run_pending(), 1)
+        fill.assert_called_once_with(5)  # El ancho actual aún tiene códigos: se prepara el siguiente.
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+    def test_refill_does_nothing_while_the_pool_is_healthy(self):
+        with mock.patch.object(identifiers, 'fill_customer_code_pool') as fill:
+            self.assertEqual(identifiers.refill_customer_code_pool(), 0)
+        fill.assert_not_called()
+        with mock.patch.object(identifiers, 'CUSTOMER_CODE_LOW_WATERMARK', CustomerCodePool.objects.count() + 1):
+            self.assertTrue(identifiers.customer_code_pool_is_low())
+
+
+# ---------------------------------------------------------------------------
+# Identificadores de pedidos con INSERT y reintento
+# ---------------------------------------------------------------------------
+
+class OrderIdentifierTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        identifiers.flush_identifier_counters()
+        cache.clear()
+        self.customer = make_customer()
+
+    def test_order_gets_identifiers_on_insert(self):
+        order = make_order(self.customer)
+        self.assertEqual(len(order.order_code), identifiers.ORDER_CODE_LENGTH)
+        self.assertEqual(len(order.short_id), identifiers.SHORT_ID_LENGTH)
+
+    def test_collision_is_retried_with_new_code(self):
+        taken = make_order(self.customer).order_code
+        codes = iter([taken, 'NUEVO1'])
+        with mock.patch.dict(ORDER_IDENTIFIERS, {'order_code': lambda: next(codes)}):
+            order = make_order(self.customer)
+        self.assertEqual(order.order_code, 'NUEVO1')
+        self.assertEqual(identifier_stats()['order_code']['collisions'], 1)
+
+    def test_counters_reach_the_cache_in_batches(self):
+        make_order(self.customer)
+        key = identifiers._counter_key(Order, 'short_id', 'attempts')
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(identifier_stats()['short_id']['attempts'], 1)
+        self.assertEqual(cache.get(key), 1)
+
+    def test_bulk_create_assigns_unique_identifiers(self):
+        orders = bulk_create_with_identifiers(
+            Order(customer=self.customer, weight=Decimal('1.00')) for _ in range(50)
+        )
+        codes = {order.order_code for order in orders}
+        self.assertEqual(len(codes), 50)
+        self.assertEqual(Order.objects.filter(order_code__in=codes).count(), 50)
+
+
+# ---------------------------------------------------------------------------
+# Cola de trabajos en segundo plano
+# ---------------------------------------------------------------------------
+
+calls = []
+
+
+@jobs.task('tests.record', max_attempts=2)
+def record(value, fail=False):
+    if fail:
+        raise RuntimeError('falla de prueba')
+    calls.append(value)
+
+
+@override_settings(JOBS_EAGER=False)
+class JobQueueTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def test_pending_job_runs_once(self):
+        job = jobs.enqueue('tests.record', value=1)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(jobs.run_pending(), 0)
+        self.assertEqual(calls, [1])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
+
+    def test_claimed_job_is_not_run_twice(self):
+        job = jobs.enqueue('tests.record', value=1)
+        self.assertTrue(jobs._claim(job.pk))
+        self.assertFalse(jobs.run_job(job.pk))
+        self.assertEqual(calls, [])
+
+    def test_failed_job_is_retried_later_then_marked_failed(self):
+        job = jobs.enqueue('tests.record', value=1, fail=True)
+        with self.assertLogs('core.jobs', 'WARNING'):
+            jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('falla de prueba', job.last_error)
+        self.assertEqual(jobs.run_pending(), 0)
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_rolled_back_transaction_drops_the_job(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                jobs.enqueue('tests.record', value=1)
+                raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+
+    def test_stale_running_job_is_requeued(self):
+        job = jobs.enqueue('tests.record', value=1)
+        jobs._claim(job.pk)
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - jobs.STALE_AFTER - timedelta(seconds=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+    def test_unknown_job_name_is_rejected(self):
+        with self.assertRaises(KeyError):
+            jobs.enqueue('tests.no-existe')
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue('tests.record', value=2)
+        self.assertEqual(calls, [2])
+
+    def test_prune_keeps_pending_and_recent_jobs(self):
+        now = timezone.now()
+        ages = {
+            'done-old': (Job.DONE, jobs.DONE_RETENTION), 'done-new': (Job.DONE, timedelta(days=1)),
+            'failed-mid': (Job.FAILED, jobs.DONE_RETENTION), 'failed-old': (Job.FAILED, jobs.FAILED_RETENTION),
+            'pending-old': (Job.PENDING, jobs.FAILED_RETENTION),
+        }
+        for value, (status, age) in ages.items():
+            job = jobs.enqueue('tests.record', value=value)
+            Job.objects.filter(pk=job.pk).update(status=status, updated_at=now - age - timedelta(seconds=1))
+
+        with mock.patch.object(jobs, '_PRUNE_CHUNK', 1):
+            self.assertEqual(jobs.prune_finished(now), 2)
+        self.assertEqual(
+            sorted(Job.objects.values_list('payload__value', flat=True)), ['done-new', 'failed-mid', 'pending-old'],
+        )
+        out = StringIO()
+        call_command('run_jobs', prune=True, stdout=out)
+        self.assertIn('Se borraron 0 trabajos', out.getvalue())
+
+
+# ---------------------------------------------------------------------------
+# QR al vuelo
+# ---------------------------------------------------------------------------
+
+class QRImageTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('qr_image', args=['order', 'AbCd1234', 'svg'])
+
+    def test_requires_login(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response['Location'])
+
+    def test_renders_svg_with_etag(self):
+        self.client.force_login(make_user())
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn('private', response['Cache-Control'])
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_rejects_unknown_kind_format_or_code(self):
+        self.client.force_login(make_user())
+        for args in (['pedido', 'AbCd1234', 'svg'], ['order', 'AbCd1234', 'gif'], ['customer', 'abc', 'png']):
+            self.assertEqual(self.client.get(reverse('qr_image', args=args)).status_code, 404)
+
+
+# ---------------------------------------------------------------------------
+# Alta de pedidos en una sola pasada
+# ---------------------------------------------------------------------------
+
+class CreateOrderTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer()
+        self.categories = [Category.objects.create(name=f'Categoría {i}', price=Decimal('3.50')) for i in range(5)]
+
+    def test_price_and_lines_are_saved_together(self):
+        lines = [(self.categories[0], 2), (self.categories[1], 0), (None, 3)]
+        order = create_order(Order(customer=self.customer, weight=Decimal('4.00')), lines, Decimal('5.00'))
+        order.refresh_from_db()
+        self.assertEqual(order.original_calculated_price, Decimal('27.00'))
+        self.assertEqual(order.total_price, Decimal('27.00'))
+        self.assertEqual(order.ordercategory_set.count(), 1)
+
+    def test_manual_price_becomes_a_discount(self):
+        order = create_order(
+            Order(customer=self.customer, weight=Decimal('4.00')), [], Decimal('5.00'), final_price=Decimal('18.00'),
+        )
+        self.assertTrue(order.price_adjusted_by_user)
+        self.assertEqual(order.discount_amount, Decimal('2.00'))
+        self.assertEqual(order.total_price, Decimal('18.00'))
+
+    def _post(self, count):
+        data = {
+            'customer': self.customer.pk, 'weight': '4.5', 'weight_price_per_kg': '5.00', 'notes': '',
+            'formset-TOTAL_FORMS': str(count), 'formset-INITIAL_FORMS': '0',
+            'formset-MIN_NUM_FORMS': '0', 'formset-MAX_NUM_FORMS': '1000',
+        }
+        for i, category in enumerate(self.categories[:count]):
+            data[f'formset-{i}-category'] = category.pk
+            data[f'formset-{i}-quantity'] = '2'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('add_order'), data)
+        return response.json(), len(queries)
+
+    def test_add_order_query_count_does_not_grow_with_lines(self):
+        self.client.force_login(make_user())
+        self._post(0)  # Calienta la configuración cacheada.
+        one, one_queries = self._post(1)
+        five, five_queries = self._post(5)
+        self.assertTrue(one['success'] and five['success'])
+        self.assertEqual(one_queries, five_queries)
+        self.assertEqual(Order.objects.get(pk=five['order_id']).ordercategory_set.count(), 5)
+
+
+# ---------------------------------------------------------------------------
+# Motor de precios y recálculo masivo
+# ---------------------------------------------------------------------------
+
+class PricingTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer()
+        self.category = Category.objects.create(name='Edredón', price=Decimal('12.50'))
+
+    def _order(self, final_price=None):
+        return create_order(
+            Order(customer=self.customer, weight=Decimal('3.30')), [(self.category, 2)], Decimal('4.75'), final_price,
+        )
+
+    def test_sql_price_matches_python_price(self):
+        order = self._order()
+        sql_price = Order.objects.annotate(price=pricing.order_price_expression()).get(pk=order.pk).price
+        self.assertEqual(sql_price, pricing.calculate_price(order.weight, Decimal('4.75'), [(self.category, 2)]))
+        self.assertEqual(sql_price, Decimal('40.68'))
+
+    def test_reprice_updates_stale_orders_in_chunks(self):
+        plain, adjusted = self._order(), self._order(final_price=Decimal('35.00'))
+        Category.objects.filter(pk=self.category.pk).update(price=Decimal('15.00'))
+        self.assertEqual(pricing.stale_orders(Order.objects.all()).count(), 2)
+
+        chunks = []
+        updated = pricing.reprice_orders(Order.objects.all(), chunk_size=1, on_chunk=lambda *args: chunks.append(args))
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(len(chunks), 2)
+        self.assertFalse(pricing.stale_orders(Order.objects.all()).exists())
+        plain.refresh_from_db()
+        adjusted.refresh_from_db()
+        self.assertEqual(plain.total_price, Decimal('45.68'))
+        # El precio cobrado a mano no cambia: el descuento absorbe la diferencia.
+        self.assertEqual(adjusted.total_price, Decimal('35.00'))
+        self.assertEqual(adjusted.discount_amount, Decimal('10.68'))
+
+    def test_reprice_resumes_after_the_given_id(self):
+        first, second = self._order(), self._order()
+        Category.objects.filter(pk=self.category.pk).update(price=Decimal('15.00'))
+        self.assertEqual(pricing.reprice_orders(Order.objects.all(), after_id=first.pk), 1)
+        self.assertEqual(list(pricing.stale_orders(Order.objects.all()).values_list('pk', flat=True)), [first.pk])
+        second.refresh_from_db()
+        self.assertEqual(second.total_price, Decimal('45.68'))
+
+    def test_reprice_only_touches_orders_whose_price_changes(self):
+        other = Category.objects.create(name='Frazada', price=Decimal('9.00'))
+        changed = self._order()
+        unchanged = create_order(Order(customer=self.customer, weight=Decimal('1.00')), [(other, 1)], Decimal('4.75'))
+        Category.objects.filter(pk=self.category.pk).update(price=Decimal('15.00'))
+
+        chunks = []
+        updated = pricing.reprice_orders(Order.objects.all(), chunk_size=1, on_chunk=lambda *args: chunks.append(args))
+        self.assertEqual(updated, 1)
+        self.assertEqual(chunks, [(changed.pk, 1), (unchanged.pk, 0)])
+        with mock.patch('core.stats.refresh_customer_stats') as refresh:
+            self.assertEqual(pricing.reprice_orders(Order.objects.all()), 0)
+        refresh.assert_not_called()
+
+
+# ---------------------------------------------------------------------------
+# Precio final y saldo guardados en el pedido
+# ---------------------------------------------------------------------------
+
+class StoredAmountsTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = make_order(make_customer())  # 2 kg x 5.00
+
+    def test_amounts_follow_payment_status(self):
+        self.assertEqual((self.order.final_price, self.order.remaining_amount), (Decimal('10.00'), Decimal('10.00')))
+
+        self.order.payment_status, self.order.partial_amount = 'PARTIAL', Decimal('3.50')
+        self.order.save()
+        self.assertEqual(self.order.remaining_amount, Decimal('6.50'))
+
+        self.order.payment_status = 'PAID'
+        self.order.save()
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.final_price, self.order.remaining_amount), (Decimal('10.00'), Decimal('0.00')))
+
+    def test_manual_discount_lowers_final_price(self):
+        self.order.price_adjusted_by_user, self.order.discount_amount = True, Decimal('1.50')
+        self.order.save()
+        self.assertEqual((self.order.final_price, self.order.remaining_amount), (Decimal('8.50'), Decimal('8.50')))
+
+    def test_sql_expressions_match_refresh_amounts(self):
+        self.order.payment_status, self.order.partial_amount = 'PARTIAL', Decimal('4.00')
+        self.order.save()
+        Order.objects.filter(pk=self.order.pk).update(final_price=0, remaining_amount=0)
+        Order.objects.filter(pk=self.order.pk).update(
+            final_price=pricing.final_price_expression(), remaining_amount=pricing.remaining_amount_expression(),
+        )
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.final_price, self.order.remaining_amount), (Decimal('10.00'), Decimal('6.00')))
+
+
+# ---------------------------------------------------------------------------
+# Resumen de cuenta por cliente
+# ---------------------------------------------------------------------------
+
+class CustomerStatsTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer()
+
+    def stats(self, customer=None):
+        return CustomerStats.objects.get(customer=customer or self.customer)
+
+    def test_orders_and_sales_update_the_summary(self):
+        order = make_order(self.customer)
+        make_order(self.customer, weight='1.00')
+        Sale.objects.create(customer=self.customer, total_amount=Decimal('7.25'))
+
+        stats = self.stats()
+        self.assertEqual((stats.order_count, stats.lifetime_spent, stats.outstanding_debt), (2, Decimal('15.00'), Decimal('15.00')))
+        self.assertEqual((stats.sale_count, stats.sales_total), (1, Decimal('7.25')))
+
+        order.payment_status, order.partial_amount = 'PARTIAL', Decimal('4.00')
+        order.save()
+        self.assertEqual(self.stats().outstanding_debt, Decimal('11.00'))
+        self.assertEqual(stale_customer_stats(), [])
+
+    def test_moving_an_order_moves_its_amounts(self):
+        other = make_customer('Otro')
+        order = make_order(self.customer)
+        order.customer = other
+        order.save()
+        self.assertEqual((self.stats().order_count, self.stats().lifetime_spent), (0, Decimal('0.00')))
+        self.assertEqual((self.stats(other).order_count, self.stats(other).lifetime_spent), (1, Decimal('10.00')))
+
+    def test_cancelled_order_leaves_no_debt_anywhere(self):
+        order = make_order(self.customer)
+        make_order(self.customer, weight='1.00')
+        order.status = 'CANCELLED'
+        order.save()
+
+        order.refresh_from_db()
+        self.assertEqual(order.remaining_amount, Decimal('0.00'))
+        self.assertEqual(self.stats().outstanding_debt, Decimal('5.00'))
+        self.assertEqual(dashboard_kpis().total_due, self.stats().outstanding_debt)
+        self.assertFalse(Order.objects.filter(pk=order.pk, remaining_amount__gt=0).exists())
+        self.assertEqual(
+            Order.objects.annotate(due=pricing.remaining_amount_expression()).get(pk=order.pk).due, Decimal('0.00'),
+        )
+
+    def test_refresh_rebuilds_drifted_rows(self):
+        make_order(self.customer)
+        CustomerStats.objects.filter(customer=self.customer).update(order_count=9, outstanding_debt=0)
+        self.assertEqual(stale_customer_stats(), [self.customer.pk])
+        refresh_customer_stats([self.customer.pk])
+        self.assertEqual(stale_customer_stats(), [])
+
+
+# ---------------------------------------------------------------------------
+# Índices compuestos y verificación de planes
+# ---------------------------------------------------------------------------
+
+class QueryPlanTests(BaseTestCase):
+    def test_full_scan_detection(self):
+        tables = {'core_order'}
+        self.assertEqual(query_plans.full_scans('SELECT 1', ['SCAN core_order'], tables), ['core_order'])
+        self.assertEqual(query_plans.full_scans('SELECT 1', ['SCAN core_order AS U0 USING INDEX x'], tables), ['core_order'])
+        self.assertEqual(query_plans.full_scans('SELECT 1 LIMIT 20', ['SCAN core_order USING INDEX x'], tables), [])
+        self.assertEqual(query_plans.full_scans('SELECT 1', ['SEARCH core_order USING INDEX x (status=?)'], tables), [])
+        self.assertEqual(query_plans.full_scans('SELECT 1', ['SCAN core_customer'], tables), [])
+
+    def test_hot_views_use_indexes(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('Ninguna consulta nueva recorre tablas completas.', out.getvalue())
+
+
+# ---------------------------------------------------------------------------
+# Filtros por rango de fechas locales
+# ---------------------------------------------------------------------------
+
+def local_moment(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class DateRangeTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        customer = make_customer()
+        # Lima es UTC-5: las 23:30 locales ya son el día siguiente en UTC.
+        self.moments = [local_moment(2026, 3, 9, 23, 59), local_moment(2026, 3, 10, 0, 0), local_moment(2026, 3, 10, 23, 30),
+                        local_moment(2026, 3, 11, 0, 0)]
+        self.orders = [make_order(customer) for _ in self.moments]
+        for order, moment in zip(self.orders, self.moments):
+            Order.objects.filter(pk=order.pk).update(created_at=moment)
+
+    def ids(self, q):
+        return set(Order.objects.filter(q).values_list('pk', flat=True))
+
+    def test_matches_the_date_lookup(self):
+        day = date(2026, 3, 10)
+        self.assertEqual(self.ids(day_q(day)), self.ids(Q(created_at__date=day)))
+        self.assertEqual(self.ids(day_q(day)), {self.orders[1].pk, self.orders[2].pk})
+        self.assertEqual(
+            self.ids(date_range_q('2026-03-09', '2026-03-10')),
+            self.ids(Q(created_at__date__gte=date(2026, 3, 9), created_at__date__lte=day)),
+        )
+
+    def test_open_ended_and_invalid_bounds(self):
+        self.assertEqual(self.ids(date_range_q(date_from='2026-03-11')), {self.orders[3].pk})
+        self.assertEqual(self.ids(date_range_q(date_to='2026-03-09')), {self.orders[0].pk})
+        self.assertEqual(len(self.ids(date_range_q('no-es-fecha', ''))), 4)
+        self.assertIsNone(as_date('2026-02-30'))
+
+
+# ---------------------------------------------------------------------------
+# KPIs del dashboard en una consulta
+# ---------------------------------------------------------------------------
+
+class DashboardKpiTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        customer = make_customer()
+        self.today = date(2026, 3, 18)  # miércoles
+        placed = {
+            'today': local_moment(2026, 3, 18, 9, 0),
+            'monday': local_moment(2026, 3, 16, 9, 0),
+            'month': local_moment(2026, 3, 2, 9, 0),
+            'old': local_moment(2026, 1, 5, 9, 0),
+        }
+        self.orders = {}
+        for name, moment in placed.items():
+            order = make_order(customer)
+            order.payment_status = 'PAID'
+            order.save()
+            Order.objects.filter(pk=order.pk).update(created_at=moment)
+            self.orders[name] = order
+        old = self.orders['old']
+        old.payment_status, old.status = 'PENDING', 'READY'
+        old.save()
+        cancelled = make_order(customer)
+        cancelled.payment_status, cancelled.status = 'PAID', 'CANCELLED'
+        cancelled.save()
+        Order.objects.filter(pk=cancelled.pk).update(created_at=placed['today'])
+
+    def test_cards_in_one_query(self):
+        with self.assertNumQueries(2):  # Los KPIs y el COUNT(*) del total.
+            kpis = dashboard_kpis(today=self.today)
+        self.assertEqual(kpis.daily_income, Decimal('10.00'))
+        self.assertEqual(kpis.weekly_income, Decimal('20.00'))
+        self.assertEqual(kpis.monthly_income, Decimal('30.00'))
+        self.assertEqual(kpis.total_due, Decimal('10.00'))
+        self.assertEqual((kpis.ready_count, kpis.payment_pending_count, kpis.processing_count), (1, 1, 3))
+        self.assertEqual(kpis.total_count, 5)
+
+    def test_approximate_total(self):
+        kpis = dashboard_kpis(today=self.today, approximate_total=True)
+        self.assertTrue(kpis.total_is_approximate)
+        self.assertGreaterEqual(kpis.total_count, Order.objects.count())
+        self.assertEqual(approximate_count(Order), Order.objects.order_by('-pk').first().pk)
+
+
+# ---------------------------------------------------------------------------
+# Caché compartida en SQLite
+# ---------------------------------------------------------------------------
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/cache.sqlite3'
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'TIMEOUT': 300, 'OPTIONS': {'ACCESS_RESOLUTION': 0, **options}})
+
+    def test_values_round_trip_and_are_shared_between_instances(self):
+        self.cache.set('entero', 7)
+        self.cache.set_many({'dict': {'a': [1, 2]}, 'grande': 2 ** 70})
+        other = self.make_cache()
+        self.assertEqual(other.get_many(['entero', 'dict', 'grande', 'falta']), {'entero': 7, 'dict': {'a': [1, 2]}, 'grande': 2 ** 70})
+        other.delete('entero')
+        self.assertIsNone(self.cache.get('entero'))
+
+    def test_expired_entries_are_not_returned_and_can_be_added_again(self):
+        self.cache.set('clave', 'vieja', timeout=0.05)
+        self.assertFalse(self.cache.add('clave', 'nueva'))
+        time.sleep(0.06)
+        self.assertIsNone(self.cache.get('clave'))
+        self.assertFalse(self.cache.has_key('clave'))
+        self.assertTrue(self.cache.add('clave', 'nueva'))
+        self.assertEqual(self.cache.get('clave'), 'nueva')
+
+    def test_incr_is_atomic_across_threads(self):
+        self.cache.set('contador', 0)
+
+        def worker():
+            cache = self.make_cache()
+            for _ in range(50):
+                cache.incr('contador')
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('contador'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('no-existe')
+
+    def test_least_recently_used_entries_are_culled(self):
+        cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2, 'ACCESS_RESOLUTION': 0}})
+        for n in range(4):
+            cache.set(f'k{n}', n)
+            time.sleep(0.002)
+        cache.get('k0')  # k0 pasa a ser la más usada recientemente.
+        cache.set('k4', 4)
+        self.assertEqual(sorted(cache.get_many([f'k{n}' for n in range(5)])), ['k0', 'k3', 'k4'])
+
+    def test_versions_are_part_of_the_key(self):
+        self.cache.set('clave', 'v1')
+        self.cache.incr_version('clave')
+        self.assertIsNone(self.cache.get('clave', version=1))
+        self.assertEqual(self.cache.get('clave', version=2), 'v1')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('clave', version=2))
+
+
+# ---------------------------------------------------------------------------
+# Totales diarios
+# ---------------------------------------------------------------------------
+
+class DailyStatsTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer()
+        self.other = make_customer('Otro')
+        self.today = timezone.localdate()
+        for customer in (self.customer, self.customer, self.other):
+            order = make_order(customer)
+            order.payment_status = 'PAID'
+            order.save()
+        Sale.objects.create(customer=self.customer, total_amount=Decimal('6.00'))
+        Expense.objects.create(description='Detergente', amount=Decimal('4.00'), category='INSUMOS', expense_date=self.today)
+
+    def assertTotals(self, orders, sales, expenses):
+        self.assertEqual(rollup_summary(ORDER, self.today, self.today), {'count': orders[0], 'total': Decimal(orders[1])})
+        self.assertEqual(rollup_total(SALE, self.today, self.today), Decimal(sales))
+        self.assertEqual(rollup_total(EXPENSE, self.today, self.today), Decimal(expenses))
+        self.assertEqual(stale_daily_stats(), [])
+
+    def test_saves_keep_totals_in_sync(self):
+        self.assertTotals((3, '30.00'), '6.00', '4.00')
+        order = Order.objects.filter(customer=self.customer).first()
+        order.status = 'CANCELLED'
+        order.save()
+        self.assertTotals((2, '20.00'), '6.00', '4.00')
+
+    def test_deleting_a_customer_discounts_its_orders(self):
+        self.customer.delete()
+
+        self.assertTotals((1, '10.00'), '6.00', '4.00')
+        self.assertFalse(CustomerStats.objects.filter(customer_id=self.customer.pk).exists())
+        self.assertEqual(stale_customer_stats(), [])
+        self.assertIsNone(Sale.objects.get().customer)
+        self.assertEqual(
+            [hit['id'] for hit in search.search('Cliente Prueba', kinds=[search.ORDER, search.CUSTOMER], limit=10)], [],
+        )
+
+    def test_queryset_deletes_discount_every_row(self):
+        Order.objects.filter(customer=self.customer).delete()
+        self.assertTotals((1, '10.00'), '6.00', '4.00')
+        self.assertEqual(self.customer.stats.order_count, 0)
+        self.assertEqual(stale_customer_stats(), [])
+
+        Sale.objects.all().delete()
+        Expense.objects.all().delete()
+        self.assertTotals((1, '10.00'), '0.00', '0.00')
+
+    def test_queryset_delete_of_customers(self):
+        Customer.objects.filter(pk=self.customer.pk).delete()
+        self.assertTotals((1, '10.00'), '6.00', '4.00')
+        self.assertEqual(stale_customer_stats(), [])
+
+    def test_admin_delete_selected(self):
+        admin_user = User.objects.create_superuser('admin', password='clave-de-prueba')
+        self.client.force_login(admin_user)
+        ids = list(Order.objects.filter(customer=self.customer).values_list('pk', flat=True))
+        response = self.client.post(
+            reverse('admin:core_order_changelist'),
+            {'action': 'delete_selected', '_selected_action': ids, 'post': 'yes'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTotals((1, '10.00'), '6.00', '4.00')
+
+        response = self.client.post(
+            reverse('admin:core_customer_delete', args=[self.other.pk]), {'post': 'yes'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTotals((0, '0.00'), '6.00', '4.00')
+        self.assertFalse(DailyStats.objects.filter(source=ORDER, count__gt=0).exists())
+
+
+# ---------------------------------------------------------------------------
+# Configuración tipada cacheada por proceso
+# ---------------------------------------------------------------------------
+
+class AppSettingsTests(BaseTestCase):
+    def test_values_are_typed_with_defaults(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            AppConfiguration.objects.create(key='business_name', value='Lavandería Sol')
+            AppConfiguration.objects.create(key='default_price_per_kg', value='no es número')
+        settings = app_settings()
+        self.assertEqual(settings.business_name, 'Lavandería Sol')
+        self.assertEqual(settings.price_per_kg, Decimal('5.00'))
+
+    def test_cached_until_a_save_bumps_the_version(self):
+        app_settings()
+        with self.assertNumQueries(0):
+            self.assertEqual(app_settings().price_per_kg, Decimal('5.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AppConfiguration.objects.create(key='default_price_per_kg', value=' 6.50 ')
+        with self.assertNumQueries(1):
+            self.assertEqual(app_settings().price_per_kg, Decimal('6.50'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AppConfiguration.objects.get(key='default_price_per_kg').delete()
+        self.assertEqual(app_settings().price_per_kg, Decimal('5.00'))
+
+    def test_lost_version_key_forces_a_reload(self):
+        app_settings()
+        AppConfiguration.objects.bulk_create([AppConfiguration(key='business_phone', value='999')])
+        self.assertEqual(app_settings().business_phone, '')  # Sin guardar con save(), no se entera.
+        cache.delete(VERSION_KEY)
+        self.assertEqual(app_settings().business_phone, '999')
+
+
+# ---------------------------------------------------------------------------
+# Paginación por cursor
+# ---------------------------------------------------------------------------
+
+class KeysetPaginationTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        customer = make_customer()
+        orders = [make_order(customer) for _ in range(25)]
+        # Empates en created_at: el pk desempata.
+        for i, order in enumerate(orders):
+            Order.objects.filter(pk=order.pk).update(created_at=local_moment(2026, 3, 1 + i // 4, 10, 0))
+        self.expected = list(Order.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def pages(self, paginator):
+        page = paginator.page()
+        pages = [page]
+        while page.has_next:
+            page = paginator.page(page.next_token)
+            pages.append(page)
+        return pages
+
+    def test_forward_pages_cover_every_row_once(self):
+        pages = self.pages(KeysetPaginator(Order.objects.all(), 10))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([order.pk for page in pages for order in page], self.expected)
+        self.assertEqual([page.number for page in pages], [1, 2, 3])
+
+    def test_previous_token_returns_the_same_page(self):
+        paginator = KeysetPaginator(Order.objects.all(), 10)
+        _, second, third = self.pages(paginator)
+        back = paginator.page(third.previous_token)
+        self.assertEqual([o.pk for o in back], [o.pk for o in second])
+        self.assertTrue(back.has_previous)
+        self.assertEqual(second.previous_token, '')  # La primera página se pide sin token.
+
+    def test_invalid_token_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Order.objects.all(), 10)
+        token = paginator.page().next_token
+        for bad in (token[:-2] + 'xx', 'basura'):
+            page = paginator.page(bad)
+            self.assertEqual((page.number, page[0].pk), (1, self.expected[0]))
+
+    def test_totals(self):
+        self.assertIsNone(KeysetPaginator(Order.objects.all(), 10).total)
+        self.assertEqual(KeysetPaginator(Order.objects.all(), 10, count=EXACT).total, 25)
+        bounded = KeysetPaginator(Order.objects.all(), 10, count=BOUNDED, count_limit=20)
+        self.assertEqual((bounded.total, bounded.total_is_approximate), (20, True))
+
+    def test_customers_report_pages_through_tied_fractional_totals(self):
+        # 0.10 + 0.20 en SQLite es REAL (0.30000000000000004): el cursor no
+        # puede compararse con el decimal leído.
+        for i in range(20):
+            CustomerStats.objects.update_or_create(
+                customer=make_customer(f'Empate {i:02d}'),
+                defaults={'lifetime_spent': Decimal('0.10'), 'sales_total': Decimal('0.20')},
+            )
+        self.client.force_login(make_user())
+        url = reverse('customers_report')
+        contexts = []
+
+        def render(request, template, context):
+            contexts.append(context)
+            return HttpResponse()
+
+        seen, token = [], None
+        while True:
+            with mock.patch.object(views, 'render', render):
+                self.client.get(url, {'page': token} if token else {})
+            page = contexts[-1]['customers']
+            seen += [customer.name for customer in page]
+            if not page.has_next:
+                break
+            token = page.next_token
+        self.assertEqual(seen[-20:], [f'Empate {i:02d}' for i in range(20)])
+        self.assertEqual(len(seen), len(set(seen)))
+
+
+# ---------------------------------------------------------------------------
+# Reportes de pedidos e ingresos por tandas
+# ---------------------------------------------------------------------------
+
+class ReportBatchTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(make_user())
+        self.customer = make_customer()
+        for i in range(55):
+            order = make_order(self.customer)
+            if i % 2:
+                order.payment_status = 'PAID'
+            if i == 0:
+                order.status = 'CANCELLED'
+            order.save()
+
+    def test_orders_report_totals_and_first_batch(self):
+        response = self.client.get(reverse('orders_report'))
+        self.assertEqual(response.context['total_orders'], 55)
+        self.assertEqual(response.context['total_amount'], Decimal('540.00'))
+        self.assertEqual(len(response.context['orders']), 50)
+
+        by_customer = self.client.get(reverse('orders_report'), {'customer': self.customer.pk})
+        self.assertEqual(
+            (by_customer.context['total_orders'], by_customer.context['total_amount']), (55, Decimal('540.00')),
+        )
+
+    def test_income_report_totals(self):
+        response = self.client.get(reverse('income_report'))
+        self.assertEqual(response.context['total_income'], Decimal('270.00'))
+        self.assertEqual(len(response.context['orders']), 27)
+
+    def test_report_rows_returns_the_next_batch(self):
+        first = self.client.get(reverse('orders_report')).context['orders']
+        data = self.client.get(reverse('report_rows', args=['orders']), {'after': first.next_token}).json()
+        self.assertEqual(data['next'], '')
+        self.assertEqual(data['html'].count('<tr'), 5)
+        self.assertEqual(self.client.get(reverse('report_rows', args=['otro'])).status_code, 404)
+
+
+# ---------------------------------------------------------------------------
+# Exportaciones CSV en streaming
+# ---------------------------------------------------------------------------
+
+class CsvExportTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(make_user())
+        customer = make_customer()
+        for day in (3, 1, 2):
+            order = make_order(customer)
+            order.payment_status = 'PAID'
+            order.save()
+            Order.objects.filter(pk=order.pk).update(created_at=local_moment(2026, 4, day, 12, 0))
+        sale = Sale.objects.create(customer=None, total_amount=Decimal('6.00'))
+        Sale.objects.filter(pk=sale.pk).update(created_at=local_moment(2026, 4, 2, 8, 0))
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        text = b''.join(chunks).decode('utf-8')
+        self.assertTrue(text.startswith('\ufeff'))
+        return chunks, list(csv.reader(text[1:].splitlines()))
+
+    def test_income_rows_are_merged_by_date(self):
+        _, rows = self.read(self.client.get(reverse('export_report_csv', args=['income'])))
+        self.assertEqual(rows[0], ['Fecha', 'Tipo', 'Cliente', 'Monto'])
+        self.assertEqual([row[:2] for row in rows[1:]], [
+            ['01/04/2026', 'Pedido'], ['02/04/2026', 'Venta'], ['02/04/2026', 'Pedido'], ['03/04/2026', 'Pedido'],
+        ])
+        self.assertEqual(rows[2][2], 'Mostrador')
+
+    def test_rows_are_sent_in_chunks(self):
+        with mock.patch.object(exports, 'CHUNK_SIZE', 2):
+            chunks, rows = self.read(self.client.get(reverse('export_report_csv', args=['orders'])))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(len(chunks), 2)
+
+    def test_unknown_report_is_404(self):
+        self.assertEqual(self.client.get(reverse('export_report_csv', args=['otro'])).status_code, 404)
+
+
+# ---------------------------------------------------------------------------
+# Libro de movimientos en una sola consulta
+# ---------------------------------------------------------------------------
+
+class LedgerTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        customer = make_customer()
+        self.order = make_order(customer)
+        Order.objects.filter(pk=self.order.pk).update(created_at=local_moment(2026, 5, 1, 9, 0))
+        cancelled = make_order(customer)
+        cancelled.status = 'CANCELLED'
+        cancelled.save()
+        self.sale = Sale.objects.create(total_amount=Decimal('8.00'))
+        Sale.objects.filter(pk=self.sale.pk).update(created_at=local_moment(2026, 5, 2, 9, 0))
+        product = Product.objects.create(name='Jabón', price=Decimal('4.00'), stock=5)
+        SaleItem.objects.create(sale=self.sale, product=product, quantity=2, unit_price=product.price)
+        Expense.objects.create(description='Luz', amount=Decimal('3.00'), category='SERVICIOS', expense_date=date(2026, 5, 2))
+        rebuild_daily_stats()  # Las fechas se movieron con update().
+
+    def test_union_is_ordered_and_described(self):
+        rows = ledger.with_sale_items(ledger.ledger('2026-05-01', '2026-05-02'))
+        self.assertEqual([(row['date'], row['kind'], row['amount']) for row in rows], [
+            (date(2026, 5, 2), SALE, Decimal('8.00')),
+            (date(2026, 5, 2), EXPENSE, Decimal('3.00')),
+            (date(2026, 5, 1), ORDER, Decimal('10.00')),
+        ])
+        self.assertEqual(rows[0]['description'], f'Venta #{self.sale.pk}: 2 x Jabón')
+        self.assertEqual(rows[1]['description'], 'Luz (Servicios Públicos (Agua, Luz, Internet))')
+        self.assertTrue(rows[1]['is_expense'])
+        self.assertEqual(rows[2]['description'], f'Pedido #{self.order.order_code} - Cliente: Cliente Prueba')
+
+    def test_filters_and_count_agree(self):
+        for transaction_type, expected in ((ledger.INCOME, 2), (EXPENSE, 1), (None, 3)):
+            queryset = ledger.ledger('2026-05-01', '2026-05-02', transaction_type=transaction_type)
+            self.assertEqual(len(list(queryset)), expected)
+            self.assertEqual(ledger.ledger_count('2026-05-01', '2026-05-02', transaction_type=transaction_type), expected)
+        self.assertEqual(ledger.ledger_count('2026-05-01', '2026-05-02', 'INSUMOS', EXPENSE), 0)
+
+    def test_iter_ledger_walks_every_chunk(self):
+        rows = list(ledger.iter_ledger(ledger.ledger('2026-05-01', '2026-05-02'), chunk_size=2))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['description'], f'Venta #{self.sale.pk}: 2 x Jabón')
+
+
+# ---------------------------------------------------------------------------
+# PDF de reportes en segundo plano
+# ---------------------------------------------------------------------------
+
+@override_settings(JOBS_EAGER=False)
+class ReportExportTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.client.force_login(make_user())
+        make_order(make_customer())
+
+    def request(self, refresh=False):
+        return report_exports.request_export('orders', ReportFilterForm({}), refresh=refresh)
+
+    def build_jobs(self):
+        return Job.objects.filter(name='build_report_pdf', status=Job.PENDING).count()
+
+    def test_pdf_is_built_once_and_reused(self):
+        export = self.request()
+        self.assertEqual(export.status, ReportExport.PENDING)
+        self.assertEqual(jobs.run_pending(), 1)
+        export.refresh_from_db()
+        self.assertEqual((export.status, export.progress), (ReportExport.DONE, 100))
+        with export.file.open('rb') as pdf:
+            self.assertEqual(pdf.read(4), b'%PDF')
+
+        self.assertEqual(self.request().pk, export.pk)
+        self.assertEqual(self.build_jobs(), 0)
+
+    def test_data_change_replaces_the_previous_pdf(self):
+        old = self.request()
+        jobs.run_pending()
+        old.refresh_from_db()
+        old_path = old.file.name
+
+        make_order(make_customer('Otro Cliente'))
+        new = self.request()
+        self.assertNotEqual(new.key, old.key)
+        jobs.run_pending()  # Genera el nuevo y encola el borrado del anterior.
+        jobs.run_pending()
+        self.assertEqual(list(ReportExport.objects.values_list('pk', flat=True)), [new.pk])
+        self.assertFalse(default_storage.exists(old_path))
+
+    def test_failed_export_is_retried_by_a_single_request(self):
+        export = self.request()
+        with mock.patch.object(report_exports, 'build_report_pdf', side_effect=RuntimeError('sin papel')):
+            with self.assertLogs('core.jobs', 'ERROR'):
+                jobs.run_pending()
+        export.refresh_from_db()
+        self.assertEqual(export.status, ReportExport.FAILED)
+        self.assertIn('sin papel', export.error)
+
+        self.request()
+        self.request()
+        self.assertEqual(self.build_jobs(), 1)
+
+    def test_refresh_rebuilds_a_finished_pdf(self):
+        self.request()
+        jobs.run_pending()
+        self.assertEqual(self.request(refresh=True).status, ReportExport.PENDING)
+        self.assertEqual(self.build_jobs(), 1)
+
+    def test_views_wait_then_serve_the_file(self):
+        url = reverse('export_report_pdf', args=['orders'])
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, 'core/reports/report_export_status.html')
+        export = ReportExport.objects.get()
+        status_url = reverse('report_export_status', args=[export.key])
+        self.assertEqual(self.client.get(status_url).json()['status'], ReportExport.PENDING)
+        self.assertEqual(self.client.get(reverse('report_export_file', args=[export.key])).status_code, 404)
+
+        jobs.run_pending()
+        data = self.client.get(status_url).json()
+        self.assertEqual(data['url'], reverse('report_export_file', args=[export.key]))
+        for response in (self.client.get(url), self.client.get(data['url'])):
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            self.assertEqual(b''.join(response.streaming_content)[:4], b'%PDF')
+
+    def test_unknown_report_is_404(self):
+        self.assertEqual(self.client.get(reverse('export_report_pdf', args=['otro'])).status_code, 404)
+        with self.assertRaises(ValueError):
+            report_exports.request_export('otro', ReportFilterForm({}))
+
+
+# ---------------------------------------------------------------------------
+# Estilos compartidos y tabla rápida de los PDF
+# ---------------------------------------------------------------------------
+
+def pdf_pages(data):
+    return len(re.findall(rb'/Type /Page\b', data))
+
+
+def render_pdf(*elements):
+    output = BytesIO()
+    pdf.document(output).build(list(elements))
+    return output.getvalue()
+
+
+class PdfTableTests(BaseTestCase):
+    columns = [pdf.Column('Código', 60), pdf.Column('Cliente', 120, pdf.LEFT), pdf.Column('Monto', 60, pdf.RIGHT, True)]
+
+    def test_styles_are_built_once(self):
+        for name in ('ReportTitle', 'Cell', 'CellLeft', 'KpiValue', 'ReceiptCompany', 'ReceiptGrandTotal'):
+            self.assertIn(name, pdf.STYLES)
+        with mock.patch.object(pdf, 'getSampleStyleSheet') as sample:
+            render_pdf(pdf.FastTable(self.columns, [['A1', 'Ana', '5.00']]))
+        sample.assert_not_called()
+
+    def test_only_wrapping_cells_become_paragraphs(self):
+        table = pdf.FastTable(self.columns, [['A1', None, '5.00'], ['A2', 'Nombre muy largo ' * 5, '5.00']])
+        (short, short_height), (long, long_height) = table._rows
+        self.assertEqual(short, ['A1', '', '5.00'])
+        self.assertIsInstance(long[1], Paragraph)
+        self.assertEqual(long[0], 'A2')
+        self.assertGreater(long_height, short_height)
+        self.assertEqual(table.height, table.header_height + short_height + long_height)
+
+    def test_split_keeps_every_row(self):
+        table = pdf.FastTable(self.columns, [[str(i), 'Ana', '1.00'] for i in range(10)])
+        self.assertEqual(table.split(table.width, table.height), [table])
+        self.assertEqual(table.split(table.width, table.header_height + 1), [])
+        first, rest = table.split(table.width, table.header_height + 3 * table.row_height)
+        self.assertEqual((len(first._rows), len(rest._rows)), (3, 7))
+        self.assertEqual(rest._rows[0][0][0], '3')
+
+    def test_long_table_spans_pages(self):
+        data = render_pdf(pdf.FastTable(self.columns, [[str(i), 'Ana', '1.00'] for i in range(200)]))
+        self.assertGreater(pdf_pages(data), 1)
+
+    def test_order_receipt_uses_shared_styles(self):
+        self.client.force_login(make_user())
+        order = make_order(make_customer())
+        response = self.client.get(reverse('download_order_pdf', args=[order.pk]))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(pdf_pages(response.content), 1)
+
+
+# ---------------------------------------------------------------------------
+# Filas de los PDF leídas por página y con tope
+# ---------------------------------------------------------------------------
+
+class StreamedPdfTests(BaseTestCase):
+    columns = PdfTableTests.columns
+
+    def rows(self, count):
+        self.read = 0
+        self.closed = False
+        try:
+            for i in range(count):
+                self.read += 1
+                yield [str(i), 'Ana', '1.00']
+        finally:
+            self.closed = True
+
+    def test_rows_are_read_one_page_at_a_time(self):
+        table = pdf.StreamedTable(self.columns, self.rows(1000))
+        page, rest = table.split(table.width, table.header_height + 10 * table.row_height)
+        self.assertIs(rest, table)
+        self.assertEqual(len(page._rows), 10)
+        self.assertEqual(self.read, 11)  # La fila que no entró queda para la página siguiente.
+        page, _ = table.split(table.width, table.header_height + 10 * table.row_height)
+        self.assertEqual(page._rows[0][0][0], '10')
+
+    def test_whole_report_is_drawn(self):
+        table = pdf.StreamedTable(self.columns, self.rows(300))
+        self.assertGreater(pdf_pages(render_pdf(table)), 1)
+        self.assertEqual((table.drawn_rows, table.truncated), (300, False))
+
+    def test_max_rows_cuts_the_table_and_adds_the_notice(self):
+        notice = Paragraph('Hay más filas', pdf.STYLES['ReportNormal'])
+        table = pdf.StreamedTable(self.columns, self.rows(50), max_rows=20, overflow=notice)
+        last, overflow = table.split(table.width, 10 ** 4)
+        self.assertEqual(len(last._rows), 20)
+        self.assertIs(overflow, notice)
+        self.assertTrue(table.truncated)
+        self.assertTrue(self.closed)
+        self.assertEqual(self.read, 21)
+
+    @override_settings(REPORT_PDF_MAX_ROWS=2)
+    def test_report_pdf_respects_the_row_cap(self):
+        customer = make_customer()
+        for _ in range(3):
+            make_order(customer)
+        tables, progress = [], []
+        detail_table = report_pdf._detail_table
+
+        def record(*args):
+            tables.append(detail_table(*args))
+            return tables[-1]
+
+        output = BytesIO()
+        with mock.patch.object(report_pdf, '_detail_table', record):
+            report_pdf.build_report_pdf('orders', {}, output, progress=progress.append)
+        self.assertEqual(output.getvalue()[:4], b'%PDF')
+        self.assertEqual(progress[-1], 100)
+        self.assertEqual((tables[0].drawn_rows, tables[0].truncated), (2, True))
+
+
+# ---------------------------------------------------------------------------
+# Índice de búsqueda FTS5 y omnibox
+# ---------------------------------------------------------------------------
+
+class SearchIndexTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer('José Pérez', phone='987 654 321')
+        self.order = make_order(self.customer, notes='camisa azul')
+        self.product = Product.objects.create(name='Jabón Líquido', price=Decimal('4.50'), stock=3)
+        self.sale = Sale.objects.create(customer=self.customer, total_amount=Decimal('4.50'))
+
+    def ids(self, query, kinds=search.KINDS, **kwargs):
+        return [(hit['type'], hit['id']) for hit in search.search(query, kinds=kinds, **kwargs)]
+
+    def test_search_ignores_case_and_accents(self):
+        self.assertEqual(self.ids('jose perez', kinds=[search.CUSTOMER]), [(search.CUSTOMER, self.customer.pk)])
+        self.assertEqual(self.ids('JABON'), [(search.PRODUCT, self.product.pk)])
+        self.assertEqual(self.ids('azul'), [(search.ORDER, self.order.pk)])
+        self.assertEqual(self.ids('zzz'), [])
+        self.assertEqual(self.ids('   '), [])
+
+    def test_short_terms_and_fragments(self):
+        self.assertIn((search.CUSTOMER, self.customer.pk), self.ids('pé'))
+        self.assertEqual(self.ids(self.order.order_code[1:5], kinds=[search.ORDER]), [(search.ORDER, self.order.pk)])
+
+    def test_number_brings_order_and_sale_with_that_id_first(self):
+        self.assertEqual(self.ids(str(self.order.pk), kinds=[search.ORDER])[0], (search.ORDER, self.order.pk))
+        hit = search.search(f'#{self.sale.pk}', kinds=[search.SALE])[0]
+        self.assertEqual((hit['type'], hit['id']), (search.SALE, self.sale.pk))
+        self.assertEqual(hit['url'], reverse('print_sale_ticket', args=[self.sale.pk]))
+
+    def test_filter_q_limits_querysets(self):
+        other = make_customer('Ana Torres')
+        self.assertEqual(list(Customer.objects.filter(search.filter_q(search.CUSTOMER, 'torres'))), [other])
+        self.assertEqual(Customer.objects.filter(search.filter_q(search.CUSTOMER, '')).count(), 2)
+
+    def test_edits_and_deletes_update_the_index(self):
+        self.product.name = 'Suavizante'
+        self.product.save()
+        self.assertEqual(self.ids('jabon'), [])
+        self.product.delete()
+        self.assertEqual(self.ids('suavizante'), [])
+
+        self.customer.delete()  # Borra sus pedidos y deja la venta sin cliente.
+        self.assertEqual(self.ids('azul'), [])
+        self.assertEqual(self.ids('jose'), [])
+        self.assertEqual(search.search('mostrador', kinds=[search.SALE])[0]['id'], self.sale.pk)
+
+    def test_rebuild_command_reconciles_bulk_updates(self):
+        Customer.objects.filter(pk=self.customer.pk).update(name='Rosa Díaz')
+        self.assertEqual(self.ids('rosa'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.ids('rosa', kinds=[search.CUSTOMER]), [(search.CUSTOMER, self.customer.pk)])
+
+    def test_omnibox_endpoint(self):
+        self.client.force_login(make_user())
+        response = self.client.get(reverse('omnibox'), {'q': 'jose', 'type': ['customer', 'otro']})
+        self.assertEqual([hit['id'] for hit in response.json()['results']], [self.customer.pk])
+        self.assertEqual(response.json()['results'][0]['url'],
+                         reverse('manage_customer_orders', args=[self.customer.customer_code]))
+
+
+# ---------------------------------------------------------------------------
+# Selector de clientes por AJAX
+# ---------------------------------------------------------------------------
+
+@mock.patch.object(views, 'CUSTOMER_PICKER_PAGE_SIZE', 2)
+class CustomerPickerTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(make_user())
+        self.customers = [make_customer(f'Cliente {name}') for name in ('Uno', 'Dos', 'Tres')]
+
+    def pick(self, term, page=1):
+        return self.client.get(reverse('search_customers'), {'term': term, 'page': page}).json()
+
+    def test_results_are_paginated(self):
+        first, second = self.pick('cliente'), self.pick('cliente', page=2)
+        self.assertEqual((len(first['results']), first['pagination']['more']), (2, True))
+        self.assertEqual((len(second['results']), second['pagination']['more']), (1, False))
+        ids = {result['id'] for result in first['results'] + second['results']}
+        self.assertEqual(ids, {customer.pk for customer in self.customers})
+        result = second['results'][0]
+        self.assertEqual(result['text'], f"{result['name']} (ID: {result['code']})")
+        self.assertEqual(self.pick('cliente', page='x'), first)
+
+    def test_answers_are_cached_until_a_customer_changes(self):
+        self.pick('cliente')
+        with CaptureQueriesContext(connection) as queries:
+            self.pick('cliente')
+        self.assertFalse([q for q in queries if 'core_search' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customers[0].name = 'Otro Nombre'
+            self.customers[0].save()
+        self.assertEqual(len(self.pick('cliente', page=2)['results']), 0)
+        self.assertEqual(self.pick('otro')['results'][0]['id'], self.customers[0].pk)
+
+    def test_select_renders_only_the_chosen_customer(self):
+        chosen = self.customers[1]
+        form = ReportFilterForm({'customer': chosen.pk})
+        with self.assertNumQueries(1):
+            html = str(form['customer'])
+        self.assertEqual(html.count('<option'), 2)
+        self.assertIn(f'value="{chosen.pk}" selected', html)
+        self.assertIn(reverse('search_customers'), html)
+        self.assertEqual(str(ReportFilterForm()['customer']).count('<option'), 1)
+
+
+# ---------------------------------------------------------------------------
+# Lectura de la pistola de códigos
+# ---------------------------------------------------------------------------
+
+class ScanLookupTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer()
+        self.order = make_order(self.customer, barcode='LAV-00042')
+
+    def test_candidates_by_shape(self):
+        self.assertEqual(lookup.candidates(''), [])
+        self.assertEqual(lookup.candidates('#12'), [(lookup.ORDER, 'pk', '12')])
+        self.assertEqual(lookup.candidates('1234')[:2], [
+            (lookup.CUSTOMER, 'customer_code', '1234'), (lookup.ORDER, 'pk', '1234'),
+        ])
+        self.assertEqual(lookup.candidates('12345')[:2], [
+            (lookup.ORDER, 'pk', '12345'), (lookup.CUSTOMER, 'customer_code', '12345'),
+        ])
+        self.assertEqual(lookup.candidates('abc123')[0], (lookup.ORDER, 'order_code', 'ABC123'))
+        self.assertEqual(lookup.candidates('aBcD1234')[0], (lookup.ORDER, 'short_id', 'aBcD1234'))
+        self.assertEqual(lookup.candidates('LAV-00042'), [(lookup.ORDER, 'barcode', 'LAV-00042')])
+        url = 'http://testserver' + reverse('order_status', args=[self.order.short_id])
+        self.assertEqual(lookup.candidates(url), [(lookup.ORDER, 'short_id', self.order.short_id)])
+        self.assertEqual(lookup.candidates('/ruta/que/no/existe/')[-1], (lookup.ORDER, 'barcode', '/ruta/que/no/existe/'))
+
+    def test_each_identifier_resolves_with_one_query(self):
+        edit_url = reverse('edit_order', args=[self.order.pk])
+        for text in (self.order.order_code.lower(), self.order.short_id, 'LAV-00042', f'#{self.order.pk}'):
+            with self.assertNumQueries(1):
+                self.assertEqual(lookup.lookup(text)['url'], edit_url)
+        found = lookup.lookup(self.customer.customer_code)
+        self.assertEqual((found['type'], found['id']), (lookup.CUSTOMER, self.customer.pk))
+        self.assertEqual(found['url'], reverse('manage_customer_orders', args=[self.customer.customer_code]))
+        self.assertIsNone(lookup.lookup('NO-EXISTE'))
+
+    def test_digits_fall_back_to_the_other_meaning(self):
+        Customer.objects.filter(pk=self.customer.pk).update(customer_code='87654321')
+        with self.assertNumQueries(2):
+            self.assertEqual(lookup.lookup(str(self.order.pk).zfill(4))['type'], lookup.ORDER)
+        with self.assertNumQueries(2):
+            self.assertEqual(lookup.lookup('87654321')['type'], lookup.CUSTOMER)
+
+    def test_scan_view(self):
+        self.client.force_login(make_user())
+        url = reverse('scan_lookup')
+        self.assertRedirects(self.client.get(url, {'q': self.order.short_id}),
+                             reverse('edit_order', args=[self.order.pk]), fetch_redirect_response=False)
+        response = self.client.get(url, {'q': 'LAV-00042', 'format': 'json'})
+        self.assertEqual(response.json()['result']['id'], self.order.pk)
+        response = self.client.get(url, {'q': 'NO-EXISTE'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 404)
+        # Texto libre: el primer resultado de la búsqueda; sin resultados, al dashboard.
+        self.assertRedirects(self.client.get(url, {'q': 'prueba'}),
+                             reverse('manage_customer_orders', args=[self.customer.customer_code]),
+                             fetch_redirect_response=False)
+        self.assertRedirects(self.client.get(url, {'q': 'zzzz'}), reverse('dashboard'), fetch_redirect_response=False)
+
+
+# ---------------------------------------------------------------------------
+# Teléfonos normalizados a E.164
+# ---------------------------------------------------------------------------
+
+class PhoneTests(BaseTestCase):
+    def test_normalize_phone(self):
+        for raw in ('987654321', '987 654 321', '+51 987-654-321', '0051987654321', '51987654321', '(0) 987654321'):
+            self.assertEqual(normalize_phone(raw), '+51987654321', raw)
+        self.assertEqual(normalize_phone('+1 (555) 010-9999'), '+15550109999')
+        for raw in (None, '', 'sin teléfono', '12345', '+1234567890123456'):
+            self.assertIsNone(normalize_phone(raw), raw)
+
+    @override_settings(PHONE_COUNTRY_CODE='57')
+    def test_country_code_comes_from_settings(self):
+        self.assertEqual(normalize_phone('3001234567'), '+573001234567')
+
+    def test_looks_like_phone_and_whatsapp(self):
+        self.assertTrue(looks_like_phone('+51 987-654-321'))
+        self.assertFalse(looks_like_phone('Pedido 987'))
+        self.assertFalse(looks_like_phone('12345'))
+        self.assertEqual(whatsapp_url('+51987654321', 'Hola José'), 'https://wa.me/51987654321?text=Hola%20Jos%C3%A9')
+        self.assertEqual(whatsapp_url(None), '')
+
+    def test_save_keeps_the_normalized_phone(self):
+        customer = make_customer(phone='987 654 321')
+        self.assertEqual(customer.phone_e164, '+51987654321')
+        customer.phone = 'no tiene'
+        customer.save(update_fields=['phone'])
+        customer.refresh_from_db()
+        self.assertIsNone(customer.phone_e164)
+
+    def test_form_rejects_a_phone_already_registered(self):
+        owner = make_customer('Ana', phone='987654321')
+        form = CustomerForm({'name': 'Otra', 'phone': '+51 987 654 321', 'email': ''})
+        self.assertFalse(form.is_valid())
+        self.assertIn('Ana', form.errors['phone'][0])
+        # Guardar al mismo cliente con su teléfono escrito de otra forma es válido.
+        self.assertTrue(CustomerForm({'name': 'Ana', 'phone': '0051987654321', 'email': ''}, instance=owner).is_valid())
+
+    def test_phone_is_found_however_it_is_written(self):
+        customer = make_customer('Ana', phone='987-654-321')
+        make_customer('Beto', phone='912345678')
+        for query in ('987654321', '+51 987 654 321', '51987654321'):
+            hits = [(hit['type'], hit['id']) for hit in search.search(query, kinds=[search.CUSTOMER])]
+            self.assertEqual(hits, [(search.CUSTOMER, customer.pk)], query)
+        self.assertEqual(lookup.lookup('+51 987 654 321')['id'], customer.pk)
+        self.assertEqual(
+            list(Customer.objects.filter(search.filter_q(search.CUSTOMER, '987 654 321'))), [customer],
+        )
@@ -12,6 +12,7 @@ urlpatterns = [
     path('order/register_payment/<int:order_id>/', views.register_payment, name='register_payment'),
     #path('order_status/<int:order_id>/', views.order_status, name='order_status'),
     path('o/<str:short_id>/', views.order_status, name='order_status'),
+    path('qr/<str:kind>/<str:code>.<str:fmt>', views.qr_image, name='qr_image'),
     path('update_order_status/<int:order_id>/', views.update_order_status, name='update_order_status'),
     path('update_payment_status/<int:order_id>/', views.update_payment_status, name='update_payment_status'),
     path('manage_customer/<str:customer_code>/', views.manage_customer_orders, name='manage_customer_orders'),
@@ -21,6 +22,8 @@ urlpatterns = [
     path('payment_audit/', views.payment_audit, name='payment_audit'),
     path('cancel_order/<int:order_id>/', views.cancel_order, name='cancel_order'),
     path('search_customers/', views.search_customers, name='search_customers'),
+    path('search/', views.omnibox, name='omnibox'),
+    path('scan/', views.scan_lookup, name='scan_lookup'),
     path('accounts/', include('core.auth_urls', namespace='accounts')),
     path('settings/', views.manage_settings, name='manage_settings'),
     path('deliver_order/<int:order_id>/', views.mark_order_as_delivered, name='deliver_order'),
@@ -45,8 +48,11 @@ urlpatterns = [
     path('reports/sales/', views.sales_report, name='sales_report'),
     path('reports/customers/', views.customers_report, name='customers_report'),
     path('reports/export/pdf/<str:report_type>/', views.export_report_pdf, name='export_report_pdf'),
+    path('reports/export/jobs/<str:key>/', views.report_export_status, name='report_export_status'),
+    path('reports/export/jobs/<str:key>/file/', views.report_export_file, name='report_export_file'),
     path('reports/export/csv/<str:report_type>/', views.export_report_csv, name='export_report_csv'),
     path('reports/profitability/', views.profitability_report, name='profitability_report'),
+    path('reports/rows/<str:report_type>/', views.report_rows, name='report_rows'),
 
         # === INICIO DE URLs PARA GASTOS ===
     path('expenses/', views.expense_list, name='expense_list'),
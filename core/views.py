@@ -1,13 +1,14 @@
 # laundry_app/core/views.py
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.forms import formset_factory
-from django.http import HttpResponse, JsonResponse, HttpRequest
+from django.http import FileResponse, HttpResponse, JsonResponse, HttpRequest
 from django.urls import reverse
 
 # Primero, importamos todos los MODELOS desde models.py
-from .models import Customer, Order, Category, OrderCategory, AppConfiguration, Product, Sale, SaleItem, ProductCategory, Expense
+from .models import Customer, CustomerStats, Order, Category, OrderCategory, AppConfiguration, Product, Sale, SaleItem, ProductCategory, Expense, ReportExport
 # Segundo, importamos todos los FORMULARIOS desde forms.py
 from .forms import (
     CustomerForm, OrderForm, CategoryForm, OrderCategoryInlineForm, 
@@ -18,28 +19,44 @@ from .forms import (
 
 from django.contrib import messages
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger # Importa PageNotAnInteger y EmptyPage
-from django.db.models import Q, ProtectedError, Sum, F, ExpressionWrapper, DecimalField, Case, When, Value, BooleanField, Max
-from django.db.models.functions import Coalesce
-from datetime import date, datetime, timedelta # Importa date y datetime
+from django.db.models import Q, ProtectedError, Sum, F, ExpressionWrapper, DecimalField, Case, When, Value, BooleanField, IntegerField
+from django.db.models.functions import Cast, Coalesce, Round
+from datetime import datetime, timedelta
 
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
 from io import BytesIO
 from decimal import Decimal
-import os
+import hashlib
+from django.core.cache import cache
 from django.db import transaction
-import csv
 from django.db.models import Count
 from .forms import ReportFilterForm
 import json
 from django.db import transaction
 from decimal import Decimal
-from urllib.parse import quote
-from itertools import chain
-from operator import attrgetter
+from django.http import Http404
+from django.views.decorators.http import etag
+from .qr import QR_FORMATS, is_valid_target, qr_etag, qr_target_url, render_qr
+from .services import create_order
+from .pricing import calculate_price, order_lines
+from .dates import date_range_q, day_q, day_start
+from .config import app_settings, setting_key
+from .kpis import dashboard_kpis
+from .pagination import BOUNDED, KeysetPaginator
+from .report_exports import request_export
+from .report_pdf import REPORT_TYPES
+from . import search
+from .lookup import lookup
+from .phones import whatsapp_url
+from .pdf import CONTENT_WIDTH, RECEIPT_BORDER, RECEIPT_PRIMARY, RECEIPT_SECONDARY, RECEIPT_TEXT_DARK, STYLES, document
+from .ledger import LedgerPaginator, ledger, ledger_count, with_sale_items
+from .exports import by_date, csv_response, customer_rows, expense_rows, income_rows, ledger_rows, order_rows, sale_item_rows
+from .rollups import EXPENSE, ORDER, SALE, expense_breakdown, rollup_summary, rollup_total
+from django.utils import timezone
 
 
 def home(request):
@@ -58,47 +75,21 @@ def dashboard(request):
     customer_filter_form = CustomerFilterForm(request.GET)
     order_filter_form = OrderFilterForm(request.GET)
 
-    # 2. Lógica de Resumen de Ingresos (OPTIMIZADA)
-    today = date.today()
-    start_of_week = today - timedelta(days=today.weekday())
-    start_of_month = today.replace(day=1)
-
-    # Optimizamos el cálculo de ingresos usando agregaciones de la base de datos.
-    # Esto es mucho más rápido que iterar en Python.
-    income_base_query = Order.objects.filter(payment_status__in=['PAID', 'PARTIAL']
-    ).exclude(status='CANCELLED')
-    daily_income = income_base_query.filter(created_at__date=today).aggregate(
-        total=Coalesce(Sum(F('original_calculated_price') - F('discount_amount')), Decimal('0.0'), output_field=DecimalField())
-    )['total']
-
-    weekly_income = income_base_query.filter(created_at__date__gte=start_of_week).aggregate(
-        total=Coalesce(Sum(F('original_calculated_price') - F('discount_amount')), Decimal('0.0'), output_field=DecimalField())
-    )['total']
-
-    monthly_income = income_base_query.filter(created_at__date__gte=start_of_month).aggregate(
-        total=Coalesce(Sum(F('original_calculated_price') - F('discount_amount')), Decimal('0.0'), output_field=DecimalField())
-    )['total']
-
-    # 3. Contadores Rápidos de Órdenes por Estado (Corregido)
-    orders_processing_count = Order.objects.filter(status='PROCESSING').count()
-    # Corregido: 'COMPLETED' no existe, el estado correcto es 'READY' según tu modelo.
-    orders_ready_count = Order.objects.filter(status='READY').count()
-    orders_payment_pending_count = Order.objects.filter(payment_status__in=['PENDING', 'PARTIAL']).count()
-    orders_total_count = Order.objects.count()
+    # 2 y 3. Tarjetas de ingresos, deuda y contadores por estado: una sola
+    # consulta con agregaciones condicionales (ver core/kpis.py). El total
+    # histórico de pedidos se estima para no contar toda la tabla.
+    today = timezone.localdate()
+    kpis = dashboard_kpis(today, approximate_total=True)
 
     # 4. Lógica de Clientes (Búsqueda y Paginación) - Sin cambios, funciona bien
     customer_list = Customer.objects.all().order_by('name')
     if customer_filter_form.is_valid():
         search_query = customer_filter_form.cleaned_data.get('search_query')
         if search_query:
-            customer_list = customer_list.filter(
-                Q(name__icontains=search_query) |
-                Q(customer_code__icontains=search_query) |
-                Q(phone__icontains=search_query)
-            )
+            customer_list = customer_list.filter(search.filter_q(search.CUSTOMER, search_query))
     
-    total_customers = customer_list.count()
     paginator_customers = Paginator(customer_list, 10)
+    total_customers = paginator_customers.count  # el paginador reutiliza este conteo
     page_customers = request.GET.get('page_customers')
     try:
         customers_page = paginator_customers.page(page_customers)
@@ -109,19 +100,16 @@ def dashboard(request):
         
     # --- INICIO DE NUEVA IMPLEMENTACIÓN ---
     # 5. Top 5 Clientes por Gasto Total (CORREGIDO)
-    top_customers = Customer.objects.annotate(
-        total_spent=Coalesce(Sum(
-            (F('order__original_calculated_price') - F('order__discount_amount')),
-            # --- CORRECCIÓN APLICADA AQUÍ ---
-            filter=~Q(order__status='CANCELLED')
-        ), Decimal('0.0'), output_field=DecimalField())
-    ).order_by('-total_spent')[:5]
+    # Sale del resumen precalculado (CustomerStats), ordenado por su índice.
+    top_customers = Customer.objects.filter(stats__isnull=False).annotate(
+        total_spent=F('stats__lifetime_spent')
+    ).order_by('-stats__lifetime_spent')[:5]
 
     # 6. Pedidos que Requieren Atención (en proceso por más de 3 días)
-    attention_threshold_date = date.today() - timedelta(days=3)
+    attention_threshold_date = today - timedelta(days=3)
     attention_orders = Order.objects.filter(
+        date_range_q(date_to=attention_threshold_date),
         status='PROCESSING',
-        created_at__date__lte=attention_threshold_date
     ).order_by('created_at')
     # --- FIN DE NUEVA IMPLEMENTACIÓN ---
 
@@ -139,32 +127,28 @@ def dashboard(request):
         if payment_status:
             order_list = order_list.filter(payment_status=payment_status)
         if date_from:
-            order_list = order_list.filter(created_at__date__gte=date_from)
+            order_list = order_list.filter(date_range_q(date_from=date_from))
         if date_to:
-            order_list = order_list.filter(created_at__date__lte=date_to)
+            order_list = order_list.filter(date_range_q(date_to=date_to))
 
-    paginator_orders = Paginator(order_list, 10)
-    orders_page_number = request.GET.get('page_orders')
-    try:
-        orders_page = paginator_orders.page(orders_page_number)
-    except PageNotAnInteger:
-        orders_page = paginator_orders.page(1)
-    except EmptyPage:
-        orders_page = paginator_orders.page(paginator_orders.num_pages)
+    # Paginación por cursor: cualquier página cuesta lo mismo que la primera.
+    orders_page = KeysetPaginator(order_list, 10, count=BOUNDED).page(request.GET.get('page_orders'))
 
     # 8. Contexto final para el template (coincide con tu HTML y añade lo nuevo)
     context = {
         'orders': orders_page,
         'customers': customers_page,
-        'daily_income': daily_income,
-        'weekly_income': weekly_income,
-        'monthly_income': monthly_income,
+        'kpis': kpis,
+        'daily_income': kpis.daily_income,
+        'weekly_income': kpis.weekly_income,
+        'monthly_income': kpis.monthly_income,
+        'total_due': kpis.total_due,
         'customer_filter_form': customer_filter_form,
         'order_filter_form': order_filter_form,
-        'orders_processing_count': orders_processing_count,
-        'orders_completed_count': orders_ready_count,  # Nombre de variable que usa tu HTML
-        'orders_payment_pending_count': orders_payment_pending_count,
-        'orders_total_count': orders_total_count,
+        'orders_processing_count': kpis.processing_count,
+        'orders_completed_count': kpis.ready_count,  # Nombre de variable que usa tu HTML
+        'orders_payment_pending_count': kpis.payment_pending_count,
+        'orders_total_count': kpis.total_count,
         'total_customers': total_customers,
         'top_customers': top_customers, # Nueva variable
         'attention_orders': attention_orders, # Nueva variable
@@ -206,57 +190,31 @@ def add_order(request):
     
     if request.method == 'POST':
         order_form = OrderForm(request.POST)
-        formset = OrderCategoryFormSet(request.POST, prefix='formset')
+        # Las categorías se cargan una vez para todo el formset: validar cada
+        # línea ya no hace una consulta por fila.
+        formset = OrderCategoryFormSet(request.POST, prefix='formset', form_kwargs={'categories': Category.objects.in_bulk()})
 
         if order_form.is_valid() and formset.is_valid():
             try:
-                with transaction.atomic():
-                    final_price_override_str = request.POST.get('final_price_override', '').strip()
-                    
-                    # --- CORRECCIÓN ---
-                    # Obtenemos el precio por kilo desde la configuración de forma segura
-                    try:
-                        price_setting = AppConfiguration.objects.get(key='default_price_per_kg')
-                        price_per_kg = Decimal(price_setting.value)
-                    except (AppConfiguration.DoesNotExist, ValueError):
-                        # Si no se encuentra la configuración, usamos un valor por defecto seguro.
-                        price_per_kg = Decimal('5.00')
-
-                    order = order_form.save(commit=False)
-                    # Nos aseguramos de asignar el precio por kilo correcto al pedido
-                    order.weight_price_per_kg = price_per_kg
-                    order.total_weight = order.weight if order.weight is not None else Decimal('0.00')
-                    order.payment_status = 'PENDING'
-                    order.save()
-
-                    initial_price = Decimal('0.00')
-                    if order.weight: 
-                        initial_price += Decimal(order.weight) * price_per_kg
-                    
-                    for form in formset:
-                        # Se procesa el formulario solo si tiene datos y es válido
-                        if form.has_changed() and form.is_valid() and not form.cleaned_data.get('DELETE', False):
-                            category = form.cleaned_data.get('category')
-                            quantity = form.cleaned_data.get('quantity')
-                            if category and quantity and quantity > 0:
-                                OrderCategory.objects.create(order=order, category=category, quantity=quantity)
-                                initial_price += Decimal(category.price) * Decimal(quantity)
-                    
-                    order.original_calculated_price = initial_price.quantize(Decimal('0.01'))
+                final_price_override_str = request.POST.get('final_price_override', '').strip()
 
-                    if final_price_override_str:
-                        final_price = Decimal(final_price_override_str)
-                        if final_price != initial_price:
-                            order.price_adjusted_by_user = True
-                            order.discount_amount = (initial_price - final_price).quantize(Decimal('0.01'))
-                    
-                    order.save()
-                    order.generate_qr_code()
-                    
-                    return JsonResponse({
-                        'success': True, 'order_id': order.id, 'order_code': order.order_code,
-                        'total_price': order.total_price,
-                    })
+                # Precio por kilo de la configuración (ya convertido, sin consultar la base).
+                price_per_kg = app_settings().price_per_kg
+
+                lines = [
+                    (form.cleaned_data.get('category'), form.cleaned_data.get('quantity'))
+                    for form in formset
+                    # Se procesa el formulario solo si tiene datos y no fue marcado para borrar
+                    if form.has_changed() and not form.cleaned_data.get('DELETE', False)
+                ]
+                final_price = Decimal(final_price_override_str) if final_price_override_str else None
+
+                order = create_order(order_form.save(commit=False), lines, price_per_kg, final_price)
+
+                return JsonResponse({
+                    'success': True, 'order_id': order.id, 'order_code': order.order_code,
+                    'total_price': order.total_price,
+                })
             except Exception as e:
                 return JsonResponse({'success': False, 'error': str(e)})
         else:
@@ -308,6 +266,28 @@ def register_payment(request, order_id):
             return JsonResponse({'success': False, 'error': str(e)})
     return JsonResponse({'success': False, 'error': 'Método no permitido.'})
 
+def _qr_image_etag(request, kind, code, fmt):
+    if fmt not in QR_FORMATS or not is_valid_target(kind, code):
+        return None
+    return qr_etag(qr_target_url(kind, code, request), fmt)
+
+
+@login_required
+@etag(_qr_image_etag)
+def qr_image(request, kind, code, fmt):
+    """
+    Sirve el QR de un pedido (por short_id) o de un cliente (por customer_code)
+    en PNG o SVG. No consulta la base de datos: el contenido sale del código.
+    Solo lo usan el ticket y la confirmación del pedido, así que pide sesión
+    para que nadie lo use como generador de QR abierto.
+    """
+    if fmt not in QR_FORMATS or not is_valid_target(kind, code):
+        raise Http404("Código QR no válido.")
+    content = render_qr(qr_target_url(kind, code, request), fmt)
+    response = HttpResponse(content, content_type=QR_FORMATS[fmt])
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
 def order_status(request, short_id):
     """
     Muestra la página pública con el estado de un pedido, buscándolo por su
@@ -363,13 +343,16 @@ def manage_customer_orders(request, customer_code):
     customer = get_object_or_404(Customer, customer_code=customer_code)
     orders = Order.objects.filter(customer=customer).order_by('-created_at')
 
-    # Calculamos la deuda total sumando los montos restantes de cada pedido de este cliente
-    customer_total_due = sum(order.remaining_amount() for order in orders)
+    # Deuda total del cliente: un solo SUM sobre el índice (customer, remaining_amount)
+    customer_total_due = orders.aggregate(
+        total=Coalesce(Sum('remaining_amount'), Decimal('0.0'), output_field=DecimalField())
+    )['total']
 
     # Creamos el contexto y añadimos la nueva variable
     context = {
         'customer': customer, 
         'orders': orders,
+        'debt_orders': orders.filter(remaining_amount__gt=0),
         'customer_total_due': customer_total_due, # <-- La nueva variable que necesita el HTML
     }
     
@@ -394,19 +377,17 @@ def edit_order(request, order_id):
             order.customer = get_object_or_404(Customer, id=order.customer_id)
 
             OrderCategory.objects.filter(order=order).delete()
-            initial_price = Decimal('0.00')
-            if order.weight:
-                initial_price += Decimal(order.weight) * order.weight_price_per_kg
-
-            for form in formset:
-                if not form.cleaned_data.get('DELETE', False) and form.has_changed():
-                    category = form.cleaned_data.get('category')
-                    quantity = form.cleaned_data.get('quantity')
-                    if category and quantity and quantity > 0:
-                        OrderCategory.objects.create(order=order, category=category, quantity=quantity)
-                        initial_price += Decimal(category.price) * Decimal(quantity)
-
-            order.original_calculated_price = initial_price
+            lines = [
+                (form.cleaned_data.get('category'), form.cleaned_data.get('quantity'))
+                for form in formset
+                if not form.cleaned_data.get('DELETE', False) and form.has_changed()
+            ]
+            lines = [(category, quantity) for category, quantity in lines if category and quantity and quantity > 0]
+            OrderCategory.objects.bulk_create(
+                [OrderCategory(order=order, category=category, quantity=quantity) for category, quantity in lines]
+            )
+
+            order.original_calculated_price = calculate_price(order.weight, order.weight_price_per_kg, lines)
             order.price_adjusted_by_user = True
 
             if order.payment_status == 'PAID':
@@ -446,120 +427,26 @@ def edit_order(request, order_id):
 def download_order_pdf(request, order_id):
     order = get_object_or_404(Order, id=order_id)
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesizes=letter,
-                            rightMargin=0.75 * inch, leftMargin=0.75 * inch,
-                            topMargin=0.75 * inch, bottomMargin=0.75 * inch)
-    styles = getSampleStyleSheet()
+    doc = document(buffer)
     elements = []
 
-    # --- Modern Color Palette & Fonts ---
-    # Using a slightly darker primary color for a more corporate feel
-    primary_color = colors.HexColor('#1A73E8') # A common blue in modern tech UIs
-    secondary_color = colors.HexColor('#E8F0FE') # Very light blue for subtle backgrounds
-    text_dark = colors.HexColor('#202124') # Near black for primary text
-    text_medium = colors.HexColor('#5F6368') # Dark grey for secondary text/labels
-    border_light = colors.HexColor('#DADCE0') # Light grey for subtle borders
-
-    # Custom Paragraph Styles
-    # Company Name (Large and bold)
-    company_name_style = ParagraphStyle(
-        name='CompanyName',
-        fontSize=30, # Even larger for impact
-        leading=36,
-        textColor=primary_color,
-        alignment=0,
-        fontName='Helvetica-Bold' # Helvetica or Arial are clean, common choices
-    )
-    # Company Address/Contact Info
-    company_info_style = ParagraphStyle(
-        name='CompanyInfo',
-        fontSize=9,
-        leading=11,
-        textColor=text_medium,
-        alignment=0,
-        fontName='Helvetica'
-    )
-    # Section Title (e.g., "Invoice Details", "Bill To")
-    section_title_style = ParagraphStyle(
-        name='SectionTitle',
-        fontSize=12,
-        leading=14,
-        textColor=text_dark,
-        alignment=0,
-        fontName='Helvetica-Bold'
-    )
-    # Key Value Label (e.g., "Invoice #:", "Date:")
-    label_style = ParagraphStyle(
-        name='Label',
-        fontSize=10,
-        leading=12,
-        textColor=text_medium,
-        alignment=0,
-        fontName='Helvetica'
-    )
-    # Key Value Data (e.g., "INV-001", "2023-10-26")
-    data_style = ParagraphStyle(
-        name='Data',
-        fontSize=10,
-        leading=12,
-        textColor=text_dark,
-        alignment=0,
-        fontName='Helvetica-Bold'
-    )
-    # Item Table Header
-    table_header_style = ParagraphStyle(
-        name='TableHeader',
-        fontSize=10,
-        leading=12,
-        textColor=text_dark,
-        alignment=1, # Center alignment
-        fontName='Helvetica-Bold'
-    )
-    # Item Table Cell
-    table_cell_style = ParagraphStyle(
-        name='TableCell',
-        fontSize=9,
-        leading=11,
-        textColor=text_dark,
-        alignment=1, # Center alignment
-        fontName='Helvetica'
-    )
-    # Right-aligned Table Cell (for prices)
-    table_cell_right_style = ParagraphStyle(
-        name='TableCellRight',
-        fontSize=9,
-        leading=11,
-        textColor=text_dark,
-        alignment=2, # Right alignment
-        fontName='Helvetica'
-    )
-    # Subtotal/Tax/Total Labels (right-aligned)
-    summary_label_style = ParagraphStyle(
-        name='SummaryLabel',
-        fontSize=11,
-        leading=13,
-        textColor=text_dark,
-        alignment=2, # Right alignment
-        fontName='Helvetica'
-    )
-    # Grand Total Value (larger, bold, primary color)
-    grand_total_value_style = ParagraphStyle(
-        name='GrandTotalValue',
-        fontSize=18,
-        leading=22,
-        textColor=primary_color,
-        alignment=2, # Right alignment
-        fontName='Helvetica-Bold'
-    )
-    # Footer Text
-    footer_style = ParagraphStyle(
-        name='Footer',
-        fontSize=9,
-        leading=11,
-        textColor=text_medium,
-        alignment=1, # Center alignment
-        fontName='Helvetica'
-    )
+    # Paleta y estilos del recibo (registro de core/pdf.py)
+    primary_color = RECEIPT_PRIMARY
+    secondary_color = RECEIPT_SECONDARY
+    text_dark = RECEIPT_TEXT_DARK
+    border_light = RECEIPT_BORDER
+
+    company_name_style = STYLES['ReceiptCompany']
+    company_info_style = STYLES['ReceiptInfo']
+    section_title_style = STYLES['ReceiptSection']
+    label_style = STYLES['ReceiptLabel']
+    data_style = STYLES['ReceiptData']
+    table_header_style = STYLES['ReceiptTableHeader']
+    table_cell_style = STYLES['ReceiptCell']
+    table_cell_right_style = STYLES['ReceiptCellRight']
+    summary_label_style = STYLES['ReceiptSummaryLabel']
+    grand_total_value_style = STYLES['ReceiptGrandTotal']
+    footer_style = STYLES['ReceiptFooter']
 
     # --- Header Section: Company Name & Info ---
     elements.append(Paragraph("<b>LAVANDERÍA MODERNA</b>", company_name_style))
@@ -625,25 +512,14 @@ def download_order_pdf(request, order_id):
          Paragraph('TOTAL (S/)', table_header_style)]
     ]
     total = Decimal('0.00')
-    for oc in order.ordercategory_set.all():
-        item_total = oc.quantity * oc.category.price
-        total += item_total
+    for line in order_lines(order):
+        total += line['total']
         item_table_data.append([
-            Paragraph(oc.category.name, table_cell_style),
-            Paragraph(oc.category.description or 'Lavado estándar', table_cell_style),
-            Paragraph(str(oc.quantity), table_cell_style),
-            Paragraph(f"{oc.category.price:.2f}", table_cell_right_style),
-            Paragraph(f"{item_total:.2f}", table_cell_right_style)
-        ])
-    if order.weight and order.weight_price_per_kg:
-        weight_total = order.weight * order.weight_price_per_kg
-        total += weight_total
-        item_table_data.append([
-            Paragraph(f"Peso ({order.weight} kg)", table_cell_style),
-            Paragraph('Lavado por peso', table_cell_style),
-            Paragraph('1', table_cell_style),
-            Paragraph(f"{order.weight_price_per_kg:.2f}", table_cell_right_style),
-            Paragraph(f"{weight_total:.2f}", table_cell_right_style)
+            Paragraph(line['name'], table_cell_style),
+            Paragraph(line['description'], table_cell_style),
+            Paragraph(str(line['quantity']), table_cell_style),
+            Paragraph(f"{line['unit_price']:.2f}", table_cell_right_style),
+            Paragraph(f"{line['total']:.2f}", table_cell_right_style)
         ])
 
     item_table = Table(item_table_data, colWidths=[1.5 * inch, 2.0 * inch, 0.8 * inch, 1.2 * inch, 1.2 * inch])
@@ -695,12 +571,13 @@ def download_order_pdf(request, order_id):
     footer_elements.append(Paragraph("Gracias por tu preferencia. ¡Vuelve pronto!", footer_style))
     footer_elements.append(Spacer(1, 0.2 * inch))
 
-    if order.qr_code and os.path.exists(order.qr_code.path):
-        qr_image = Image(order.qr_code.path, 1.2 * inch, 1.2 * inch) # Slightly larger QR for readability
+    if order.short_id:
+        qr_png = render_qr(qr_target_url('order', order.short_id, request), 'png')
+        qr_image = Image(BytesIO(qr_png), 1.2 * inch, 1.2 * inch) # Slightly larger QR for readability
         qr_image.hAlign = 'CENTER'
         footer_elements.append(qr_image)
 
-    footer_table = Table([[elem] for elem in footer_elements], colWidths=[letter[0] - 1.5*inch]) # Match document margins
+    footer_table = Table([[elem] for elem in footer_elements], colWidths=[CONTENT_WIDTH])
     footer_table.setStyle(TableStyle([
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
         ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
@@ -727,16 +604,16 @@ def payment_audit(request):
     payment_status_filter = request.GET.get('payment_status')
 
     # Queryset base: todos los pedidos para calcular los ingresos del día.
-    orders_today = Order.objects.filter(created_at__date=date.today())
+    orders_today = Order.objects.filter(day_q(timezone.localdate()))
     
     # Queryset para la tabla principal: por defecto, solo los que tienen deuda.
     orders_list = Order.objects.filter(payment_status__in=['PENDING', 'PARTIAL']).select_related('customer').order_by('-created_at')
 
     # --- Aplicación de Filtros ---
     if date_from_str:
-        orders_list = orders_list.filter(created_at__date__gte=date_from_str)
+        orders_list = orders_list.filter(date_range_q(date_from=date_from_str))
     if date_to_str:
-        orders_list = orders_list.filter(created_at__date__lte=date_to_str)
+        orders_list = orders_list.filter(date_range_q(date_to=date_to_str))
     
     # El filtro de estado de pago puede incluir 'Pagado', así que lo aplicamos aquí.
     # Si el usuario filtra por 'PAID', la lista principal se sobrescribe.
@@ -751,30 +628,21 @@ def payment_audit(request):
     
     # 1. Deuda Total Pendiente (solo de los pedidos con deuda)
     pending_orders_qs = Order.objects.filter(payment_status__in=['PENDING', 'PARTIAL'])
-    final_price_expr = F('original_calculated_price') - F('discount_amount')
-    total_due_agg = pending_orders_qs.annotate(
-        remaining=Case(
-            When(payment_status='PARTIAL', then=final_price_expr - F('partial_amount')),
-            When(payment_status='PENDING', then=final_price_expr),
-            default=Decimal('0.0'),
-            output_field=DecimalField()
-        )
-    ).aggregate(total=Coalesce(Sum('remaining'), Decimal('0.0')))
-    total_due = total_due_agg['total']
+    total_due = Order.objects.filter(remaining_amount__gt=0).aggregate(
+        total=Coalesce(Sum('remaining_amount'), Decimal('0.0'), output_field=DecimalField())
+    )['total']
 
     # 2. Ingresos del día (considera pagos completos y parciales del día)
     today_income_agg = orders_today.filter(payment_status__in=['PAID', 'PARTIAL']).aggregate(
-        total=Coalesce(Sum(final_price_expr), Decimal('0.0'))
+        total=Coalesce(Sum('final_price'), Decimal('0.0'), output_field=DecimalField())
     )
     today_income = today_income_agg['total']
     
     # 3. Cantidad de pedidos con deuda
     pending_payment_orders_count = pending_orders_qs.count()
 
-    # --- Paginación ---
-    paginator = Paginator(orders_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # --- Paginación (por cursor) ---
+    page_obj = KeysetPaginator(orders_list, 10, count=BOUNDED).page(request.GET.get('page'))
 
     context = {
         'orders': page_obj,
@@ -793,59 +661,104 @@ def cancel_order(request, order_id):
         messages.success(request, f'Pedido {order.id} anulado correctamente.')
     return redirect('manage_customer_orders', customer_code=order.customer.customer_code)
 
+# Clientes por página en el selector de clientes (Select2).
+CUSTOMER_PICKER_PAGE_SIZE = 20
+
+
 @login_required
 def search_customers(request):
-    query = request.GET.get('query', '')
-    customers = Customer.objects.filter(
-        Q(name__icontains=query) | Q(customer_code__icontains=query)
-    )[:10]
-    results = [
-        {'id': customer.id, 'name': customer.name, 'code': customer.customer_code}
-        for customer in customers
-    ]
-    return JsonResponse({'results': results})
+    """
+    Clientes que coinciden con `term` (o `query`), en el formato de Select2:
+    `results` con `id` y `text` (más `name` y `code`) y `pagination.more`.
+    `page` pide las siguientes páginas. Las respuestas se guardan en caché
+    hasta que cambia algún cliente (`search.customers_version()`).
+    """
+    query = search.normalize(request.GET.get('term') or request.GET.get('query', ''))
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    key = 'customer-picker:{}:{}:{}'.format(
+        search.customers_version(), page, hashlib.sha256(query.encode()).hexdigest(),
+    )
+    data = cache.get(key)
+    if data is None:
+        size = CUSTOMER_PICKER_PAGE_SIZE
+        # Uno de más para saber si hay otra página sin contarlas todas.
+        found = search.search(query, kinds=(search.CUSTOMER,), limit=size + 1, offset=(page - 1) * size)
+        results = [
+            {
+                'id': result['id'], 'text': f"{result['label']} (ID: {result['ref']})",
+                'name': result['label'], 'code': result['ref'],
+            }
+            for result in found[:size]
+        ]
+        data = {'results': results, 'pagination': {'more': len(found) > size}}
+        cache.set(key, data, timeout=60 * 10)
+    return JsonResponse(data)
+
+
 @login_required
-def manage_settings(request):
-    # Definimos las claves de configuración y sus valores por defecto
-    CONFIG_KEYS = {
-        'business_name': 'Mi Lavandería',
-        'business_address': 'Dirección no configurada',
-        'business_phone': '',
-        'default_price_per_kg': '5.00'
-    }
+def omnibox(request):
+    """Búsqueda general (clientes, pedidos, productos y ventas) para la barra superior, en JSON."""
+    query = request.GET.get('q', '')
+    kinds = [kind for kind in request.GET.getlist('type') if kind in search.KINDS] or search.KINDS
+    return JsonResponse({'results': search.search(query, kinds=kinds, limit=20)})
+
 
+@login_required
+def scan_lookup(request):
+    """
+    Lectura de la pistola de códigos (o Enter en el omnibox): redirige a la
+    página del pedido o cliente que identifica `q` (ver core.lookup). Con
+    `?format=json` o `Accept: application/json` responde el resultado en JSON.
+    """
+    query = request.GET.get('q', '').strip()
+    result = lookup(query)
+    if request.GET.get('format') == 'json' or request.headers.get('Accept', '').startswith('application/json'):
+        if result is None:
+            return JsonResponse({'result': None, 'error': 'No se encontró ningún pedido ni cliente.'}, status=404)
+        return JsonResponse({'result': result})
+    if result is None:
+        # Texto que no es un código exacto: el primer resultado de la búsqueda.
+        found = search.search(query, limit=1)
+        if found:
+            return redirect(found[0]['url'])
+        messages.warning(request, f'No se encontró ningún pedido ni cliente para "{query}".')
+        return redirect('dashboard')
+    return redirect(result['url'])
+
+
+@login_required
+def manage_settings(request):
     if request.method == 'POST':
         form = ConfigurationForm(request.POST)
         if form.is_valid():
             cleaned_data = form.cleaned_data
             
-            # Itera y guarda cada ajuste usando update_or_create para seguridad
-            AppConfiguration.objects.update_or_create(
-                key='business_name', defaults={'value': cleaned_data['business_name']}
-            )
-            AppConfiguration.objects.update_or_create(
-                key='business_address', defaults={'value': cleaned_data['business_address']}
-            )
-            AppConfiguration.objects.update_or_create(
-                key='business_phone', defaults={'value': cleaned_data['business_phone']}
-            )
-            AppConfiguration.objects.update_or_create(
-                key='default_price_per_kg', defaults={'value': str(cleaned_data['price_per_kg'])}
-            )
+            # Itera y guarda cada ajuste usando update_or_create para seguridad.
+            # Cada guardado cambia la versión de la configuración (core.config)
+            # al confirmarse, y los demás workers recargan su copia.
+            values = {
+                'business_name': cleaned_data['business_name'],
+                'business_address': cleaned_data['business_address'],
+                'business_phone': cleaned_data['business_phone'],
+                'price_per_kg': str(cleaned_data['price_per_kg']),
+            }
+            with transaction.atomic():
+                for name, value in values.items():
+                    AppConfiguration.objects.update_or_create(key=setting_key(name), defaults={'value': value})
             
             messages.success(request, 'La configuración ha sido actualizada correctamente.')
             return redirect('manage_settings')
     else:
-        # Para GET, obtenemos los valores de la BD o usamos los por defecto
-        db_configs = {c.key: c.value for c in AppConfiguration.objects.filter(key__in=CONFIG_KEYS.keys())}
-        initial_data = {key: db_configs.get(key, default_val) for key, default_val in CONFIG_KEYS.items()}
-        
-        # Preparamos los datos para el formulario
+        # Para GET, se parte de la configuración vigente (con sus valores por defecto)
+        config = app_settings()
         form = ConfigurationForm(initial={
-            'business_name': initial_data.get('business_name'),
-            'business_address': initial_data.get('business_address'),
-            'business_phone': initial_data.get('business_phone'),
-            'price_per_kg': Decimal(initial_data.get('default_price_per_kg'))
+            'business_name': config.business_name,
+            'business_address': config.business_address,
+            'business_phone': config.business_phone,
+            'price_per_kg': config.price_per_kg,
         })
 
     return render(request, 'core/settings.html', {'form': form})
@@ -854,8 +767,8 @@ def mark_order_as_delivered(request, order_id):
     order = get_object_or_404(Order, id=order_id)
     if request.method == 'POST':
         # Validación: No entregar si aún hay deuda
-        if order.remaining_amount() > 0:
-            messages.error(request, f'Error: El pedido #{order.id} no puede ser entregado porque tiene una deuda pendiente de S/ {order.remaining_amount()}.')
+        if order.remaining_amount > 0:
+            messages.error(request, f'Error: El pedido #{order.id} no puede ser entregado porque tiene una deuda pendiente de S/ {order.remaining_amount}.')
         else:
             order.status = 'DELIVERED'
             order.save()
@@ -1001,10 +914,8 @@ def create_sale(request):
 @login_required
 def sales_history(request):
     """Muestra el historial de todas las ventas."""
-    sales = Sale.objects.all().order_by('-created_at')
-    paginator = Paginator(sales, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    sales = Sale.objects.all()
+    page_obj = KeysetPaginator(sales, 15, count=BOUNDED).page(request.GET.get('page'))
     return render(request, 'core/sales_history.html', {'page_obj': page_obj})
 
 
@@ -1024,7 +935,7 @@ def sale_receipt_pdf(request, sale_id):
     # Información del cliente
     customer_info = f"Cliente: {sale.customer.name if sale.customer else 'Venta de Mostrador'}"
     elements.append(Paragraph(customer_info, styles['BodyText']))
-    elements.append(Paragraph(f"Fecha: {sale.created_at.strftime('%d/%m/%Y %H:%M')}", styles['BodyText']))
+    elements.append(Paragraph(f"Fecha: {timezone.localtime(sale.created_at).strftime('%d/%m/%Y %H:%M')}", styles['BodyText']))
     elements.append(Spacer(1, 0.2 * inch))
 
     # Tabla de productos
@@ -1074,16 +985,15 @@ def print_order_ticket(request, order_id):
     """
     try:
         order = get_object_or_404(Order, id=order_id)
-        app_config_qs = AppConfiguration.objects.all()
-        app_config = {c.key: c.value for c in app_config_qs}
+        app_config = app_settings()
         
-        qr_url = request.build_absolute_uri(reverse('order_status', args=[order.short_id]))
+        qr_url = qr_target_url('order', order.short_id, request)
         whatsapp_link = ""
 
         # --- INICIO DE LA LÓGICA DE ESTADO DE PAGO ---
         
         # 1. Determinar el texto de estado para el ticket y el mensaje
-        remaining_amount = order.remaining_amount()
+        remaining_amount = order.remaining_amount
         if remaining_amount <= 0:
             payment_status_text = "CANCELADO"
             payment_status_details = "El pedido ha sido completamente pagado. ¡Gracias!"
@@ -1093,12 +1003,8 @@ def print_order_ticket(request, order_id):
 
         # --- FIN DE LA LÓGICA ---
 
-        if order.customer.phone:
-            phone_number = order.customer.phone.strip().replace(" ", "")
-            if not phone_number.startswith('51'):
-                phone_number = f"51{phone_number}"
-
-            business_name = app_config.get('business_name', 'tu lavandería')
+        if order.customer.phone_e164:
+            business_name = app_config.business_name
             
             # 2. Construir el nuevo mensaje de WhatsApp dinámico
             message_text = (
@@ -1108,8 +1014,7 @@ def print_order_ticket(request, order_id):
                 f"{payment_status_details}\n\n"
                 f"Puedes ver el estado de tu pedido aquí:\n{qr_url}"
             )
-            encoded_message = quote(message_text)
-            whatsapp_link = f"https://wa.me/{phone_number}?text={encoded_message}"
+            whatsapp_link = whatsapp_url(order.customer.phone_e164, message_text)
 
         context = {
             'order': order,
@@ -1134,41 +1039,102 @@ def print_order_ticket(request, order_id):
 @login_required
 @login_required
 def reports_dashboard(request):
-    """ Muestra el menú principal de la sección de reportes. """
-    return render(request, 'core/reports_dashboard.html')
+    """ Muestra el menú principal de la sección de reportes, con el resumen del mes. """
+    today = timezone.localdate()
+    start_of_month = today.replace(day=1)
+    # Sale de los totales diarios (DailyStats): unas decenas de filas por mes.
+    month_income = rollup_total(ORDER, start_of_month, today) + rollup_total(SALE, start_of_month, today)
+    month_expenses = rollup_total(EXPENSE, start_of_month, today)
+    context = {
+        'month_income': month_income,
+        'month_expenses': month_expenses,
+        'month_profit': month_income - month_expenses,
+    }
+    return render(request, 'core/reports_dashboard.html', context)
+
+# Filas por tanda en las tablas de detalle de los reportes de pedidos e
+# ingresos; el resto se pide a `report_rows` a medida que se necesita.
+REPORT_PAGE_SIZE = 50
+
+
+def _report_filters(request):
+    """Filtros válidos del formulario de reportes (vacío si no son válidos)."""
+    report_filter_form = ReportFilterForm(request.GET)
+    filters = report_filter_form.cleaned_data if report_filter_form.is_valid() else {}
+    return report_filter_form, filters
+
+
+def _orders_report_queryset(filters):
+    """Pedidos del reporte de pedidos según los filtros, sin evaluar."""
+    orders = Order.objects.select_related('customer').all()
+    date_from, date_to = filters.get('date_from'), filters.get('date_to')
+    status, customer = filters.get('status'), filters.get('customer')
+
+    if date_from: orders = orders.filter(date_range_q(date_from=date_from))
+    if date_to: orders = orders.filter(date_range_q(date_to=date_to))
+    if status: orders = orders.filter(status=status)
+    if customer: orders = orders.filter(customer=customer)
+    return orders
+
+
+def _income_report_queryset(filters):
+    """Pedidos del reporte de ingresos según los filtros, sin evaluar."""
+    # Un pedido anulado nunca debe contar como un ingreso.
+    orders = Order.objects.select_related('customer').filter(
+        payment_status__in=['PAID', 'PARTIAL']
+    ).exclude(status='CANCELLED')
+    date_from, date_to = filters.get('date_from'), filters.get('date_to')
+    customer = filters.get('customer')
+
+    if date_from: orders = orders.filter(date_range_q(date_from=date_from))
+    if date_to: orders = orders.filter(date_range_q(date_to=date_to))
+    if customer: orders = orders.filter(customer=customer)
+    return orders
+
+
+# report_type -> (consulta filtrada, plantilla de las filas de la tabla)
+_REPORT_ROWS = {
+    'orders': (_orders_report_queryset, 'core/reports/_orders_rows.html'),
+    'income': (_income_report_queryset, 'core/reports/_income_rows.html'),
+}
+
+
+def _report_rows_page(report_type, filters, token=None):
+    queryset_for, _ = _REPORT_ROWS[report_type]
+    return KeysetPaginator(queryset_for(filters), REPORT_PAGE_SIZE).page(token)
+
 
 @login_required
 def orders_report(request):
     """
     Muestra un reporte de pedidos, con filtros por cliente, fecha y estado.
-    """
-    report_filter_form = ReportFilterForm(request.GET)
-    orders = Order.objects.select_related('customer').all().order_by('-created_at')
 
-    if report_filter_form.is_valid():
-        date_from = report_filter_form.cleaned_data.get('date_from')
-        date_to = report_filter_form.cleaned_data.get('date_to')
-        status = report_filter_form.cleaned_data.get('status')
-        customer = report_filter_form.cleaned_data.get('customer')
-
-        if date_from: orders = orders.filter(created_at__date__gte=date_from)
-        if date_to: orders = orders.filter(created_at__date__lte=date_to)
-        if status: orders = orders.filter(status=status)
-        if customer: orders = orders.filter(customer=customer)
-
-    # --- CORRECCIÓN AQUÍ ---
-    # Al calcular el total, excluimos los pedidos anulados del queryset filtrado.
-    total_amount = orders.exclude(status='CANCELLED').aggregate(
-        total=Coalesce(Sum(F('original_calculated_price') - F('discount_amount')), Decimal('0.0'))
-    )['total']
-    
-    total_orders = orders.count()
+    Los totales salen de una sola agregación y la tabla trae solo la primera
+    tanda de filas; las siguientes se cargan desde `report_rows`.
+    """
+    report_filter_form, filters = _report_filters(request)
+    orders = _orders_report_queryset(filters)
+
+    # Los pedidos anulados cuentan en el total de pedidos, no en el monto.
+    if filters.get('status') or filters.get('customer'):
+        totals = orders.aggregate(
+            total_orders=Count('pk'),
+            total_amount=Coalesce(Sum('final_price', filter=~Q(status='CANCELLED')), Decimal('0.0')),
+        )
+    else:
+        # Sin filtro de estado ni cliente, los totales diarios ya tienen los
+        # pedidos no anulados; solo se cuentan aparte los anulados.
+        summary = rollup_summary(ORDER, filters.get('date_from'), filters.get('date_to'))
+        totals = {
+            'total_orders': summary['count'] + orders.filter(status='CANCELLED').count(),
+            'total_amount': summary['total'],
+        }
 
     context = {
         'report_filter_form': report_filter_form,
-        'orders': orders,
-        'total_orders': total_orders,
-        'total_amount': total_amount,
+        'orders': _report_rows_page('orders', filters),
+        'total_orders': totals['total_orders'],
+        'total_amount': totals['total_amount'],
         'report_type': 'orders', 
     }
     return render(request, 'core/reports/orders_report.html', context)
@@ -1178,38 +1144,44 @@ def orders_report(request):
 def income_report(request):
     """
     Muestra un reporte de ingresos, con filtros por cliente y fecha.
-    """
-    report_filter_form = ReportFilterForm(request.GET)
-    
-    # --- CORRECCIÓN AQUÍ ---
-    # Excluimos los pedidos anulados desde el inicio de la consulta, ya que
-    # un pedido anulado nunca debe contar como un ingreso.
-    orders = Order.objects.select_related('customer').filter(
-        payment_status__in=['PAID', 'PARTIAL']
-    ).exclude(status='CANCELLED').order_by('-created_at')
 
-    if report_filter_form.is_valid():
-        date_from = report_filter_form.cleaned_data.get('date_from')
-        date_to = report_filter_form.cleaned_data.get('date_to')
-        customer = report_filter_form.cleaned_data.get('customer')
-
-        if date_from: orders = orders.filter(created_at__date__gte=date_from)
-        if date_to: orders = orders.filter(created_at__date__lte=date_to)
-        if customer: orders = orders.filter(customer=customer)
-            
-    total_income = orders.aggregate(
-        total=Coalesce(Sum(F('original_calculated_price') - F('discount_amount')), Decimal('0.0'))
-    )['total']
+    Igual que en `orders_report`, la tabla se entrega por tandas.
+    """
+    report_filter_form, filters = _report_filters(request)
+    date_from, date_to = filters.get('date_from'), filters.get('date_to')
+
+    if filters.get('customer'):
+        # Los totales diarios no distinguen clientes: se suma sobre los pedidos.
+        total_income = _income_report_queryset(filters).aggregate(
+            total=Coalesce(Sum('final_price'), Decimal('0.0'))
+        )['total']
+    else:
+        total_income = rollup_total(ORDER, date_from, date_to, payment_status__in=['PAID', 'PARTIAL'])
 
     context = {
         'report_filter_form': report_filter_form,
-        'orders': orders,
+        'orders': _report_rows_page('income', filters),
         'total_income': total_income,
         'report_type': 'income',
     }
     return render(request, 'core/reports/income_report.html', context)
 
 
+@login_required
+def report_rows(request, report_type):
+    """
+    Siguiente tanda de filas de la tabla de un reporte (`orders` o `income`),
+    en JSON: el HTML de las filas y el token de la tanda que sigue (vacío si
+    no hay más). Recibe los mismos filtros que el reporte y `after`.
+    """
+    if report_type not in _REPORT_ROWS:
+        raise Http404("Reporte no válido")
+    _, filters = _report_filters(request)
+    page = _report_rows_page(report_type, filters, request.GET.get('after'))
+    html = render_to_string(_REPORT_ROWS[report_type][1], {'orders': page}, request=request)
+    return JsonResponse({'html': html, 'next': page.next_token})
+
+
 @login_required
 def sales_report(request):
     """
@@ -1224,8 +1196,8 @@ def sales_report(request):
     if report_filter_form.is_valid():
         date_from = report_filter_form.cleaned_data.get('date_from')
         date_to = report_filter_form.cleaned_data.get('date_to')
-        if date_from: sales = sales.filter(created_at__date__gte=date_from)
-        if date_to: sales = sales.filter(created_at__date__lte=date_to)
+        if date_from: sales = sales.filter(date_range_q(date_from=date_from))
+        if date_to: sales = sales.filter(date_range_q(date_to=date_to))
 
     total_sales_amount = sales.aggregate(total=Coalesce(Sum('total_amount'), Decimal('0.0')))['total']
 
@@ -1242,30 +1214,17 @@ def sales_report(request):
 @login_required
 def customers_report(request):
     form = ReportFilterForm(request.GET or None)
-    customers = Customer.objects.annotate(
-        total_orders=Count('order'),
-        total_sales=Count('sale'),
-        # --- CORRECCIÓN APLICADA AQUÍ ---
-        weight_price=Sum(
-            ExpressionWrapper(
-                F('order__weight') * F('order__weight_price_per_kg'),
-                output_field=DecimalField()
-            ),
-            filter=~Q(order__status='CANCELLED') # Excluir anulados
-        ),
-        # --- CORRECCIÓN APLICADA AQUÍ ---
-        category_price=Sum(
-            F('order__ordercategory__quantity') * F('order__ordercategory__category__price'),
-            output_field=DecimalField(),
-            filter=~Q(order__status='CANCELLED') # Excluir anulados
-        ),
-        sales_total=Sum('sale__total_amount')
-    ).annotate(
-        total_spent=ExpressionWrapper(
-            Coalesce(F('weight_price'), 0) + Coalesce(F('category_price'), 0) + Coalesce(F('sales_total'), 0),
-            output_field=DecimalField()
-        )
-    )
+    # Totales por cliente desde el resumen precalculado (CustomerStats).
+    customers = Customer.objects.filter(stats__isnull=False).annotate(
+        total_orders=F('stats__order_count'),
+        total_sales=F('stats__sale_count'),
+        orders_price=F('stats__lifetime_spent'),
+        sales_total=F('stats__sales_total'),
+        total_spent=ExpressionWrapper(F('stats__lifetime_spent') + F('stats__sales_total'), output_field=DecimalField()),
+        # El cursor se guarda en céntimos enteros: SQLite suma los decimales
+        # como REAL y el valor leído ya no es igual al de la base.
+        total_cents=Cast(Round(F('total_spent') * 100), output_field=IntegerField()),
+    ).order_by('-total_cents', 'name')
     
     if form.is_valid():
         date_from = form.cleaned_data.get('date_from')
@@ -1273,16 +1232,17 @@ def customers_report(request):
         
         if date_from:
             customers = customers.filter(
-                Q(order__created_at__date__gte=date_from) | Q(sale__created_at__date__gte=date_from)
+                date_range_q(date_from=date_from, field='order__created_at') | date_range_q(date_from=date_from, field='sale__created_at')
             ).distinct()
         if date_to:
             customers = customers.filter(
-                Q(order__created_at__date__lte=date_to) | Q(sale__created_at__date__lte=date_to)
+                date_range_q(date_to=date_to, field='order__created_at') | date_range_q(date_to=date_to, field='sale__created_at')
             ).distinct()
     
-    paginator = Paginator(customers, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Por cursor sobre el mismo orden (gasto total, nombre, id).
+    page_obj = KeysetPaginator(customers, 15, ordering=('-total_cents', 'name', 'pk'), count=BOUNDED).page(
+        request.GET.get('page')
+    )
     
     context = {
         'form': form,
@@ -1292,318 +1252,138 @@ def customers_report(request):
     return render(request, 'core/customers_report.html', context)
 
 
-def _header_footer(canvas, doc):
-    canvas.saveState()
-    styles = getSampleStyleSheet()
-    styles['Normal'].fontSize = 8
-    
-    # --- Encabezado ---
-    # Intenta obtener el nombre del negocio para el encabezado
-    try:
-        business_name = AppConfiguration.objects.get(key='business_name').value
-    except AppConfiguration.DoesNotExist:
-        business_name = "Mi Lavandería"
-        
-    header_text = f"Reporte de Actividad - {business_name}"
-    header = Paragraph(header_text, styles['Normal'])
-    w, h = header.wrap(doc.width, doc.topMargin)
-    header.drawOn(canvas, doc.leftMargin, doc.height + doc.topMargin + h + 10) # Ajuste de posición
+@login_required
+def export_report_pdf(request, report_type):
+    """
+    PDF detallado de un reporte. Se genera en segundo plano (core/report_exports.py):
+    si ya hay uno listo para estos filtros y datos se entrega al instante; si
+    no, se muestra una página que espera a que termine. `?refresh=1` lo
+    vuelve a generar.
+    """
+    if report_type not in REPORT_TYPES:
+        raise Http404("Reporte no válido")
+    export = request_export(report_type, ReportFilterForm(request.GET), refresh='refresh' in request.GET)
+    if export.status == ReportExport.DONE:
+        return _report_export_response(export)
+    return render(request, 'core/reports/report_export_status.html', {'export': export})
+
+
+def _report_export_response(export):
+    return FileResponse(
+        export.file.open('rb'), content_type='application/pdf',
+        filename=f'{export.report_type}_report_detailed.pdf',
+    )
 
-    # --- Pie de Página ---
-    footer_text = f"Página <pageNumber/> | Generado el {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-    footer = Paragraph(footer_text, styles['Normal'])
-    w, h = footer.wrap(doc.width, doc.bottomMargin)
-    footer.drawOn(canvas, doc.leftMargin, h)
-    canvas.restoreState()
 
+@login_required
+def report_export_status(request, key):
+    """Estado y avance (JSON) de un PDF en generación, para la página de espera."""
+    export = get_object_or_404(ReportExport, key=key)
+    data = {
+        'status': export.status,
+        'status_display': export.get_status_display(),
+        'progress': export.progress,
+    }
+    if export.status == ReportExport.DONE:
+        data['url'] = reverse('report_export_file', args=[export.key])
+    return JsonResponse(data)
 
 
 @login_required
-def export_report_pdf(request, report_type):
-    form = ReportFilterForm(request.GET or None)
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=0.75*inch, leftMargin=0.75*inch, topMargin=0.75*inch, bottomMargin=0.75*inch)
+def report_export_file(request, key):
+    """Descarga un PDF ya generado."""
+    export = get_object_or_404(ReportExport, key=key, status=ReportExport.DONE)
+    return _report_export_response(export)
 
-    # --- Estilos Globales para todos los reportes ---
-    styles = getSampleStyleSheet()
-    company_style = ParagraphStyle(name='CompanyStyle', parent=styles['h1'], fontSize=16, leading=20, alignment=0, textColor=colors.HexColor('#1E3A8A'))
-    title_style = ParagraphStyle(name='TitleStyle', parent=styles['h2'], fontSize=13, leading=17, alignment=0, spaceAfter=15, textColor=colors.HexColor('#1F2937'))
-    summary_label_style = ParagraphStyle(name='SummaryLabelStyle', parent=styles['Normal'], fontSize=9, textColor=colors.HexColor('#4B5563'))
-    summary_value_style = ParagraphStyle(name='SummaryValueStyle', parent=summary_label_style, fontName='Helvetica-Bold')
-    normal_style = ParagraphStyle(name='NormalStyle', parent=styles['Normal'], fontSize=9, leading=12, textColor=colors.HexColor('#4B5563'))
-    header_style = ParagraphStyle(name='HeaderStyle', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=8, alignment=1, textColor=colors.white)
-    cell_style = ParagraphStyle(name='CellStyle', parent=styles['Normal'], fontSize=8, alignment=1)
-    cell_left_style = ParagraphStyle(name='CellLeftStyle', parent=cell_style, alignment=0)
-    cell_right_style = ParagraphStyle(name='CellRightStyle', parent=cell_style, alignment=2)
-    cell_center_style = ParagraphStyle(name='CellCenterStyle', parent=cell_style, alignment=1)
-    grand_total_style = ParagraphStyle(name='GrandTotal', parent=styles['h3'], alignment=2, fontSize=12, textColor=colors.HexColor('#166534'))
-    kpi_label_style = ParagraphStyle(name='KPILabel', parent=styles['Normal'], fontSize=9, textColor=colors.HexColor('#4B5563'), alignment=1)
-    kpi_value_style = ParagraphStyle(name='KPIValue', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=16, alignment=1)
 
-    elements = []
+def _export_income(filters):
+    orders = _income_report_queryset(filters)
+    sales = Sale.objects.filter(date_range_q(filters.get('date_from'), filters.get('date_to')))
+    if filters.get('customer'):
+        sales = sales.filter(customer=filters['customer'])
+    return ['Fecha', 'Tipo', 'Cliente', 'Monto'], income_rows(orders, sales)
 
-    if form.is_valid():
-        date_from = form.cleaned_data.get('date_from')
-        date_to = form.cleaned_data.get('date_to')
-        customer_filter = form.cleaned_data.get('customer')
-        status = form.cleaned_data.get('status')
 
-        # --- Encabezado del Documento (Común para todos) ---
-        try:
-            business_name = AppConfiguration.objects.get(key='business_name').value
-        except AppConfiguration.DoesNotExist:
-            business_name = "Mi Lavandería"
-        elements.append(Paragraph(business_name, company_style))
-        elements.append(Spacer(1, 0.1 * inch))
-        filter_text = f"<b>Desde:</b> {date_from.strftime('%d/%m/%Y') if date_from else 'N/A'}  |  "
-        filter_text += f"<b>Hasta:</b> {date_to.strftime('%d/%m/%Y') if date_to else 'N/A'}"
-        if customer_filter: filter_text += f"  |  <b>Cliente:</b> {customer_filter.name}"
-        if status and report_type == 'orders': filter_text += f"  |  <b>Estado:</b> {status}"
-        elements.append(Paragraph(filter_text, normal_style))
-        elements.append(Spacer(1, 0.3 * inch))
-
-        # ==================================================================
-        #  REPORTE DE RENTABILIDAD
-        # ==================================================================
-        if report_type == 'profitability':
-            elements.append(Paragraph("Reporte de Rentabilidad", title_style))
-            
-            orders_qs = Order.objects.exclude(status='CANCELLED')
-            sales_qs = Sale.objects.prefetch_related('saleitem_set__product').all()
-            expenses_qs = Expense.objects.all()
-
-            if date_from:
-                orders_qs = orders_qs.filter(created_at__date__gte=date_from)
-                sales_qs = sales_qs.filter(created_at__date__gte=date_from)
-                expenses_qs = expenses_qs.filter(expense_date__gte=date_from)
-            if date_to:
-                orders_qs = orders_qs.filter(created_at__date__lte=date_to)
-                sales_qs = sales_qs.filter(created_at__date__lte=date_to)
-                expenses_qs = expenses_qs.filter(expense_date__lte=date_to)
-
-            income_from_orders = orders_qs.aggregate(total=Coalesce(Sum(F('original_calculated_price')-F('discount_amount')),Decimal('0.0')))['total']
-            income_from_sales = sales_qs.aggregate(total=Coalesce(Sum('total_amount'), Decimal('0.0')))['total']
-            total_income = income_from_orders + income_from_sales
-            total_expenses = expenses_qs.aggregate(total=Coalesce(Sum('amount'), Decimal('0.0')))['total']
-            net_profit = total_income - total_expenses
-            profit_margin = (net_profit / total_income) * 100 if total_income > 0 else 0
-            
-            kpi_data = [[Paragraph('INGRESOS', kpi_label_style), Paragraph('GASTOS', kpi_label_style), Paragraph('GANANCIA NETA', kpi_label_style), Paragraph('MARGEN', kpi_label_style)],
-                        [Paragraph(f"S/ {total_income:.2f}", kpi_value_style), Paragraph(f"S/ {total_expenses:.2f}", kpi_value_style), Paragraph(f"S/ {net_profit:.2f}", kpi_value_style), Paragraph(f"{profit_margin:.1f}%", kpi_value_style)]]
-            kpi_table = Table(kpi_data, colWidths=[1.7*inch, 1.7*inch, 1.7*inch, 1.7*inch])
-            kpi_table.setStyle(TableStyle([('BOX', (0,0), (-1,-1), 1, colors.HexColor('#E5E7EB')),('INNERGRID', (0,0), (-1,-1), 0.5, colors.HexColor('#E5E7EB')),('LEFTPADDING', (0,0), (-1,-1), 10), ('RIGHTPADDING', (0,0), (-1,-1), 10),('TOPPADDING', (0,0), (-1,-1), 6), ('BOTTOMPADDING', (0,0), (-1,-1), 6),]))
-            elements.append(kpi_table)
-            elements.append(Spacer(1, 0.3 * inch))
-
-            elements.append(Paragraph("Desglose de Transacciones", styles['h2']))
-            
-            for o in orders_qs: o.transaction_date = o.created_at.date()
-            for s in sales_qs: s.transaction_date = s.created_at.date()
-            for e in expenses_qs: e.transaction_date = e.expense_date
-            
-            all_transactions = sorted(chain(orders_qs, sales_qs, expenses_qs), key=attrgetter('transaction_date'), reverse=True)
-
-            table_data = [[Paragraph('Fecha', header_style), Paragraph('Tipo', header_style), Paragraph('Descripción', header_style), Paragraph('Monto (S/)', header_style)]]
-            for tx in all_transactions:
-                if isinstance(tx, Order): 
-                    table_data.append([Paragraph(tx.created_at.strftime('%d/%m/%y'), cell_center_style), Paragraph('Ingreso', cell_center_style), Paragraph(f"Pedido #{tx.order_code} - {tx.customer.name}", cell_left_style), Paragraph(f"+{tx.total_price:.2f}", cell_right_style)])
-                elif isinstance(tx, Sale):
-                    items_list = [f"{item.quantity} x {item.product.name}" for item in tx.saleitem_set.all()]
-                    products_str = ", ".join(items_list)
-                    description = f"Venta #{tx.id}: {products_str}"
-                    table_data.append([Paragraph(tx.created_at.strftime('%d/%m/%y'), cell_center_style), Paragraph('Ingreso', cell_center_style), Paragraph(description, cell_left_style), Paragraph(f"+{tx.total_amount:.2f}", cell_right_style)])
-                elif isinstance(tx, Expense): 
-                    table_data.append([Paragraph(tx.expense_date.strftime('%d/%m/%y'), cell_center_style), Paragraph('Egreso', cell_center_style), Paragraph(tx.description, cell_left_style), Paragraph(f"-{tx.amount:.2f}", cell_right_style)])
-
-            detail_table = Table(table_data, colWidths=[0.8*inch, 0.8*inch, 4*inch, 1.2*inch])
-            detail_table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4B5563')),('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),('VALIGN', (0,0), (-1,-1), 'MIDDLE'),]))
-            elements.append(detail_table)
-        
-        # ==================================================================
-        #  REPORTE GENERAL DE PEDIDOS (LÓGICA ORIGINAL RESTAURADA)
-        # ==================================================================
-        elif report_type == 'orders':
-            elements.append(Paragraph("Reporte General de Pedidos", title_style))
-            orders_qs = Order.objects.select_related('customer').order_by('-created_at')
-            if date_from: orders_qs = orders_qs.filter(created_at__date__gte=date_from)
-            if date_to: orders_qs = orders_qs.filter(created_at__date__lte=date_to)
-            if customer_filter: orders_qs = orders_qs.filter(customer=customer_filter)
-            if status: orders_qs = orders_qs.filter(status=status)
-            
-            active_orders = orders_qs.exclude(status='CANCELLED')
-            total_amount = active_orders.aggregate(total=Coalesce(Sum(F('original_calculated_price') - F('discount_amount')), Decimal('0.0')))['total']
-            
-            table_data = [[Paragraph('ID Pedido', header_style), Paragraph('Fecha', header_style), Paragraph('Cliente', header_style), Paragraph('Estado', header_style), Paragraph('Monto (S/)', header_style)]]
-            for order in orders_qs:
-                monto = (order.original_calculated_price - order.discount_amount) if order.status != 'CANCELLED' else Decimal('0.00')
-                table_data.append([Paragraph(order.order_code, cell_style), Paragraph(order.created_at.strftime('%d/%m/%y'), cell_style), Paragraph(order.customer.name, cell_left_style), Paragraph(order.get_status_display(), cell_style), Paragraph(f"{monto:.2f}", cell_right_style)])
-            
-            table = Table(table_data, colWidths=[0.8*inch, 0.8*inch, 2.9*inch, 1.3*inch, 1.2*inch])
-            table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4B5563')), ('TEXTCOLOR', (0,0),(-1,0), colors.whitesmoke), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'), ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey), ('ALIGN', (2, 1), (2, -1), 'LEFT'), ('ALIGN', (-1, 1), (-1, -1), 'RIGHT')]))
-            elements.append(table)
-            elements.append(Spacer(1, 0.2 * inch))
-            elements.append(Paragraph(f"MONTO TOTAL (PEDIDOS ACTIVOS): S/ {total_amount:.2f}", grand_total_style))
-
-        # ==================================================================
-        #  REPORTE GENERAL DE INGRESOS (LÓGICA ORIGINAL RESTAURADA)
-        # ==================================================================
-        elif report_type == 'income':
-            elements.append(Paragraph("Reporte General de Ingresos", title_style))
-            orders_qs = Order.objects.filter(payment_status__in=['PAID', 'PARTIAL']).exclude(status='CANCELLED').select_related('customer')
-            sales_qs = Sale.objects.select_related('customer')
-            
-            if date_from:
-                orders_qs = orders_qs.filter(created_at__date__gte=date_from)
-                sales_qs = sales_qs.filter(created_at__date__gte=date_from)
-            if date_to:
-                orders_qs = orders_qs.filter(created_at__date__lte=date_to)
-                sales_qs = sales_qs.filter(created_at__date__lte=date_to)
-            if customer_filter:
-                orders_qs = orders_qs.filter(customer=customer_filter)
-                sales_qs = sales_qs.filter(customer=customer_filter)
-
-            income_from_orders = orders_qs.aggregate(total=Coalesce(Sum(F('original_calculated_price') - F('discount_amount')), Decimal('0.0')))['total']
-            income_from_sales = sales_qs.aggregate(total=Coalesce(Sum('total_amount'), Decimal('0.0')))['total']
-            total_income = income_from_orders + income_from_sales
-            
-            all_transactions = sorted(chain(orders_qs, sales_qs), key=attrgetter('created_at'), reverse=True)
-            table_data = [[Paragraph('Fecha', header_style), Paragraph('Tipo', header_style), Paragraph('Cliente', header_style), Paragraph('Referencia', header_style), Paragraph('Monto (S/)', header_style)]]
-            for tx in all_transactions:
-                if isinstance(tx, Order):
-                    monto = tx.original_calculated_price - tx.discount_amount
-                    table_data.append([Paragraph(tx.created_at.strftime('%d/%m/%y'), cell_style), Paragraph('Pedido', cell_style), Paragraph(tx.customer.name, cell_left_style), Paragraph(tx.order_code, cell_style), Paragraph(f"{monto:.2f}", cell_right_style)])
-                elif isinstance(tx, Sale):
-                    table_data.append([Paragraph(tx.created_at.strftime('%d/%m/%y'), cell_style), Paragraph('Venta', cell_style), Paragraph(tx.customer.name if tx.customer else 'Mostrador', cell_left_style), Paragraph(f"#{tx.id}", cell_style), Paragraph(f"{tx.total_amount:.2f}", cell_right_style)])
-
-            table = Table(table_data, colWidths=[0.8*inch, 0.8*inch, 2.2*inch, 1.5*inch, 1.2*inch])
-            table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4B5563')), ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'), ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey), ('ALIGN', (2, 1), (2, -1), 'LEFT')]))
-            elements.append(table)
-            elements.append(Spacer(1, 0.2 * inch))
-            elements.append(Paragraph(f"INGRESO TOTAL GENERAL: S/ {total_income:.2f}", grand_total_style))
-        
-        # ==================================================================
-        #  REPORTE GENERAL DE VENTAS (LÓGICA ORIGINAL RESTAURADA)
-        # ==================================================================
-        elif report_type == 'sales':
-            elements.append(Paragraph("Reporte General de Ventas de Productos", title_style))
-            sales_qs = Sale.objects.select_related('customer').prefetch_related('saleitem_set__product').order_by('-created_at')
-            if date_from: sales_qs = sales_qs.filter(created_at__date__gte=date_from)
-            if date_to: sales_qs = sales_qs.filter(created_at__date__lte=date_to)
-            if customer_filter: sales_qs = sales_qs.filter(customer=customer_filter)
-            total_sales_amount = sales_qs.aggregate(total=Coalesce(Sum('total_amount'), Decimal('0.0')))['total']
-            
-            table_data = [[Paragraph('ID Venta', header_style), Paragraph('Fecha', header_style), Paragraph('Cliente', header_style), Paragraph('Productos', header_style), Paragraph('Monto (S/)', header_style)]]
-            for sale in sales_qs:
-                product_list = [f"{item.quantity} x {item.product.name}" for item in sale.saleitem_set.all()]
-                products_str = "<br/>".join(product_list)
-                table_data.append([Paragraph(f"#{sale.id}", cell_style), Paragraph(sale.created_at.strftime('%d/%m/%y'), cell_style), Paragraph(sale.customer.name if sale.customer else 'Mostrador', cell_left_style), Paragraph(products_str, cell_left_style), Paragraph(f"{sale.total_amount:.2f}", cell_right_style)])
-
-            table = Table(table_data, colWidths=[0.6*inch, 0.8*inch, 1.6*inch, 2.5*inch, 1*inch])
-            table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4B5563')), ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke), ('VALIGN', (0, 0), (-1, -1), 'TOP'), ('ALIGN', (0,0),(-1,-1), 'CENTER'), ('ALIGN', (2, 1), (3, -1), 'LEFT'), ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey)]))
-            elements.append(table)
-            elements.append(Spacer(1, 0.2 * inch))
-            elements.append(Paragraph(f"MONTO TOTAL DE VENTAS: S/ {total_sales_amount:.2f}", grand_total_style))
-            
-        # ==================================================================
-        #  REPORTE GENERAL DE CLIENTES (LÓGICA ORIGINAL RESTAURADA)
-        # ==================================================================
-        elif report_type == 'customers':
-            elements.append(Paragraph("Reporte General de Clientes", title_style))
-            customers_qs = Customer.objects.annotate(
-                total_spent_orders=Coalesce(Sum(F('order__original_calculated_price') - F('order__discount_amount'), filter=~Q(order__status='CANCELLED')), Decimal('0.0')),
-                total_spent_sales=Coalesce(Sum('sale__total_amount'), Decimal('0.0')),
-                order_count=Count('order', distinct=True),
-                sale_count=Count('sale', distinct=True)
-            ).annotate(grand_total=F('total_spent_orders') + F('total_spent_sales')).order_by('-grand_total')
-
-            if date_from: customers_qs = customers_qs.filter(Q(order__created_at__date__gte=date_from) | Q(sale__created_at__date__gte=date_from)).distinct()
-            if date_to: customers_qs = customers_qs.filter(Q(order__created_at__date__lte=date_to) | Q(sale__created_at__date__lte=date_to)).distinct()
-            if customer_filter: customers_qs = customers_qs.filter(pk=customer_filter.pk)
-            
-            table_data = [[Paragraph('Cliente', header_style), Paragraph('# Pedidos', header_style), Paragraph('# Ventas', header_style), Paragraph('Gasto Pedidos (S/)', header_style), Paragraph('Gasto Ventas (S/)', header_style), Paragraph('GASTO TOTAL (S/)', header_style)]]
-            for c in customers_qs:
-                table_data.append([Paragraph(c.name, cell_left_style), Paragraph(str(c.order_count), cell_style), Paragraph(str(c.sale_count), cell_style), Paragraph(f"{c.total_spent_orders:.2f}", cell_right_style), Paragraph(f"{c.total_spent_sales:.2f}", cell_right_style), Paragraph(f"<b>{c.grand_total:.2f}</b>", cell_right_style)])
+def _export_orders(filters):
+    header = ['Pedido', 'Cliente', 'Fecha', 'Estado', 'Estado de Pago', 'Monto']
+    return header, by_date(order_rows(_orders_report_queryset(filters)))
 
-            table = Table(table_data, colWidths=[1.8*inch, 0.7*inch, 0.7*inch, 1.2*inch, 1.2*inch, 1.4*inch])
-            table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4B5563')), ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'), ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey), ('ALIGN', (0,1),(0,-1), 'LEFT')]))
-            elements.append(table)
 
+def _export_sales(filters):
+    items = SaleItem.objects.filter(
+        date_range_q(filters.get('date_from'), filters.get('date_to'), field='sale__created_at')
+    )
+    if filters.get('customer'):
+        items = items.filter(sale__customer=filters['customer'])
+    header = ['Venta', 'Fecha', 'Cliente', 'Producto', 'Cantidad', 'Precio Unitario', 'Subtotal']
+    return header, by_date(sale_item_rows(items))
+
+
+def _filtered_expenses(filters):
+    expenses = Expense.objects.all()
+    if filters.get('date_from'): expenses = expenses.filter(expense_date__gte=filters['date_from'])
+    if filters.get('date_to'): expenses = expenses.filter(expense_date__lte=filters['date_to'])
+    if filters.get('expense_category'): expenses = expenses.filter(category=filters['expense_category'])
+    return expenses
+
+
+def _export_expenses(filters):
+    return ['Fecha', 'Descripción', 'Categoría', 'Monto'], by_date(expense_rows(_filtered_expenses(filters)))
+
+
+def _export_profitability(filters):
+    created = date_range_q(filters.get('date_from'), filters.get('date_to'))
+    transaction_type = filters.get('transaction_type')
+    orders = sales = expenses = None
+    if transaction_type != 'EXPENSE':
+        orders = Order.objects.exclude(status='CANCELLED').filter(created)
+        sales = Sale.objects.filter(created)
+    if transaction_type != 'INCOME':
+        expenses = _filtered_expenses(filters)
+    return ['Fecha', 'Tipo', 'Descripción', 'Monto'], ledger_rows(orders, sales, expenses)
+
+
+# report_type -> función que arma (encabezado, filas) a partir de los filtros.
+_CSV_EXPORTS = {
+    'income': _export_income,
+    'orders': _export_orders,
+    'sales': _export_sales,
+    'expenses': _export_expenses,
+    'profitability': _export_profitability,
+}
 
-    doc.build(elements)
-    buffer.seek(0)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="{report_type}_report_detailed.pdf"'
-    response.write(buffer.getvalue())
-    buffer.close()
-    return response
 
 @login_required
 def export_report_csv(request, report_type):
-    form = ReportFilterForm(request.GET or None)
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename={report_type}_report.csv'
-    writer = csv.writer(response)
-    
-    if form.is_valid():
-        if report_type == 'income':
-            # --- CORRECCIÓN AQUÍ ---
-            orders = Order.objects.filter(payment_status__in=['PAID', 'PARTIAL']).exclude(status='CANCELLED')
-            sales = Sale.objects.all()
-            date_from = form.cleaned_data.get('date_from')
-            date_to = form.cleaned_data.get('date_to')
-            customer = form.cleaned_data.get('customer')
-            payment_method = form.cleaned_data.get('payment_method')
-            
-            if date_from:
-                orders = orders.filter(created_at__date__gte=date_from)
-                sales = sales.filter(created_at__date__gte=date_from)
-            if date_to:
-                orders = orders.filter(created_at__date__lte=date_to)
-                sales = sales.filter(created_at__date__lte=date_to)
-            if customer:
-                orders = orders.filter(customer=customer)
-                sales = sales.filter(customer=customer)
-            if payment_method:
-                orders = orders.filter(payment_method=payment_method)
-                
-            writer.writerow(['Fecha', 'Tipo', 'Cliente', 'Monto'])
-            for order in orders:
-                writer.writerow([
-                    order.created_at.strftime('%d/%m/%Y'),
-                    'Pedido',
-                    order.customer.name,
-                    order.total_price
-                ])
-            for sale in sales:
-                writer.writerow([
-                    sale.created_at.strftime('%d/%m/%Y'),
-                    'Venta',
-                    sale.customer.name if sale.customer else 'Mostrador',
-                    sale.total_amount
-                ])
-    
-    return response
+    """
+    Descarga en CSV el detalle de un reporte con sus filtros. El archivo se
+    envía a medida que se lee de la base (ver core/exports.py).
+    """
+    if report_type not in _CSV_EXPORTS:
+        raise Http404("Reporte no válido")
+    _, filters = _report_filters(request)
+    header, rows = _CSV_EXPORTS[report_type](filters)
+    return csv_response(f'{report_type}_report.csv', header, rows)
 
 def customer_list(request):
-    today = date.today()
+    today = timezone.localdate()
     customer_filter_form = CustomerFilterForm(request.GET)
     customer_list_qs = Customer.objects.all()
 
     if customer_filter_form.is_valid():
         search_query = customer_filter_form.cleaned_data.get('search_query')
         if search_query:
-            customer_list_qs = customer_list_qs.filter(
-                Q(name__icontains=search_query) |
-                Q(customer_code__icontains=search_query) |
-                Q(phone__icontains=search_query)
-            )
+            customer_list_qs = customer_list_qs.filter(search.filter_q(search.CUSTOMER, search_query))
 
         order_query = customer_filter_form.cleaned_data.get('order_query')
         if order_query:
-            order_q_object = Q(order__order_code__icontains=order_query)
+            # Clientes con algún pedido que coincide (índice de búsqueda), sin JOIN ni distinct().
+            order_q_object = search.filter_q(search.ORDER, order_query)
             if order_query.isdigit():
-                order_q_object.add(Q(order__id=int(order_query)), Q.OR)
-            customer_list_qs = customer_list_qs.filter(order_q_object).distinct()
+                order_q_object |= Q(pk=int(order_query))
+            customer_list_qs = customer_list_qs.filter(
+                pk__in=Order.objects.filter(order_q_object).values('customer_id')
+            )
 
         order_status = customer_filter_form.cleaned_data.get('order_status')
         if order_status: 
@@ -1613,24 +1393,18 @@ def customer_list(request):
         if payment_status: 
             customer_list_qs = customer_list_qs.filter(order__payment_status=payment_status).distinct()
 
-    ninety_days_ago = today - timedelta(days=90)
-    seven_days_ago = today - timedelta(days=7)
+    ninety_days_ago = day_start(today - timedelta(days=90))
+    seven_days_ago = day_start(today - timedelta(days=7))
     
-    # --- PRIMERA CORRECCIÓN AQUÍ ---
-    top_customer_ids = list(Customer.objects.annotate(
-        total_spent=(
-            Coalesce(Sum('order__original_calculated_price', filter=~Q(order__status='CANCELLED')), Decimal('0.0')) -
-            Coalesce(Sum('order__discount_amount', filter=~Q(order__status='CANCELLED')), Decimal('0.0'))
-        )
-    ).order_by('-total_spent').values_list('id', flat=True)[:5])
+    # Los totales salen del resumen precalculado (CustomerStats): no se agregan
+    # los pedidos de cada cliente en cada petición.
+    top_customer_ids = list(
+        CustomerStats.objects.order_by('-lifetime_spent').values_list('customer_id', flat=True)[:5]
+    )
 
-    # --- SEGUNDA CORRECCIÓN AQUÍ ---
     customer_list_annotated = customer_list_qs.annotate(
-        latest_order_date=Max('order__created_at'),
-        total_spent=(
-            Coalesce(Sum('order__original_calculated_price', filter=~Q(order__status='CANCELLED')), Decimal('0.0')) -
-            Coalesce(Sum('order__discount_amount', filter=~Q(order__status='CANCELLED')), Decimal('0.0'))
-        ),
+        latest_order_date=F('stats__last_order_at'),
+        total_spent=Coalesce(F('stats__lifetime_spent'), Decimal('0.0'), output_field=DecimalField()),
         is_new=Case(When(created_at__gte=seven_days_ago, then=Value(True)), default=Value(False), output_field=BooleanField()),
         is_inactive=Case(
             When(latest_order_date__isnull=True, then=Value(False)),
@@ -1641,10 +1415,10 @@ def customer_list(request):
         is_top=Case(When(id__in=top_customer_ids, then=Value(True)), default=Value(False), output_field=BooleanField())
     ).order_by('-is_top', '-total_spent', 'name')
 
-    thirty_days_ago = today - timedelta(days=30)
-    new_customers_this_month = Customer.objects.filter(created_at__year=today.year, created_at__month=today.month).count()
-    active_customers = Customer.objects.filter(order__created_at__gte=thirty_days_ago).distinct().count()
-    inactive_customers_count = customer_list_annotated.filter(is_inactive=True).count()
+    thirty_days_ago = day_start(today - timedelta(days=30))
+    new_customers_this_month = Customer.objects.filter(date_range_q(date_from=today.replace(day=1))).count()
+    active_customers = CustomerStats.objects.filter(last_order_at__gte=thirty_days_ago).count()
+    inactive_customers_count = customer_list_qs.filter(stats__last_order_at__lt=ninety_days_ago).count()
     
     paginator = Paginator(customer_list_annotated, 15)
     page_number = request.GET.get('page')
@@ -1664,17 +1438,8 @@ def customer_list(request):
 
 @login_required
 def export_customers_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="clientes_{date.today()}.csv"'
-    response.write(u'\ufeff'.encode('utf8'))
-    writer = csv.writer(response)
-    writer.writerow(['Codigo Cliente', 'Nombre', 'Telefono', 'Email', 'Fecha de Registro'])
-    customers = Customer.objects.all().values_list('customer_code', 'name', 'phone', 'email', 'created_at')
-    for customer in customers:
-        row = list(customer)
-        if isinstance(row[4], date): row[4] = row[4].strftime("%Y-%m-%d %H:%M")
-        writer.writerow(row)
-    return response
+    header = ['Codigo Cliente', 'Nombre', 'Telefono', 'Email', 'Fecha de Registro']
+    return csv_response(f'clientes_{timezone.localdate()}.csv', header, customer_rows(Customer.objects.all()))
 
 
 @login_required
@@ -1684,24 +1449,18 @@ def print_sale_ticket(request, sale_id):
     """
     try:
         sale = get_object_or_404(Sale.objects.select_related('customer'), id=sale_id)
-        app_config_qs = AppConfiguration.objects.all()
-        app_config = {c.key: c.value for c in app_config_qs}
+        app_config = app_settings()
 
         whatsapp_link = ""
         # Solo genera enlace de WhatsApp si la venta está asociada a un cliente con teléfono
-        if sale.customer and sale.customer.phone:
-            phone_number = sale.customer.phone.strip().replace(" ", "")
-            if not phone_number.startswith('51'):
-                phone_number = f"51{phone_number}"
-
-            business_name = app_config.get('business_name', 'tu tienda')
+        if sale.customer and sale.customer.phone_e164:
+            business_name = app_config.business_name
             
             message_text = (
                 f"Hola {sale.customer.name}, gracias por tu compra en *{business_name}*.\n\n"
                 f"Total de la Venta #{sale.id}: *S/ {sale.total_amount:.2f}*"
             )
-            encoded_message = quote(message_text)
-            whatsapp_link = f"https://wa.me/{phone_number}?text={encoded_message}"
+            whatsapp_link = whatsapp_url(sale.customer.phone_e164, message_text)
         
         context = {
             'sale': sale,
@@ -1751,11 +1510,6 @@ def profitability_report(request):
     """
     report_filter_form = ReportFilterForm(request.GET or None)
 
-    # --- CAMBIO 1: Optimizamos la consulta de Ventas con prefetch_related ---
-    orders_qs = Order.objects.exclude(status='CANCELLED')
-    sales_qs = Sale.objects.prefetch_related('saleitem_set__product').all()
-    expenses_qs = Expense.objects.all()
-    
     date_from = None
     date_to = None
     expense_category = None
@@ -1767,84 +1521,34 @@ def profitability_report(request):
         expense_category = report_filter_form.cleaned_data.get('expense_category')
         transaction_type = report_filter_form.cleaned_data.get('transaction_type')
 
-        if date_from:
-            orders_qs = orders_qs.filter(created_at__date__gte=date_from)
-            sales_qs = sales_qs.filter(created_at__date__gte=date_from)
-            expenses_qs = expenses_qs.filter(expense_date__gte=date_from)
-        if date_to:
-            orders_qs = orders_qs.filter(created_at__date__lte=date_to)
-            sales_qs = sales_qs.filter(created_at__date__lte=date_to)
-            expenses_qs = expenses_qs.filter(expense_date__lte=date_to)
-            
-        if expense_category:
-            expenses_qs = expenses_qs.filter(category=expense_category)
-
-    income_from_orders = orders_qs.aggregate(total=Coalesce(Sum(F('original_calculated_price')-F('discount_amount')),Decimal('0.0')))['total']
-    income_from_sales = sales_qs.aggregate(total=Coalesce(Sum('total_amount'), Decimal('0.0')))['total']
+    # Los totales salen de los totales diarios (DailyStats), no de las tablas.
+    expense_filters = {'category': expense_category} if expense_category else {}
+    income_from_orders = rollup_total(ORDER, date_from, date_to)
+    income_from_sales = rollup_total(SALE, date_from, date_to)
     total_income = income_from_orders + income_from_sales
 
-    total_expenses = expenses_qs.aggregate(total=Coalesce(Sum('amount'), Decimal('0.0')))['total']
+    total_expenses = rollup_total(EXPENSE, date_from, date_to, **expense_filters)
 
     net_profit = total_income - total_expenses
     profit_margin = (net_profit / total_income) * 100 if total_income > 0 else 0
     
-    expense_breakdown = expenses_qs.values('category').annotate(total=Sum('amount')).order_by('-total')
+    expense_breakdown_rows = list(expense_breakdown(date_from, date_to, **expense_filters))
     category_display_dict = dict(Expense.CATEGORY_CHOICES)
     
-    for item in expense_breakdown:
+    for item in expense_breakdown_rows:
         item['category_display_name'] = category_display_dict.get(item['category'])
         if total_expenses > 0:
             item['percentage'] = (item['total'] / total_expenses) * 100
         else:
             item['percentage'] = 0
 
-    all_transactions_querysets = []
-    if transaction_type != 'EXPENSE':
-        all_transactions_querysets.extend([orders_qs, sales_qs])
-    if transaction_type != 'INCOME':
-        all_transactions_querysets.append(expenses_qs)
-
-    # --- CAMBIO 2: Preparamos los datos para la plantilla ---
-    # Esto asegura que la descripción de la venta sea detallada
-    
-    # Primero, unificamos la fecha para poder ordenar
-    for o in orders_qs: o.transaction_date = o.created_at.date()
-    for s in sales_qs: s.transaction_date = s.created_at.date()
-    for e in expenses_qs: e.transaction_date = e.expense_date
-
-    # Ordenamos la lista combinada
-    all_transactions_sorted = sorted(
-        chain(*all_transactions_querysets),
-        key=attrgetter('transaction_date'),
-        reverse=True
-    )
-
-    # Creamos una lista final para la plantilla con la descripción correcta
-    display_transactions = []
-    for tx in all_transactions_sorted:
-        item = {}
-        if isinstance(tx, Order):
-            item['date'] = tx.transaction_date
-            item['type'] = 'Ingreso'
-            item['description'] = f"Pedido #{tx.order_code} - Cliente: {tx.customer.name}"
-            item['amount'] = tx.total_price
-            item['is_expense'] = False
-        elif isinstance(tx, Sale):
-            items_list = [f"{item.quantity} x {item.product.name}" for item in tx.saleitem_set.all()]
-            products_str = ", ".join(items_list)
-            item['date'] = tx.transaction_date
-            item['type'] = 'Ingreso'
-            item['description'] = f"Venta #{tx.id}: {products_str}"
-            item['amount'] = tx.total_amount
-            item['is_expense'] = False
-        elif isinstance(tx, Expense):
-            item['date'] = tx.transaction_date
-            item['type'] = 'Egreso'
-            item['description'] = f"{tx.description} ({tx.get_category_display()})"
-            item['amount'] = tx.amount
-            item['is_expense'] = True
-        
-        display_transactions.append(item)
+    # Movimientos: una consulta UNION ALL de pedidos, ventas y gastos que la
+    # base ordena y pagina (ver core/ledger.py); el total de filas sale de los
+    # totales diarios.
+    filters = (date_from, date_to, expense_category, transaction_type)
+    paginator = LedgerPaginator(ledger(*filters), 50, count=ledger_count(*filters))
+    transactions_page = paginator.get_page(request.GET.get('page'))
+    transactions_page.object_list = with_sale_items(transactions_page.object_list)
 
     context = {
         'report_filter_form': report_filter_form,
@@ -1852,8 +1556,8 @@ def profitability_report(request):
         'total_expenses': total_expenses,
         'net_profit': net_profit,
         'profit_margin': profit_margin,
-        'expense_breakdown': expense_breakdown,
-        'all_transactions': display_transactions, # <-- Usamos la nueva lista preparada
+        'expense_breakdown': expense_breakdown_rows,
+        'all_transactions': transactions_page,
         'report_type': 'profitability', 
     }
     return render(request, 'core/reports/profitability_report.html', context)
\ No newline at end of file
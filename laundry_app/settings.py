@@ -104,19 +104,52 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# URL pública del sitio (p. ej. https://lavanderia.example.com) que se codifica
+# en los QR. Si está vacía se usa el host de cada petición.
+PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', '')
+# Cantidad de QR ya dibujados que se guardan en memoria por proceso.
+QR_CACHE_SIZE = 512
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'home'
 
-# Configuración para django-select2
+# Cachés compartidas entre todos los workers de la máquina (core.cache):
+# un archivo SQLite local, sin servicios externos. `select2` guarda los
+# widgets registrados por django-select2, que deben verse desde cualquier
+# worker, así que usa su propia tabla con un límite más holgado.
+CACHE_PATH = os.getenv('CACHE_PATH', str(BASE_DIR / 'cache.sqlite3'))
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': CACHE_PATH,
+        'OPTIONS': {
+            'TABLE': 'cache_default',
+            'MAX_ENTRIES': 10000,
+        },
     },
     'select2': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'select2',
-    }
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': CACHE_PATH,
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'TABLE': 'cache_select2',
+            'MAX_ENTRIES': 20000,
+        },
+    },
 }
-SELECT2_CACHE_BACKEND = 'select2'
\ No newline at end of file
+# Configuración para django-select2
+SELECT2_CACHE_BACKEND = 'select2'
+
+# Cola de trabajos en segundo plano (core.jobs). En producción los procesa el
+# worker del Procfile; sin worker, JOBS_EAGER los ejecuta al confirmar la transacción.
+JOBS_EAGER = os.getenv('JOBS_EAGER', str(DEBUG)) == 'True'
+
+# Filas máximas de la tabla de detalle de un PDF de reporte (core.report_pdf).
+# ReportLab guarda cada página en memoria hasta cerrar el documento, así que
+# este tope es el que acota la memoria del worker; el resto va al CSV.
+REPORT_PDF_MAX_ROWS = int(os.getenv('REPORT_PDF_MAX_ROWS', '20000'))
+
+# Código de país que se antepone a los teléfonos escritos sin él (core.phones).
+PHONE_COUNTRY_CODE = os.getenv('PHONE_COUNTRY_CODE', '51')